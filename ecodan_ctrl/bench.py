@@ -0,0 +1,167 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Benchmark the controller against recorded API responses.
+
+Record cassettes on the live controller with `HTTP_CASSETTE_MODE=record`,
+then time the evaluation and the heating planner offline::
+
+    python bench.py --cassettes /data/cassettes --runs 50 --latency-ms 0
+
+The benchmark runs on a copy of the database, the original is never written.
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytz
+
+from clients.ecodan import EcodanClient
+from clients.hab import HabClient
+from clients.mme_soleil import MmeSoleilClient
+from clients.transport import HttpTransport
+from config import Config
+from db.base import Database
+from services.controller import ControllerService
+from services.cop import CopService
+from services.dhw import DhwService
+from services.heating import HeatingService
+from services.legionella import LegionellaService
+from services.lock import LockService
+from services.preview import PreviewScheduler
+from services.simulation import NullLogger
+from services.tariff import TariffService
+from services.thermal import ThermalService
+
+
+class BenchApp:
+    """
+    Application stand-in with the real clients replaying from cassettes.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.db = Database(self)
+        self.scheduler = PreviewScheduler()
+        self.log = NullLogger()
+        self.read_only = True
+        self.startup_time = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        transport = HttpTransport(self)
+        self.clients = SimpleNamespace(
+            transport=transport,
+            ecodan=EcodanClient(self, transport, config['ECODAN_API_BASE_URL'],
+                                config['ECODAN_API_USERNAME'], config['ECODAN_API_PASSWORD']),
+            hab=HabClient(self, transport, config['HAB_API_BASE_URL'],
+                          config['HAB_API_USERNAME'], config['HAB_API_PASSWORD']),
+            mme_soleil=MmeSoleilClient(self, transport, config['MME_SOLEIL_BASE_URL'],
+                                       config['MME_SOLEIL_USERNAME'], config['MME_SOLEIL_PASSWORD']),
+        )
+
+        self.locks = LockService(self)
+
+        self.services = SimpleNamespace(app=self)
+        self.services.thermal = ThermalService(self)
+        self.services.tariff = TariffService(self)
+        self.services.cop = CopService(self)
+        self.services.legionella = LegionellaService(self)
+        self.services.dhw = DhwService(self)
+        self.services.heating = HeatingService(self)
+        self.services.controller = ControllerService(self)
+
+    async def shutdown(self):
+        await asyncio.gather(
+            self.clients.ecodan.shutdown(),
+            self.clients.hab.shutdown(),
+            self.clients.mme_soleil.shutdown(),
+        )
+
+
+async def benchmark(app, targets, runs):
+    await app.db.migrate()
+
+    functions = {
+        'evaluate': app.services.controller.evaluate,
+        'plan': app.services.heating.make_plan,
+    }
+
+    results = {}
+    for target in targets:
+        # warm up, so caches are in the same state for every run
+        await functions[target]()
+
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            await functions[target]()
+            durations.append(time.perf_counter() - start)
+
+        results[target] = durations
+
+    await app.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the controller against recorded API responses.')
+    parser.add_argument('--cassettes', default=Config.HTTP_CASSETTE_DIR,
+                        help='directory with recorded cassettes, default HTTP_CASSETTE_DIR')
+    parser.add_argument('--latency-ms', type=float, default=None,
+                        help='latency of every response, default the recorded latency')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='number of timed runs per target, default 20')
+    parser.add_argument('--target', choices=['evaluate', 'plan'], action='append',
+                        help='what to time, default both')
+    args = parser.parse_args()
+
+    if args.cassettes is None or not os.path.isdir(args.cassettes):
+        parser.error('no cassette directory, use --cassettes or HTTP_CASSETTE_DIR')
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+    config['HTTP_CASSETTE_MODE'] = 'replay'
+    config['HTTP_CASSETTE_DIR'] = args.cassettes
+    config['HTTP_CASSETTE_LATENCY_MS'] = args.latency_ms
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+        if Config.DATABASE_PATH is not None and os.path.exists(Config.DATABASE_PATH):
+            shutil.copy(Config.DATABASE_PATH, config['DATABASE_PATH'])
+
+        app = BenchApp(config)
+        results = asyncio.run(benchmark(app, args.target or ['evaluate', 'plan'], args.runs))
+
+    print(f'{"target":<10}  {"runs":>5}  {"min ms":>8}  {"median ms":>9}  {"p95 ms":>8}  {"max ms":>8}')
+    for target, durations in results.items():
+        durations = sorted(d * 1000 for d in durations)
+        p95 = durations[min(len(durations) - 1, int(0.95 * len(durations)))]
+        print(f'{target:<10}  {len(durations):>5}  {durations[0]:>8.1f}  '
+              f'{statistics.median(durations):>9.1f}  {p95:>8.1f}  {durations[-1]:>8.1f}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from quart import Blueprint, current_app as app
+from quart_auth import basic_auth_required
+
+config = Blueprint('config', __name__)
+
+
+@config.post("/reload")
+@basic_auth_required()
+async def reload():
+    try:
+        return await app.services.config.reload()
+    except ValueError as e:
+        return {'error': str(e)}, 400
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from bisect import bisect_right
 import datetime
 import pytz
 
@@ -21,6 +22,9 @@ from quart import Blueprint, request, current_app as app
 from quart_auth import basic_auth_required
 
 from db.models.dhw_schedule import DhwSchedule
+from db.models.event import Event
+from db.models.measurement import Measurement
+from db.models.operating_mode import Circuit
 
 grafana = Blueprint('grafana', __name__)
 
@@ -39,6 +43,16 @@ def get_targets(data):
     return [i['target'] for i in data['targets']]
 
 
+def slice_series(timestamps, values, date_from, date_to):
+    """
+    Datapoints of a step series within the range, starting with the value
+    in effect at `date_from`.
+    """
+    start = max(bisect_right(timestamps, int(date_from.timestamp() * 1000)) - 1, 0)
+    end = bisect_right(timestamps, int(date_to.timestamp() * 1000))
+    return [[v, t] for t, v in zip(timestamps[start:end], values[start:end])]
+
+
 def format_date(timestamp):
     days = {
         0: 'Ma',
@@ -69,7 +83,12 @@ async def test_connection():
 @basic_auth_required()
 async def get_metrics():
     return [
-        {"label": "Next DHW cycle", "value": "dhw_next_cycle"}
+        {"label": "Next DHW cycle", "value": "dhw_next_cycle"},
+        {"label": "Planned heating setpoint", "value": "heating_plan"},
+        {"label": "Applied heating setpoint", "value": "heating_applied"},
+        {"label": "Heating plan size", "value": "heating_plan_size"},
+        {"label": "DHW lock wait", "value": "dhw_lock_wait"},
+        {"label": "Heating lock wait", "value": "heating_lock_wait"}
     ]
 
 
@@ -79,6 +98,39 @@ async def get_metric_payload_options():
     return []
 
 
+@grafana.post("/annotations")
+@basic_auth_required()
+async def annotations():
+    data = await request.json
+
+    date_from, date_to = get_range(data)
+    annotation = data.get('annotation', {})
+
+    # the query lists the kinds of events to show, e.g. "mode,heating_pause"
+    kinds = [k.strip() for k in (annotation.get('query') or '').split(',') if k.strip()]
+
+    events = await Event.get_range(date_from, date_to, kinds)
+
+    def to_millis(timestamp):
+        return int(timestamp.timestamp() * 1000)
+
+    result = []
+    for e in events:
+        r = {
+            'annotation': annotation,
+            'time': to_millis(e.timestamp),
+            'title': e.kind,
+            'text': e.text,
+            'tags': e.to_json()['tags'],
+        }
+        if e.timestamp_end is not None:
+            r['timeEnd'] = to_millis(e.timestamp_end)
+            r['isRegion'] = True
+        result.append(r)
+
+    return result
+
+
 @grafana.post("/query")
 @basic_auth_required()
 async def query():
@@ -116,4 +168,46 @@ async def query():
                 'datapoints': datapoints
             })
 
+        elif t == 'heating_plan':
+            timestamps, values = app.services.heating.heating_plan.get_series()
+
+            result.append({
+                'target': 'heating_plan',
+                'datapoints': slice_series(timestamps, values, date_from, date_to)
+            })
+
+        elif t == 'heating_plan_size':
+            result.append({
+                'target': 'heating_plan_size',
+                'datapoints': [[app.services.heating.heating_plan.get_size(), now]]
+            })
+
+        elif t == 'heating_applied':
+            # setpoints are applied at least daily, so a day back finds the one in effect
+            applied = await Measurement.get_series(
+                'heating_applied', date_from - datetime.timedelta(days=1), date_to)
+
+            timestamps, values = [], []
+            for m in applied:
+                timestamp = int(m.timestamp.timestamp() * 1000)
+                if len(values) > 0:
+                    timestamps.append(timestamp - 1)
+                    values.append(values[-1])
+                timestamps.append(timestamp)
+                values.append(m.value)
+
+            result.append({
+                'target': 'heating_applied',
+                'datapoints': slice_series(timestamps, values, date_from, date_to)
+            })
+
+        elif t in ('dhw_lock_wait', 'heating_lock_wait'):
+            circuit = Circuit.DHW if t == 'dhw_lock_wait' else Circuit.HEATING
+            timestamps, values = app.locks.get_series(circuit)
+
+            result.append({
+                'target': t,
+                'datapoints': slice_series(timestamps, values, date_from, date_to)
+            })
+
     return result
@@ -0,0 +1,37 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+
+from quart import Blueprint, request, current_app as app
+from quart_auth import basic_auth_required
+
+plan = Blueprint('plan', __name__)
+
+
+@plan.post("/preview")
+@basic_auth_required()
+async def preview():
+    data = await request.get_json(silent=True) or {}
+
+    try:
+        day = data.get('date')
+        if day is not None:
+            day = datetime.date.fromisoformat(day)
+
+        return await app.services.preview.plan(data.get('config', {}), day)
+    except ValueError as e:
+        return {'error': str(e)}, 400
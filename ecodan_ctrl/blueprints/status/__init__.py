@@ -14,7 +14,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from quart import Blueprint
+import datetime
+import logging
+
+from quart import Blueprint, request, current_app as app
+from quart_auth import basic_auth_required
 
 status = Blueprint('status', __name__)
 
@@ -24,3 +28,52 @@ async def health():
     return {
         'status': 'ok'
     }
+
+
+@status.get("/logs")
+@basic_auth_required()
+async def logs():
+    args = request.args.to_dict()
+
+    level = logging.getLevelName(args.pop('level', 'DEBUG').upper())
+    if not isinstance(level, int):
+        return {'error': 'invalid level'}, 400
+
+    since = args.pop('since', None)
+    if since is not None:
+        try:
+            since = datetime.datetime.fromisoformat(since)
+        except ValueError:
+            return {'error': 'invalid since, expected ISO 8601'}, 400
+
+    contains = args.pop('q', None)
+
+    try:
+        limit = int(args.pop('limit', 500))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return {'error': 'invalid limit, expected a positive integer'}, 400
+
+    records = app.log.buffer.get_records(
+        level=level, since=since, contains=contains, fields=args, limit=limit)
+
+    return [app.log.buffer.to_json(r) for r in records]
+
+
+@status.get("/http")
+@basic_auth_required()
+async def http():
+    return app.clients.transport.get_stats()
+
+
+@status.get("/leader")
+@basic_auth_required()
+async def leader():
+    return await app.services.leader.get_status()
+
+
+@status.get("/locks")
+@basic_auth_required()
+async def locks():
+    return app.locks.get_stats()
@@ -0,0 +1,180 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import gzip
+import json
+import os
+import time
+
+import httpx
+
+
+class Cassette:
+    """
+    Recorded HTTP interactions of a single client.
+
+    Interactions are stored as gzipped JSON lines, appended in batches so a
+    long recording session does not keep everything in memory.
+
+    Parameters
+    ----------
+    path : str
+        Path of the cassette file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+
+    @staticmethod
+    def get_key(method, url, content=b''):
+        return f'{method} {url} {content.decode(errors="replace")}'
+
+    @staticmethod
+    def get_path_key(method, url):
+        return f'{method} {httpx.URL(url).copy_with(query=None)}'
+
+    def add(self, request, response, elapsed):
+        self.pending.append({
+            'method': request.method,
+            'url': str(request.url),
+            'body': request.content.decode(errors='replace'),
+            'status': response.status_code,
+            'content_type': response.headers.get('content-type'),
+            'content': response.content.decode(errors='replace'),
+            'elapsed': round(elapsed, 4),
+        })
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with gzip.open(self.path, 'at', encoding='utf-8') as f:
+            for interaction in self.pending:
+                f.write(json.dumps(interaction, separators=(',', ':')) + '\n')
+
+        self.pending = []
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Transport saving every request and response to a cassette.
+
+    Parameters
+    ----------
+    transport : httpx.AsyncBaseTransport
+        The transport performing the actual requests.
+    cassette : Cassette
+        The cassette to record to.
+    flush_size : int, optional
+        Number of interactions to keep before writing them out, default 100.
+    """
+
+    def __init__(self, transport, cassette, flush_size=100):
+        self.transport = transport
+        self.cassette = cassette
+        self.flush_size = flush_size
+
+    async def handle_async_request(self, request):
+        start = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        await response.aread()
+        elapsed = time.perf_counter() - start
+
+        self.cassette.add(request, response, elapsed)
+        if len(self.cassette.pending) >= self.flush_size:
+            self.cassette.flush()
+
+        return response
+
+    async def aclose(self):
+        self.cassette.flush()
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Transport serving responses from a cassette, without any network.
+
+    Requests are matched on method, url and body first. Since most queries
+    contain the current time, they fall back to matching on method and path.
+    Repeated requests get the recorded responses in order, the last one is
+    repeated once exhausted. Unknown requests get a 404 response.
+
+    Parameters
+    ----------
+    cassette : Cassette
+        The cassette to replay.
+    latency : float, optional
+        Latency in seconds to add to every response. Defaults to the latency
+        that was recorded.
+    """
+
+    def __init__(self, cassette, latency=None):
+        self.latency = latency
+
+        self.exact = {}
+        self.by_path = {}
+
+        for interaction in cassette.load():
+            self.exact.setdefault(Cassette.get_key(
+                interaction['method'], interaction['url'], interaction['body'].encode()
+            ), []).append(interaction)
+            self.by_path.setdefault(Cassette.get_path_key(
+                interaction['method'], interaction['url']
+            ), []).append(interaction)
+
+        self.served = {}
+
+    def find(self, request):
+        for interactions, key in (
+            (self.exact, Cassette.get_key(request.method, str(request.url), request.content)),
+            (self.by_path, Cassette.get_path_key(request.method, str(request.url)))
+        ):
+            if key in interactions:
+                index = self.served.get(key, 0)
+                self.served[key] = index + 1
+                return interactions[key][min(index, len(interactions[key]) - 1)]
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        interaction = self.find(request)
+
+        if interaction is None:
+            return httpx.Response(
+                404, json={'error': f'no recorded response for {request.method} {request.url}'},
+                request=request)
+
+        latency = self.latency if self.latency is not None else interaction['elapsed']
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+        headers = {}
+        if interaction['content_type'] is not None:
+            headers['content-type'] = interaction['content_type']
+
+        return httpx.Response(
+            interaction['status'], headers=headers,
+            content=interaction['content'].encode(), request=request)
@@ -14,15 +14,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import httpx
-
 
 class EcodanClient:
     """
     Ecodan client for interacting with the Ecodan heat pump.
     """
 
-    def __init__(self, app, base_url, username, password):
+    def __init__(self, app, transport, base_url, username, password):
         """
         Initialize the Ecodan client.
 
@@ -30,6 +28,8 @@ class EcodanClient:
         ----------
         app : object
             The application object.
+        transport : HttpTransport
+            The shared HTTP transport to create the client with.
         base_url : str
             The base URL of the Ecodan heat pump.
         username : str
@@ -40,9 +40,13 @@ class EcodanClient:
         self.app = app
         self.base_url = base_url
 
-        self.client = httpx.AsyncClient()
+        self.client = transport.create_client(
+            'ecodan', timeout=self.app.config['ECODAN_API_TIMEOUT_SECONDS'])
         self.client.auth = (username, password)
 
+        # only the leader of an active/standby pair writes to the heat pump
+        self.writes_enabled = True
+
     async def shutdown(self):
         """
         Shutdown the Ecodan client.
@@ -67,8 +71,16 @@ class EcodanClient:
         httpx.HTTPStatusError
             If the request fails.
         """
+        if not self.writes_enabled:
+            self.app.log.warning(
+                "Not the leader, not setting DHW target tank temperature to: {setpoint}",
+                setpoint=target_temp
+            )
+            return
+
         self.app.log.debug(
-            f"Calling ecodan to set DHW target tank temperature to: {target_temp}"
+            "Calling ecodan to set DHW target tank temperature to: {setpoint}",
+            setpoint=target_temp
         )
         r = await self.client.put(
             f"{self.base_url}/tank/target_temp", json={"value": target_temp}
@@ -93,8 +105,16 @@ class EcodanClient:
         httpx.HTTPStatusError
             If the request fails.
         """
+        if not self.writes_enabled:
+            self.app.log.warning(
+                "Not the leader, not setting heating target temperature to: {setpoint}",
+                setpoint=target_temp
+            )
+            return
+
         self.app.log.debug(
-            f"Calling ecodan to set heating target temperature to: {target_temp}"
+            "Calling ecodan to set heating target temperature to: {setpoint}",
+            setpoint=target_temp
         )
         r = await self.client.put(
             f"{self.base_url}/house/target_temp", json={"value": target_temp}
@@ -17,58 +17,60 @@
 import httpx
 
 from dto.heatpump import HeatPumpSetpointDto, HeatPumpStatusDto
-from dto.generic import TimeDataDto, TimePeriodStatsDto
+from dto.generic import TimeDataDto, TimePeriodStatsDto, TimeSeriesDto
 
 
 class HabClient:
-    def __init__(self, app, base_url, username, password):
+    def __init__(self, app, transport, base_url, username, password):
         self.app = app
         self.base_url = base_url
 
-        self.client = httpx.AsyncClient(timeout=30)
+        self.client = transport.create_client(
+            'hab', timeout=self.app.config['HAB_API_TIMEOUT_SECONDS'])
         self.client.auth = (username, password)
+        self.json = transport.json
 
     async def shutdown(self):
         await self.client.aclose()
 
     async def get_current_state(self):
         r = await self.client.get(f'{self.base_url}/heatpump/status')
-        return HeatPumpStatusDto(**r.json())
+        return HeatPumpStatusDto(**self.json.loads(r.content))
 
     async def get_setpoint(self):
         r = await self.client.get(f'{self.base_url}/heatpump/setpoint')
-        return HeatPumpSetpointDto(**r.json())
+        return HeatPumpSetpointDto(**self.json.loads(r.content))
 
     async def get_last_legionella_start(self):
         r = await self.client.get(f'{self.base_url}/legionella/last')
-        result = TimeDataDto.from_json(r.json())
+        result = TimeDataDto.from_json(self.json.loads(r.content))
         self.app.log.debug(
-            f'Hab reports last legionella cycle started on {result.timestamp}')
+            'Hab reports last legionella cycle started on {timestamp}', timestamp=result.timestamp)
         return result
 
     async def get_current_dhw_temp(self):
         r = await self.client.get(f'{self.base_url}/dhw/temp')
-        return TimeDataDto.from_json(r.json())
+        return TimeDataDto.from_json(self.json.loads(r.content))
 
     async def get_current_outside_temp(self):
         r = await self.client.get(f"{self.base_url}/outside/temp")
-        return TimeDataDto.from_json(r.json())
+        return TimeDataDto.from_json(self.json.loads(r.content))
 
     async def get_baseline_consumption(self):
         r = await self.client.get(f'{self.base_url}/consumption/baseline')
-        return TimePeriodStatsDto.from_json(r.json())
+        return TimePeriodStatsDto.from_json(self.json.loads(r.content))
 
     async def get_current_consumption(self):
         r = await self.client.get(f'{self.base_url}/consumption/current')
-        return TimeDataDto.from_json(r.json())
+        return TimeDataDto.from_json(self.json.loads(r.content))
 
     async def get_current_net_power(self):
         r = await self.client.get(f'{self.base_url}/power/net/current')
-        return TimeDataDto.from_json(r.json())
+        return TimeDataDto.from_json(self.json.loads(r.content))
 
     async def get_daily_production(self):
         r = await self.client.get(f'{self.base_url}/production/daily')
-        return TimeDataDto.from_json(r.json())
+        return TimeDataDto.from_json(self.json.loads(r.content))
 
     async def get_house_temperature(self, start=None, end=None):
         params = {}
@@ -80,7 +82,16 @@ class HabClient:
         r = await self.client.get(f'{self.base_url}/house/temp', params=params)
 
         if r.status_code == httpx.codes.OK:
-            return TimePeriodStatsDto.from_json(r.json())
+            return TimePeriodStatsDto.from_json(self.json.loads(r.content))
+
+    async def get_price_series(self, start, end):
+        r = await self.client.get(f'{self.base_url}/price/series', params={
+            'start': start,
+            'end': end
+        })
+
+        if r.status_code == httpx.codes.OK:
+            return TimeSeriesDto.from_json(self.json.loads(r.content))
 
     async def get_simulated_price_baseline(self, start, end):
         data = {
@@ -93,7 +104,7 @@ class HabClient:
         r = await self.client.post(f"{self.base_url}/price/simulate/total", json=data)
 
         if r.status_code == httpx.codes.OK:
-            return TimePeriodStatsDto.from_json(r.json())
+            return TimePeriodStatsDto.from_json(self.json.loads(r.content))
 
     async def get_simulated_price_detail(self, start, end):
         data = {
@@ -108,4 +119,4 @@ class HabClient:
         )
 
         if r.status_code == httpx.codes.OK:
-            return [TimeDataDto.from_json(i) for i in r.json()]
+            return TimeSeriesDto.from_json(self.json.loads(r.content))
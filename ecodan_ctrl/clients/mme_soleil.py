@@ -14,26 +14,92 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import asyncio
 import datetime
 
 import httpx
+import pytz
 
 from dto.generic import TimeDataDto, TimePeriodStatsDto, TimeRangeDto, TimestampDto
 from dto.solar import SolarProductionDto
+from util.forecast import ProductionForecast
 
 
 class MmeSoleilClient:
-    def __init__(self, app, base_url, username, password):
+    def __init__(self, app, transport, base_url, username, password):
         self.app = app
         self.base_url = base_url
 
-        self.client = httpx.AsyncClient()
+        self.client = transport.create_client(
+            'mme_soleil', timeout=self.app.config['MME_SOLEIL_TIMEOUT_SECONDS'])
         self.client.auth = (username, password)
+        self.json = transport.json
+
+        self.forecast_days = self.app.config['MME_SOLEIL_FORECAST_DAYS']
+        self.forecast_max_age = datetime.timedelta(
+            minutes=self.app.config['MME_SOLEIL_FORECAST_MAX_AGE_MINUTES'])
+
+        self.forecast = None
+        self.forecast_updated = None
+        self.forecast_lock = asyncio.Lock()
+
+        self.responses = {}
 
     async def shutdown(self):
         await self.client.aclose()
 
+    async def get_production_forecast(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        async with self.forecast_lock:
+            if self.forecast is not None and self.forecast_updated > now - self.forecast_max_age:
+                return self.forecast
+
+            start = pytz.timezone('Europe/Brussels').localize(
+                datetime.datetime.combine(datetime.date.today(), datetime.time(0, 0, 0)))
+            end = start + datetime.timedelta(days=self.forecast_days)
+
+            try:
+                production, temperature = await asyncio.gather(
+                    self.client.get(f'{self.base_url}/production/forecast', params={
+                        'start': start,
+                        'end': end
+                    }),
+                    self.client.get(f'{self.base_url}/temperature/forecast', params={
+                        'start': start,
+                        'end': end
+                    })
+                )
+                production.raise_for_status()
+            except httpx.HTTPError as e:
+                self.app.log.debug('Could not fetch production forecast: {error}', error=e)
+                return self.forecast
+
+            self.forecast = ProductionForecast.from_json(
+                self.json.loads(production.content),
+                self.json.loads(temperature.content) if temperature.status_code == httpx.codes.OK else None
+            )
+            self.forecast_updated = now
+
+            self.app.log.debug(
+                'Updated production forecast with {count} values from {start} until {end}.',
+                count=len(self.forecast.timestamps), start=start, end=end)
+
+            return self.forecast
+
     async def get_peak_production(self, start, end, min_kwh, peak_duration_h, order):
+        forecast = await self.get_production_forecast()
+
+        if forecast is not None and forecast.covers(start, start):
+            timestamp = forecast.get_peak_production(
+                start, end, min_kwh, peak_duration_h, order, min_temp=6)
+
+            if timestamp is not None:
+                return TimestampDto(timestamp=timestamp)
+
+        return await self.get_remote_peak_production(start, end, min_kwh, peak_duration_h, order)
+
+    async def get_remote_peak_production(self, start, end, min_kwh, peak_duration_h, order):
         r = await self.client.get(f'{self.base_url}/production/peak', params={
             'start': start,
             'end': end,
@@ -43,36 +109,59 @@ class MmeSoleilClient:
             'precision': 1,
             'min_temp': 6
         })
-        return TimestampDto.from_isoformat(r.json()['result'])
+        return TimestampDto.from_isoformat(self.json.loads(r.content)['result'])
+
+    async def get_cached(self, path, params):
+        """
+        GET `path`, reusing a successful response with the same parameters
+        for up to `forecast_max_age`.
+        """
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        key = (path, tuple((k, str(v)) for k, v in params.items()))
+
+        cached = self.responses.get(key)
+        if cached is not None and cached[0] > now - self.forecast_max_age:
+            return cached[1]
+
+        r = await self.client.get(f'{self.base_url}{path}', params=params)
+
+        if r.status_code == httpx.codes.OK:
+            self.responses = {
+                k: v for k, v in self.responses.items()
+                if v[0] > now - self.forecast_max_age
+            }
+            self.responses[key] = (now, r)
+
+        return r
 
     async def get_production_bounds(self, date=None, min_kw=0):
         if date is None:
             date = datetime.date.today()
 
-        r = await self.client.get(f'{self.base_url}/production/bounds', params={
+        r = await self.get_cached('/production/bounds', params={
             'date': date,
             'min_kW': min_kw
         })
-        return TimeRangeDto.from_json(r.json())
+        return TimeRangeDto.from_json(self.json.loads(r.content))
 
     async def get_temperature_stats(self, start, end):
-        r = await self.client.get(f'{self.base_url}/temperature/stats', params={
+        r = await self.get_cached('/temperature/stats', params={
             'start': start,
             'end': end
         })
 
         if r.status_code == httpx.codes.OK:
-            return TimePeriodStatsDto.from_json(r.json())
+            return TimePeriodStatsDto.from_json(self.json.loads(r.content))
 
     async def get_production_weather(self, start, end):
-        r = await self.client.get(f'{self.base_url}/production/weather', params={
+        r = await self.get_cached('/production/weather', params={
             'start': start,
             'end': end
         })
-        return SolarProductionDto.from_json(r.json())
+        return SolarProductionDto.from_json(self.json.loads(r.content))
 
     async def get_daily_production(self, end_time):
         r = await self.client.get(f'{self.base_url}/production/daily', params={
             'end': end_time.strftime('%Y%m%dT%H:%M:%S')
         })
-        return TimeDataDto.from_json(r.json())
+        return TimeDataDto.from_json(self.json.loads(r.content))
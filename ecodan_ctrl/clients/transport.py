@@ -0,0 +1,144 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+
+import httpx
+
+from clients.cassette import Cassette, RecordingTransport, ReplayTransport
+from util.fastjson import JsonBackend
+
+
+class HttpTransport:
+    """
+    Shared HTTP transport settings and connection pools for the API clients.
+
+    Every client gets its own connection pool, so the pool limits apply per
+    host, but all pools are tuned from the same configuration.
+
+    With `HTTP_CASSETTE_MODE` set to `record`, all interactions are saved to a
+    cassette per client in `HTTP_CASSETTE_DIR`. Set to `replay`, the clients are
+    served from those cassettes without touching the network.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+        self.max_connections = self.app.config['HTTP_MAX_CONNECTIONS']
+        self.max_keepalive_connections = self.app.config['HTTP_MAX_KEEPALIVE_CONNECTIONS']
+        self.keepalive_expiry = self.app.config['HTTP_KEEPALIVE_EXPIRY_SECONDS']
+        self.http2 = self.app.config['HTTP_HTTP2']
+        self.compression = self.app.config['HTTP_COMPRESSION']
+
+        self.cassette_mode = self.app.config['HTTP_CASSETTE_MODE']
+        self.cassette_dir = self.app.config['HTTP_CASSETTE_DIR']
+        self.cassette_latency = self.app.config['HTTP_CASSETTE_LATENCY_MS']
+
+        if self.cassette_mode not in ('', 'record', 'replay'):
+            raise ValueError(
+                f'Invalid HTTP_CASSETTE_MODE {self.cassette_mode}, expected record or replay.')
+
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                self.app.log.warning('HTTP/2 requested but h2 is not installed, using HTTP/1.1.')
+                self.http2 = False
+
+        self.json = JsonBackend(app)
+
+        self.transports = {}
+        self.requests = {}
+
+    def create_client(self, name, timeout):
+        """
+        Create an HTTP client using a tuned connection pool.
+
+        Parameters
+        ----------
+        name : str
+            Name of the client, used to report pool statistics.
+        timeout : float
+            Timeout in seconds for connecting, reading and writing.
+
+        Returns
+        -------
+        httpx.AsyncClient
+            The HTTP client.
+        """
+        self.requests[name] = 0
+        cassette = Cassette(os.path.join(self.cassette_dir or '.', f'{name}.jsonl.gz'))
+
+        if self.cassette_mode == 'replay':
+            transport = ReplayTransport(
+                cassette,
+                latency=self.cassette_latency / 1000 if self.cassette_latency is not None else None
+            )
+        else:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                http2=self.http2
+            )
+            self.transports[name] = transport
+
+            if self.cassette_mode == 'record':
+                transport = RecordingTransport(transport, cassette)
+
+        async def count_request(request):
+            self.requests[name] += 1
+
+        headers = {}
+        if not self.compression:
+            headers['Accept-Encoding'] = 'identity'
+
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=timeout,
+            headers=headers,
+            event_hooks={'request': [count_request]}
+        )
+
+    def get_stats(self):
+        """
+        Get statistics of the connection pools.
+
+        Returns
+        -------
+        dict
+            Per client the number of requests sent and the open, idle, active
+            and HTTP/2 connections in its pool.
+        """
+        stats = {}
+
+        for name, requests in self.requests.items():
+            if name not in self.transports:
+                stats[name] = {'requests': requests}
+                continue
+
+            connections = self.transports[name]._pool.connections
+            stats[name] = {
+                'requests': requests,
+                'connections': len(connections),
+                'idle': len([c for c in connections if c.is_idle()]),
+                'active': len([c for c in connections if not c.is_idle() and not c.is_closed()]),
+                'http2': len([c for c in connections if c.info().startswith('HTTP/2')]),
+            }
+
+        return stats
@@ -17,120 +17,197 @@
 import os
 
 
-def read_secret(variable_name):
-    if f'{variable_name}_FILE' in os.environ:
-        with open(os.environ.get(f'{variable_name}_FILE'), 'r') as secret_file:
+def read_secret(variable_name, environ=os.environ):
+    if f'{variable_name}_FILE' in environ:
+        with open(environ.get(f'{variable_name}_FILE'), 'r') as secret_file:
             secret = secret_file.read()
     else:
-        secret = os.environ.get(variable_name, None)
+        secret = environ.get(variable_name, None)
     return secret
 
 
-class Config:
-    QUART_AUTH_MODE = 'bearer'
-    QUART_AUTH_BASIC_USERNAME = 'admin'
-    QUART_AUTH_BASIC_PASSWORD = read_secret('API_ADMIN_PASS')
-
-    ECODAN_API_BASE_URL = os.environ.get('ECODAN_API_BASE_URL')
-    ECODAN_API_USERNAME = os.environ.get('ECODAN_API_USERNAME')
-    ECODAN_API_PASSWORD = read_secret('ECODAN_API_PASSWORD')
-
-    HAB_API_BASE_URL = os.environ.get('HAB_API_BASE_URL')
-    HAB_API_USERNAME = os.environ.get('HAB_API_USERNAME')
-    HAB_API_PASSWORD = read_secret('HAB_API_PASSWORD')
-
-    MME_SOLEIL_BASE_URL = os.environ.get('MME_SOLEIL_BASE_URL')
-    MME_SOLEIL_USERNAME = os.environ.get('MME_SOLEIL_USERNAME')
-    MME_SOLEIL_PASSWORD = read_secret('MME_SOLEIL_PASSWORD')
-
-    DHW_RUNNING_MODE = os.environ.get('DHW_RUNNING_MODE')
-    DHW_RUNNING_MODE_AUTO_STEP_MAX_TEMP = float(
-        os.environ.get("DHW_RUNNING_MODE_AUTO_STEP_MAX_TEMP")
-    )
-
-    DHW_TEMP_OFF = float(os.environ.get('DHW_TEMP_OFF'))
-    DHW_TEMP_BASE = float(os.environ.get('DHW_TEMP_BASE'))
-    DHW_TEMP_BUFFER = float(os.environ.get('DHW_TEMP_BUFFER'))
-
-    DHW_TEMP_DROP = float(os.environ.get('DHW_TEMP_DROP'))
-    DHW_TEMP_DROP_WINTER = float(os.environ.get("DHW_TEMP_DROP_WINTER"))
-    DHW_TEMP_DROP_ECODAN = float(os.environ.get('DHW_TEMP_DROP_ECODAN'))
-
-    DHW_NORMAL_RUNTIME_HOURS = int(os.environ.get('DHW_NORMAL_RUNTIME_HOURS'))
-    DHW_NORMAL_INTERVAL_MAX_HOURS = int(
-        os.environ.get('DHW_NORMAL_INTERVAL_MAX_HOURS'))
-    DHW_NORMAL_KWH = float(os.environ.get('DHW_NORMAL_KWH'))
-
-    DHW_TEMP_LEGIONELLA = float(os.environ.get('DHW_TEMP_LEGIONELLA'))
-    DHW_LEGIONELLA_INTERVAL_DAYS = int(
-        os.environ.get('DHW_LEGIONELLA_INTERVAL_DAYS'))
-    DHW_LEGIONELLA_MIN_INTERVAL_DAYS = int(
-        os.environ.get('DHW_LEGIONELLA_MIN_INTERVAL_DAYS'))
-    DHW_LEGIONELLA_RUNTIME_HOURS = int(
-        os.environ.get('DHW_LEGIONELLA_RUNTIME_HOURS'))
-    DHW_LEGIONELLA_KWH = float(os.environ.get('DHW_LEGIONELLA_KWH'))
-
-    DHW_ECODAN_MAX_RUNTIME_HOURS = int(os.environ.get("DHW_ECODAN_MAX_RUNTIME_HOURS"))
-
-    DHW_MAX_RETRY = int(os.environ.get('DHW_MAX_RETRY'))
-    DHW_MIN_INTERVAL_MINUTES = int(os.environ.get('DHW_MIN_INTERVAL_MINUTES'))
-    DHW_MIN_INTERVAL_RETRY_MINUTES = int(
-        os.environ.get('DHW_MIN_INTERVAL_RETRY_MINUTES'))
-
-    HEATING_TEMP_MIN = float(os.environ.get('HEATING_TEMP_MIN'))
-    HEATING_TEMP_NIGHT = float(os.environ.get('HEATING_TEMP_NIGHT'))
-    HEATING_TEMP_DAY = float(os.environ.get('HEATING_TEMP_DAY'))
-
-    HEATING_BUFFER_MIN_CLEARSKY_RATIO = float(
-        os.environ.get('HEATING_BUFFER_MIN_CLEARSKY_RATIO'))
-    HEATING_BUFFER_MIN_PRODUCTION_W = float(
-        os.environ.get('HEATING_BUFFER_MIN_PRODUCTION_W'))
-    HEATING_BUFFER_MIN_PRODUCTION_HOURS = float(
-        os.environ.get('HEATING_BUFFER_MIN_PRODUCTION_HOURS'))
-    HEATING_BUFFER_MIN_PREDICTION_RATIO = float(
-        os.environ.get('HEATING_BUFFER_MIN_PREDICTION_RATIO'))
-    HEATING_BUFFER_TEMP_ADDED = float(
-        os.environ.get('HEATING_BUFFER_TEMP_ADDED'))
-    HEATING_BUFFER_MAX_TEMP_NIGHT = float(
-        os.environ.get('HEATING_BUFFER_MAX_TEMP_NIGHT'))
-
-    HEATING_FADE_MIN_TEMP_NIGHT = float(
-        os.environ.get('HEATING_FADE_MIN_TEMP_NIGHT'))
-    HEATING_FADE_MIN_TEMP_FORCE_OFF = float(
-        os.environ.get('HEATING_FADE_MIN_TEMP_FORCE_OFF'))
-    HEATING_FADE_MIN_CLEARSKY_RATIO = float(
-        os.environ.get('HEATING_FADE_MIN_CLEARSKY_RATIO'))
-    HEATING_FADE_MIN_NEXTDAY_TEMP = float(
-        os.environ.get('HEATING_FADE_MIN_NEXTDAY_TEMP'))
-    HEATING_FADE_PERIOD_HOURS = int(
-        os.environ.get('HEATING_FADE_PERIOD_HOURS'))
-    HEATING_FADE_DURING = os.environ.get('HEATING_FADE_DURING')
-    HEATING_FADE_STEPS = int(os.environ.get('HEATING_FADE_STEPS'))
-
-    HEATING_SUMMER_MODE_MIN_OUTSIDE = float(
-        os.environ.get('HEATING_SUMMER_MODE_MIN_OUTSIDE'))
-    HEATING_SUMMER_MODE_MIN_OUTSIDE_DAYS = int(
-        os.environ.get('HEATING_SUMMER_MODE_MIN_OUTSIDE_DAYS'))
-    HEATING_SUMMER_MODE_MIN_INSIDE = float(
-        os.environ.get('HEATING_SUMMER_MODE_MIN_INSIDE'))
-    HEATING_SUMMER_MODE_MIN_INSIDE_FORCE = float(
-        os.environ.get('HEATING_SUMMER_MODE_MIN_INSIDE_FORCE'))
-    HEATING_SUMMER_MODE_MAX_OUTSIDE_FORCE_OFF = float(
-        os.environ.get('HEATING_SUMMER_MODE_MAX_OUTSIDE_FORCE_OFF'))
-    HEATING_SUMMER_MODE_TEMP = float(os.environ.get('HEATING_SUMMER_MODE_TEMP'))
-
-    HEATING_PRICE_PAUSE_BASELINE_PERIOD_DAYS = int(
-        os.environ.get("HEATING_PRICE_PAUSE_BASELINE_PERIOD_DAYS")
-    )
-    HEATING_PRICE_PAUSE_MAX_COUNT = int(os.environ.get("HEATING_PRICE_PAUSE_MAX_COUNT"))
-    HEATING_PRICE_PAUSE_MAX_SIZE_MINUTES = int(
-        os.environ.get("HEATING_PRICE_PAUSE_MAX_SIZE_MINUTES")
-    )
-    HEATING_PRICE_PAUSE_MIN_INTERVAL_MINUTES = int(
-        os.environ.get("HEATING_PRICE_PAUSE_MIN_INTERVAL_MINUTES")
-    )
-    HEATING_PRICE_PAUSE_GRACE_PERIOD_MINUTES = int(
-        os.environ.get("HEATING_PRICE_PAUSE_GRACE_PERIOD_MINUTES")
-    )
-
-    DATABASE_PATH = os.environ.get('SQLITE_DB_PATH')
+def load_config(environ=os.environ):
+    """
+    Build the configuration from the given environment.
+    """
+
+    class Config:
+        QUART_AUTH_MODE = 'bearer'
+        QUART_AUTH_BASIC_USERNAME = 'admin'
+        QUART_AUTH_BASIC_PASSWORD = read_secret('API_ADMIN_PASS', environ)
+
+        ECODAN_API_BASE_URL = environ.get('ECODAN_API_BASE_URL')
+        ECODAN_API_USERNAME = environ.get('ECODAN_API_USERNAME')
+        ECODAN_API_PASSWORD = read_secret('ECODAN_API_PASSWORD', environ)
+        ECODAN_API_TIMEOUT_SECONDS = float(environ.get('ECODAN_API_TIMEOUT_SECONDS', 5))
+
+        HAB_API_BASE_URL = environ.get('HAB_API_BASE_URL')
+        HAB_API_USERNAME = environ.get('HAB_API_USERNAME')
+        HAB_API_PASSWORD = read_secret('HAB_API_PASSWORD', environ)
+        HAB_API_TIMEOUT_SECONDS = float(environ.get('HAB_API_TIMEOUT_SECONDS', 30))
+
+        MME_SOLEIL_BASE_URL = environ.get('MME_SOLEIL_BASE_URL')
+        MME_SOLEIL_USERNAME = environ.get('MME_SOLEIL_USERNAME')
+        MME_SOLEIL_PASSWORD = read_secret('MME_SOLEIL_PASSWORD', environ)
+        MME_SOLEIL_TIMEOUT_SECONDS = float(environ.get('MME_SOLEIL_TIMEOUT_SECONDS', 5))
+        MME_SOLEIL_FORECAST_DAYS = int(environ.get('MME_SOLEIL_FORECAST_DAYS', 7))
+        MME_SOLEIL_FORECAST_MAX_AGE_MINUTES = int(
+            environ.get('MME_SOLEIL_FORECAST_MAX_AGE_MINUTES', 60))
+
+        HTTP_MAX_CONNECTIONS = int(environ.get('HTTP_MAX_CONNECTIONS', 10))
+        HTTP_MAX_KEEPALIVE_CONNECTIONS = int(environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', 10))
+        HTTP_KEEPALIVE_EXPIRY_SECONDS = float(environ.get('HTTP_KEEPALIVE_EXPIRY_SECONDS', 60))
+        HTTP_HTTP2 = environ.get('HTTP_HTTP2', 'false').lower() == 'true'
+        HTTP_COMPRESSION = environ.get('HTTP_COMPRESSION', 'true').lower() == 'true'
+        HTTP_CASSETTE_MODE = environ.get('HTTP_CASSETTE_MODE', '').lower()
+        HTTP_CASSETTE_DIR = environ.get('HTTP_CASSETTE_DIR')
+        HTTP_CASSETTE_LATENCY_MS = (
+            float(environ.get('HTTP_CASSETTE_LATENCY_MS'))
+            if environ.get('HTTP_CASSETTE_LATENCY_MS') else None
+        )
+
+        JSON_BACKEND = environ.get('JSON_BACKEND', 'auto').lower()
+
+        DHW_RUNNING_MODE = environ.get('DHW_RUNNING_MODE')
+        DHW_RUNNING_MODE_AUTO_STEP_MAX_TEMP = float(
+            environ.get("DHW_RUNNING_MODE_AUTO_STEP_MAX_TEMP")
+        )
+
+        DHW_TEMP_OFF = float(environ.get('DHW_TEMP_OFF'))
+        DHW_TEMP_BASE = float(environ.get('DHW_TEMP_BASE'))
+        DHW_TEMP_BUFFER = float(environ.get('DHW_TEMP_BUFFER'))
+
+        DHW_TEMP_DROP = float(environ.get('DHW_TEMP_DROP'))
+        DHW_TEMP_DROP_WINTER = float(environ.get("DHW_TEMP_DROP_WINTER"))
+        DHW_TEMP_DROP_ECODAN = float(environ.get('DHW_TEMP_DROP_ECODAN'))
+
+        DHW_NORMAL_RUNTIME_HOURS = int(environ.get('DHW_NORMAL_RUNTIME_HOURS'))
+        DHW_NORMAL_INTERVAL_MAX_HOURS = int(
+            environ.get('DHW_NORMAL_INTERVAL_MAX_HOURS'))
+        DHW_NORMAL_KWH = float(environ.get('DHW_NORMAL_KWH'))
+
+        DHW_TEMP_LEGIONELLA = float(environ.get('DHW_TEMP_LEGIONELLA'))
+        DHW_LEGIONELLA_INTERVAL_DAYS = int(
+            environ.get('DHW_LEGIONELLA_INTERVAL_DAYS'))
+        DHW_LEGIONELLA_MIN_INTERVAL_DAYS = int(
+            environ.get('DHW_LEGIONELLA_MIN_INTERVAL_DAYS'))
+        DHW_LEGIONELLA_RUNTIME_HOURS = int(
+            environ.get('DHW_LEGIONELLA_RUNTIME_HOURS'))
+        DHW_LEGIONELLA_KWH = float(environ.get('DHW_LEGIONELLA_KWH'))
+
+        DHW_ECODAN_MAX_RUNTIME_HOURS = int(environ.get("DHW_ECODAN_MAX_RUNTIME_HOURS"))
+
+        DHW_MODEL_ENABLED = environ.get('DHW_MODEL_ENABLED', 'false').lower() == 'true'
+        DHW_MODEL_HISTORY_DAYS = int(environ.get('DHW_MODEL_HISTORY_DAYS', 28))
+        DHW_MODEL_AMBIENT_TEMP = float(environ.get('DHW_MODEL_AMBIENT_TEMP', 18))
+        DHW_TANK_LITRES = float(environ.get('DHW_TANK_LITRES', 200))
+
+        COP_MODEL_ENABLED = environ.get('COP_MODEL_ENABLED', 'false').lower() == 'true'
+        COP_MODEL_HISTORY_DAYS = int(environ.get('COP_MODEL_HISTORY_DAYS', 28))
+
+        DHW_MAX_RETRY = int(environ.get('DHW_MAX_RETRY'))
+        DHW_MIN_INTERVAL_MINUTES = int(environ.get('DHW_MIN_INTERVAL_MINUTES'))
+        DHW_MIN_INTERVAL_RETRY_MINUTES = int(
+            environ.get('DHW_MIN_INTERVAL_RETRY_MINUTES'))
+
+        HEATING_TEMP_MIN = float(environ.get('HEATING_TEMP_MIN'))
+        HEATING_TEMP_NIGHT = float(environ.get('HEATING_TEMP_NIGHT'))
+        HEATING_TEMP_DAY = float(environ.get('HEATING_TEMP_DAY'))
+
+        HEATING_BUFFER_MIN_CLEARSKY_RATIO = float(
+            environ.get('HEATING_BUFFER_MIN_CLEARSKY_RATIO'))
+        HEATING_BUFFER_MIN_PRODUCTION_W = float(
+            environ.get('HEATING_BUFFER_MIN_PRODUCTION_W'))
+        HEATING_BUFFER_MIN_PRODUCTION_HOURS = float(
+            environ.get('HEATING_BUFFER_MIN_PRODUCTION_HOURS'))
+        HEATING_BUFFER_MIN_PREDICTION_RATIO = float(
+            environ.get('HEATING_BUFFER_MIN_PREDICTION_RATIO'))
+        HEATING_BUFFER_TEMP_ADDED = float(
+            environ.get('HEATING_BUFFER_TEMP_ADDED'))
+        HEATING_BUFFER_MAX_TEMP_NIGHT = float(
+            environ.get('HEATING_BUFFER_MAX_TEMP_NIGHT'))
+
+        HEATING_FADE_MIN_TEMP_NIGHT = float(
+            environ.get('HEATING_FADE_MIN_TEMP_NIGHT'))
+        HEATING_FADE_MIN_TEMP_FORCE_OFF = float(
+            environ.get('HEATING_FADE_MIN_TEMP_FORCE_OFF'))
+        HEATING_FADE_MIN_CLEARSKY_RATIO = float(
+            environ.get('HEATING_FADE_MIN_CLEARSKY_RATIO'))
+        HEATING_FADE_MIN_NEXTDAY_TEMP = float(
+            environ.get('HEATING_FADE_MIN_NEXTDAY_TEMP'))
+        HEATING_FADE_PERIOD_HOURS = int(
+            environ.get('HEATING_FADE_PERIOD_HOURS'))
+        HEATING_FADE_DURING = environ.get('HEATING_FADE_DURING')
+        HEATING_FADE_STEPS = int(environ.get('HEATING_FADE_STEPS'))
+
+        HEATING_MODEL_ENABLED = environ.get('HEATING_MODEL_ENABLED', 'false').lower() == 'true'
+        HEATING_MODEL_HISTORY_DAYS = int(environ.get('HEATING_MODEL_HISTORY_DAYS', 14))
+        HEATING_MODEL_COMFORT_MARGIN = float(
+            environ.get('HEATING_MODEL_COMFORT_MARGIN', 0.5))
+
+        HEATING_SUMMER_MODE_MIN_OUTSIDE = float(
+            environ.get('HEATING_SUMMER_MODE_MIN_OUTSIDE'))
+        HEATING_SUMMER_MODE_MIN_OUTSIDE_DAYS = int(
+            environ.get('HEATING_SUMMER_MODE_MIN_OUTSIDE_DAYS'))
+        HEATING_SUMMER_MODE_MIN_INSIDE = float(
+            environ.get('HEATING_SUMMER_MODE_MIN_INSIDE'))
+        HEATING_SUMMER_MODE_MIN_INSIDE_FORCE = float(
+            environ.get('HEATING_SUMMER_MODE_MIN_INSIDE_FORCE'))
+        HEATING_SUMMER_MODE_MAX_OUTSIDE_FORCE_OFF = float(
+            environ.get('HEATING_SUMMER_MODE_MAX_OUTSIDE_FORCE_OFF'))
+        HEATING_SUMMER_MODE_TEMP = float(environ.get('HEATING_SUMMER_MODE_TEMP'))
+
+        HEATING_PRICE_PAUSE_BASELINE_PERIOD_DAYS = int(
+            environ.get("HEATING_PRICE_PAUSE_BASELINE_PERIOD_DAYS")
+        )
+        HEATING_PRICE_PAUSE_MAX_COUNT = int(environ.get("HEATING_PRICE_PAUSE_MAX_COUNT"))
+        HEATING_PRICE_PAUSE_MAX_SIZE_MINUTES = int(
+            environ.get("HEATING_PRICE_PAUSE_MAX_SIZE_MINUTES")
+        )
+        HEATING_PRICE_PAUSE_MIN_INTERVAL_MINUTES = int(
+            environ.get("HEATING_PRICE_PAUSE_MIN_INTERVAL_MINUTES")
+        )
+        HEATING_PRICE_PAUSE_GRACE_PERIOD_MINUTES = int(
+            environ.get("HEATING_PRICE_PAUSE_GRACE_PERIOD_MINUTES")
+        )
+
+        HEATING_PLAN_MAX_SIZE = int(environ.get('HEATING_PLAN_MAX_SIZE', 200))
+        HEATING_PLAN_HISTORY_HOURS = int(environ.get('HEATING_PLAN_HISTORY_HOURS', 24))
+
+        HEATING_REPLAN_INTERVAL_MINUTES = int(environ.get('HEATING_REPLAN_INTERVAL_MINUTES', 15))
+        HEATING_REPLAN_TOLERANCE_MINUTES = int(environ.get('HEATING_REPLAN_TOLERANCE_MINUTES', 10))
+        HEATING_REPLAN_TOLERANCE_TEMP = float(environ.get('HEATING_REPLAN_TOLERANCE_TEMP', 0.5))
+        HEATING_REPLAN_TOLERANCE_RATIO = float(environ.get('HEATING_REPLAN_TOLERANCE_RATIO', 0.1))
+        HEATING_REPLAN_TOLERANCE_PRICE = float(environ.get('HEATING_REPLAN_TOLERANCE_PRICE', 0.02))
+
+        HISTORY_INTERVAL_MINUTES = int(environ.get('HISTORY_INTERVAL_MINUTES', 5))
+        HISTORY_RETENTION_DAYS = int(environ.get('HISTORY_RETENTION_DAYS', 60))
+
+        LOG_LEVEL = environ.get('LOG_LEVEL', 'DEBUG').upper()
+        LOG_BUFFER_SIZE = int(environ.get('LOG_BUFFER_SIZE', 5000))
+
+        DATABASE_PATH = environ.get('SQLITE_DB_PATH')
+
+        SNAPSHOT_INTERVAL_SECONDS = int(environ.get('SNAPSHOT_INTERVAL_SECONDS', 60))
+        SNAPSHOT_MAX_AGE_MINUTES = int(environ.get('SNAPSHOT_MAX_AGE_MINUTES', 30))
+
+        HA_ENABLED = environ.get('HA_ENABLED', 'false').lower() == 'true'
+        HA_INSTANCE_ID = environ.get('HA_INSTANCE_ID')
+        HA_LEASE_SECONDS = int(environ.get('HA_LEASE_SECONDS', 20))
+
+        RUNNER_LOCK_FILE = environ.get('RUNNER_LOCK_FILE')
+
+        LOCK_WAIT_HISTORY = int(environ.get('LOCK_WAIT_HISTORY', 1000))
+        LOCK_WAIT_WARNING_SECONDS = float(environ.get('LOCK_WAIT_WARNING_SECONDS', 5))
+
+        CONTROLLER_TICK_FAST_SECONDS = int(environ.get('CONTROLLER_TICK_FAST_SECONDS', 10))
+        CONTROLLER_TICK_SECONDS = int(environ.get('CONTROLLER_TICK_SECONDS', 30))
+        CONTROLLER_TICK_IDLE_SECONDS = int(environ.get('CONTROLLER_TICK_IDLE_SECONDS', 300))
+
+        CONFIG_FILE = environ.get('CONFIG_FILE')
+        CONFIG_WATCH_INTERVAL_SECONDS = int(environ.get('CONFIG_WATCH_INTERVAL_SECONDS', 30))
+
+    return Config
+
+
+Config = load_config()
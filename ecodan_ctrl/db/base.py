@@ -14,14 +14,33 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import datetime
 import glob
 import importlib.util
 import os
 from pathlib import Path
 import sys
 
-import sqlite3
 import aiosqlite
+import pytz
+
+from util.runner import RunnerLock
+
+TIMEZONE = pytz.timezone('Europe/Brussels')
+
+
+def to_epoch(timestamp):
+    """Convert an aware datetime to integer epoch milliseconds for storage."""
+    if timestamp is None:
+        return None
+    return int(round(timestamp.timestamp() * 1000))
+
+
+def from_epoch(value):
+    """Convert stored epoch milliseconds to a local aware datetime."""
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(value / 1000, tz=TIMEZONE)
 
 
 class Database:
@@ -33,9 +52,14 @@ class Database:
         self.db_path = self.app.config['DATABASE_PATH']
 
     def connect(self):
-        return aiosqlite.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+        return aiosqlite.connect(self.db_path)
 
     async def migrate(self):
+        # workers starting together migrate one at a time
+        with RunnerLock(f'{self.db_path}.migrate.lock'):
+            await self.__migrate()
+
+    async def __migrate(self):
         async with self.connect() as conn:
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS migrations (
@@ -45,7 +69,7 @@ class Database:
             await conn.commit()
 
         migrations_dir = os.path.join(os.path.dirname(__file__), 'migrations')
-        for m in glob.glob(f'{migrations_dir}/*.py'):
+        for m in sorted(glob.glob(f'{migrations_dir}/*.py')):
             name = Path(m).name
 
             async with self.connect() as conn:
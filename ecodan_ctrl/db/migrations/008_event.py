@@ -0,0 +1,36 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+
+async def migrate(connection):
+    await connection.execute(
+        """
+        CREATE TABLE event (
+            kind text,
+            timestamp timestamp,
+            timestamp_end timestamp,
+            text text,
+            tags text,
+            primary key (kind, timestamp)
+        );
+    """
+    )
+    await connection.execute(
+        """
+        CREATE INDEX event_timestamp ON event (timestamp);
+    """
+    )
@@ -0,0 +1,92 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+TABLES = {
+    'dhw_schedule': (
+        """mode text primary key,
+        first_start integer,
+        planned_start integer,
+        ultimate_start integer,
+        fast boolean,
+        retry integer""",
+        ['mode', 'first_start', 'planned_start', 'ultimate_start', 'fast', 'retry'],
+        ['first_start', 'planned_start', 'ultimate_start']),
+    'operating_mode': (
+        """circuit text primary key,
+        mode text,
+        last_modified integer""",
+        ['circuit', 'mode', 'last_modified'],
+        ['last_modified']),
+    'heating_setpoint': (
+        """zone text primary key,
+        setpoint float,
+        last_modified integer""",
+        ['zone', 'setpoint', 'last_modified'],
+        ['last_modified']),
+    'dhw_setpoint': (
+        """type text primary key,
+        setpoint float,
+        last_modified integer""",
+        ['type', 'setpoint', 'last_modified'],
+        ['last_modified']),
+    'measurement': (
+        """name text,
+        timestamp integer,
+        value float,
+        primary key (name, timestamp)""",
+        ['name', 'timestamp', 'value'],
+        ['timestamp']),
+    'price': (
+        """timestamp integer primary key,
+        value float,
+        unit text""",
+        ['timestamp', 'value', 'unit'],
+        ['timestamp']),
+    'snapshot': (
+        """name text primary key,
+        timestamp integer,
+        state text""",
+        ['name', 'timestamp', 'state'],
+        ['timestamp']),
+    'event': (
+        """kind text,
+        timestamp integer,
+        timestamp_end integer,
+        text text,
+        tags text,
+        primary key (kind, timestamp)""",
+        ['kind', 'timestamp', 'timestamp_end', 'text', 'tags'],
+        ['timestamp', 'timestamp_end']),
+}
+
+
+def to_epoch_sql(column):
+    # Timestamps were stored as naive UTC text, convert to epoch milliseconds.
+    return f'CAST(round((julianday({column}) - 2440587.5) * 86400000) AS INTEGER)'
+
+
+async def migrate(connection):
+    for table, (definition, columns, timestamps) in TABLES.items():
+        select = ', '.join(to_epoch_sql(c) if c in timestamps else c for c in columns)
+
+        await connection.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+        await connection.execute(f'CREATE TABLE {table} ({definition})')
+        await connection.execute(
+            f'INSERT OR IGNORE INTO {table} ({", ".join(columns)}) SELECT {select} FROM {table}_old')
+        await connection.execute(f'DROP TABLE {table}_old')
+
+    await connection.execute('CREATE INDEX event_timestamp ON event (timestamp)')
@@ -14,28 +14,30 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import datetime
+
 import pytz
-from db.base import Model
+from db.base import Model, from_epoch, to_epoch
+from db.models.event import Event
 
 
 class DhwSchedule(Model):
-    def __init__(self, mode, first_start, planned_start, ultimate_start, fast=False, retry=0):
+    def __init__(self, mode, first_start, planned_start, ultimate_start, fast=False, retry=0,
+                 predicted=False):
         self.mode = mode
         self.first_start = first_start
         self.planned_start = planned_start
         self.ultimate_start = ultimate_start
         self.fast = fast
         self.retry = retry
+        self.predicted = bool(predicted)
 
     @staticmethod
-    def from_naieve_utc(*args, **kwargs):
-        def to_localtime(timestamp):
-            return timestamp.replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Europe/Brussels'))
-
+    def from_row(*args, **kwargs):
         dhw_schedule = DhwSchedule(*args, **kwargs)
-        dhw_schedule.first_start = to_localtime(dhw_schedule.first_start)
-        dhw_schedule.planned_start = to_localtime(dhw_schedule.planned_start)
-        dhw_schedule.ultimate_start = to_localtime(dhw_schedule.ultimate_start)
+        dhw_schedule.first_start = from_epoch(dhw_schedule.first_start)
+        dhw_schedule.planned_start = from_epoch(dhw_schedule.planned_start)
+        dhw_schedule.ultimate_start = from_epoch(dhw_schedule.ultimate_start)
         return dhw_schedule
 
     @staticmethod
@@ -45,19 +47,28 @@ class DhwSchedule(Model):
                     'SELECT * FROM dhw_schedule WHERE mode = ?', (mode,)) as curs:
                 result = await curs.fetchone()
                 if result:
-                    return DhwSchedule.from_naieve_utc(*result)
+                    return DhwSchedule.from_row(*result)
 
     def data(self):
-        def to_naieve_utc(timestamp):
-            return timestamp.astimezone(pytz.utc).replace(tzinfo=None)
+        return {
+            'mode': self.mode,
+            'first_start': to_epoch(self.first_start),
+            'planned_start': to_epoch(self.planned_start),
+            'ultimate_start': to_epoch(self.ultimate_start),
+            'fast': self.fast,
+            'retry': self.retry,
+            'predicted': self.predicted
+        }
 
+    def to_json(self):
         return {
             'mode': self.mode,
-            'first_start': to_naieve_utc(self.first_start),
-            'planned_start': to_naieve_utc(self.planned_start),
-            'ultimate_start': to_naieve_utc(self.ultimate_start),
+            'first_start': self.first_start.isoformat(),
+            'planned_start': self.planned_start.isoformat(),
+            'ultimate_start': self.ultimate_start.isoformat(),
             'fast': self.fast,
-            'retry': self.retry
+            'retry': self.retry,
+            'predicted': self.predicted
         }
 
     @staticmethod
@@ -67,24 +78,42 @@ class DhwSchedule(Model):
                     'SELECT * FROM dhw_schedule ORDER BY planned_start LIMIT 1') as curs:
                 result = await curs.fetchone()
                 if result:
-                    return DhwSchedule.from_naieve_utc(*result)
+                    return DhwSchedule.from_row(*result)
 
     async def save(self):
         async with self.db.connect() as conn:
+            await Event(
+                kind='schedule',
+                timestamp=datetime.datetime.now(tz=pytz.utc),
+                timestamp_end=None,
+                text=f'{self.mode} planned at {self.planned_start:%Y-%m-%d %H:%M}, '
+                     f'at the latest {self.ultimate_start:%Y-%m-%d %H:%M}',
+                tags=f'{self.mode},planned'
+            ).insert(conn)
+
             await conn.execute(
                 """INSERT INTO dhw_schedule VALUES (
-                    :mode, :first_start, :planned_start, :ultimate_start, :fast, :retry
+                    :mode, :first_start, :planned_start, :ultimate_start, :fast, :retry,
+                    :predicted
                 )
                 ON CONFLICT (mode) DO UPDATE SET
                     first_start = excluded.first_start,
                     planned_start = excluded.planned_start,
                     ultimate_start = excluded.ultimate_start,
                     fast = excluded.fast,
-                    retry = excluded.retry
+                    retry = excluded.retry,
+                    predicted = excluded.predicted
                 """, self.data())
             await conn.commit()
 
     async def remove(self):
         async with self.db.connect() as conn:
             await conn.execute('DELETE FROM dhw_schedule WHERE mode = ?', (self.mode,))
+            await Event(
+                kind='schedule',
+                timestamp=datetime.datetime.now(tz=pytz.utc),
+                timestamp_end=None,
+                text=f'{self.mode} schedule removed',
+                tags=f'{self.mode},removed'
+            ).insert(conn)
             await conn.commit()
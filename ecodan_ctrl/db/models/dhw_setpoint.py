@@ -16,7 +16,7 @@
 
 import datetime
 import pytz
-from db.base import Model
+from db.base import Model, from_epoch, to_epoch
 
 
 class DhwSetpoint(Model):
@@ -27,14 +27,9 @@ class DhwSetpoint(Model):
         self.last_modified = last_modified
 
     @staticmethod
-    def from_naieve_utc(*args, **kwargs):
-        def to_localtime(timestamp):
-            return timestamp.replace(tzinfo=pytz.utc).astimezone(
-                pytz.timezone("Europe/Brussels")
-            )
-
+    def from_row(*args, **kwargs):
         dhw_setpoint = DhwSetpoint(*args, **kwargs)
-        dhw_setpoint.last_modified = to_localtime(dhw_setpoint.last_modified)
+        dhw_setpoint.last_modified = from_epoch(dhw_setpoint.last_modified)
         return dhw_setpoint
 
     @staticmethod
@@ -45,18 +40,15 @@ class DhwSetpoint(Model):
             ) as curs:
                 result = await curs.fetchone()
                 if result:
-                    return DhwSetpoint.from_naieve_utc(*result)
+                    return DhwSetpoint.from_row(*result)
 
     def data(self):
-        def to_naieve_utc(timestamp):
-            return timestamp.astimezone(pytz.utc).replace(tzinfo=None)
-
         now = datetime.datetime.now(tz=pytz.timezone("Europe/Brussels"))
 
         return {
             "type": self.type,
             "setpoint": self.setpoint,
-            "last_modified": to_naieve_utc(now),
+            "last_modified": to_epoch(now),
         }
 
     async def save(self):
@@ -0,0 +1,115 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+
+from db.base import Model, from_epoch, to_epoch
+
+
+class Event(Model):
+    def __init__(self, kind, timestamp, timestamp_end, text, tags=''):
+        self.kind = kind
+        self.timestamp = timestamp
+        self.timestamp_end = timestamp_end
+        self.text = text
+        self.tags = tags
+
+    @staticmethod
+    def from_row(*args, **kwargs):
+        event = Event(*args, **kwargs)
+        event.timestamp = from_epoch(event.timestamp)
+        event.timestamp_end = from_epoch(event.timestamp_end)
+        return event
+
+    @staticmethod
+    async def get_range(start, end, kinds=None, max_duration=datetime.timedelta(days=1)):
+        """
+        Events overlapping the range, optionally only of the given kinds.
+        Events are assumed to last at most `max_duration`, so the timestamp
+        index bounds the search.
+        """
+
+        query = """SELECT * FROM event
+            WHERE timestamp >= ? AND timestamp <= ?
+            AND coalesce(timestamp_end, timestamp) >= ?"""
+        params = [to_epoch(start - max_duration), to_epoch(end), to_epoch(start)]
+
+        if kinds:
+            query += f' AND kind IN ({", ".join("?" for _ in kinds)})'
+            params.extend(kinds)
+
+        async with Model.db.connect() as conn:
+            async with conn.execute(query + ' ORDER BY timestamp', params) as curs:
+                return [Event.from_row(*r) for r in await curs.fetchall()]
+
+    @staticmethod
+    async def replace_from(kind, timestamp, events):
+        """
+        Replace all events of `kind` starting from `timestamp` with `events`.
+        """
+        async with Model.db.connect() as conn:
+            await conn.execute(
+                'DELETE FROM event WHERE kind = ? AND timestamp >= ?',
+                (kind, to_epoch(timestamp)))
+            for event in events:
+                await event.insert(conn)
+            await conn.commit()
+
+    @staticmethod
+    async def remove_before(timestamp):
+        async with Model.db.connect() as conn:
+            await conn.execute(
+                'DELETE FROM event WHERE coalesce(timestamp_end, timestamp) < ?',
+                (to_epoch(timestamp),))
+            await conn.commit()
+
+    def data(self):
+        return {
+            'kind': self.kind,
+            'timestamp': to_epoch(self.timestamp),
+            'timestamp_end': to_epoch(self.timestamp_end),
+            'text': self.text,
+            'tags': self.tags
+        }
+
+    async def insert(self, conn):
+        """
+        Insert using an open connection, to record the event in the same
+        transaction as the change it describes.
+        """
+        await conn.execute(
+            """INSERT INTO event VALUES (
+                :kind, :timestamp, :timestamp_end, :text, :tags
+            )
+            ON CONFLICT (kind, timestamp) DO UPDATE SET
+                timestamp_end = excluded.timestamp_end,
+                text = excluded.text,
+                tags = excluded.tags
+            """, self.data())
+
+    async def save(self):
+        async with self.db.connect() as conn:
+            await self.insert(conn)
+            await conn.commit()
+
+    def to_json(self):
+        return {
+            'kind': self.kind,
+            'timestamp': self.timestamp.isoformat(),
+            'timestamp_end': self.timestamp_end.isoformat() if self.timestamp_end else None,
+            'text': self.text,
+            'tags': [t for t in self.tags.split(',') if t]
+        }
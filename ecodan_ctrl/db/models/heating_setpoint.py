@@ -16,7 +16,7 @@
 
 import datetime
 import pytz
-from db.base import Model
+from db.base import Model, from_epoch, to_epoch
 
 
 class HeatingSetpoint(Model):
@@ -26,12 +26,9 @@ class HeatingSetpoint(Model):
         self.last_modified = last_modified
 
     @staticmethod
-    def from_naieve_utc(*args, **kwargs):
-        def to_localtime(timestamp):
-            return timestamp.replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Europe/Brussels'))
-
+    def from_row(*args, **kwargs):
         heating_setpoint = HeatingSetpoint(*args, **kwargs)
-        heating_setpoint.last_modified = to_localtime(
+        heating_setpoint.last_modified = from_epoch(
             heating_setpoint.last_modified)
         return heating_setpoint
 
@@ -42,18 +39,15 @@ class HeatingSetpoint(Model):
                     'SELECT * FROM heating_setpoint WHERE zone = ?', (zone,)) as curs:
                 result = await curs.fetchone()
                 if result:
-                    return HeatingSetpoint.from_naieve_utc(*result)
+                    return HeatingSetpoint.from_row(*result)
 
     def data(self):
-        def to_naieve_utc(timestamp):
-            return timestamp.astimezone(pytz.utc).replace(tzinfo=None)
-
         now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
 
         return {
             'zone': self.zone,
             'setpoint': self.setpoint,
-            'last_modified': to_naieve_utc(now)
+            'last_modified': to_epoch(now)
         }
 
     async def save(self):
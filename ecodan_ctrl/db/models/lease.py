@@ -0,0 +1,85 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from db.base import Model, from_epoch, to_epoch
+
+
+class Lease(Model):
+    def __init__(self, name, holder, expires):
+        self.name = name
+        self.holder = holder
+        self.expires = expires
+
+    @staticmethod
+    def from_row(*args, **kwargs):
+        lease = Lease(*args, **kwargs)
+        lease.expires = from_epoch(lease.expires)
+        return lease
+
+    @staticmethod
+    async def from_name(name):
+        async with Model.db.connect() as conn:
+            async with conn.execute(
+                    'SELECT * FROM lease WHERE name = ?', (name,)) as curs:
+                result = await curs.fetchone()
+                if result:
+                    return Lease.from_row(*result)
+
+    @staticmethod
+    async def acquire(name, holder, now, duration):
+        """
+        Take or renew the lease until `now + duration`, unless another
+        holder's lease has not expired yet.
+
+        Returns
+        -------
+        bool
+            Whether `holder` holds the lease.
+        """
+        async with Model.db.connect() as conn:
+            await conn.execute(
+                """INSERT INTO lease VALUES (
+                    :name, :holder, :expires
+                )
+                ON CONFLICT (name) DO UPDATE SET
+                    holder = excluded.holder,
+                    expires = excluded.expires
+                WHERE holder = excluded.holder OR expires <= :now
+                """, {
+                    'name': name,
+                    'holder': holder,
+                    'expires': to_epoch(now + duration),
+                    'now': to_epoch(now)
+                })
+            await conn.commit()
+
+            async with conn.execute(
+                    'SELECT holder FROM lease WHERE name = ?', (name,)) as curs:
+                return (await curs.fetchone())[0] == holder
+
+    @staticmethod
+    async def release(name, holder):
+        async with Model.db.connect() as conn:
+            await conn.execute(
+                'DELETE FROM lease WHERE name = ? AND holder = ?', (name, holder))
+            await conn.commit()
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'holder': self.holder,
+            'expires': self.expires.isoformat()
+        }
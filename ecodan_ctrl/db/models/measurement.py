@@ -0,0 +1,107 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from db.base import Model, from_epoch, to_epoch
+
+
+class Measurement(Model):
+    def __init__(self, name, timestamp, value):
+        self.name = name
+        self.timestamp = timestamp
+        self.value = value
+
+    @staticmethod
+    def from_row(*args, **kwargs):
+        measurement = Measurement(*args, **kwargs)
+        measurement.timestamp = from_epoch(measurement.timestamp)
+        return measurement
+
+    @staticmethod
+    async def get_series(name, start, end):
+        async with Model.db.connect() as conn:
+            async with conn.execute(
+                """SELECT * FROM measurement
+                WHERE name = ? AND timestamp >= ? AND timestamp <= ?
+                ORDER BY timestamp""",
+                (name, to_epoch(start), to_epoch(end)),
+            ) as curs:
+                return [Measurement.from_row(*r) for r in await curs.fetchall()]
+
+    @staticmethod
+    async def get_arrays(name, start, end):
+        """
+        Series `name` between `start` and `end` in columnar form.
+
+        Returns
+        -------
+        tuple
+            Timestamps as epoch seconds and values.
+        """
+        async with Model.db.connect() as conn:
+            async with conn.execute(
+                """SELECT timestamp, value FROM measurement
+                WHERE name = ? AND timestamp >= ? AND timestamp <= ?
+                ORDER BY timestamp""",
+                (name, to_epoch(start), to_epoch(end)),
+            ) as curs:
+                data = np.array(await curs.fetchall(), dtype=float).reshape(-1, 2)
+
+        return data[:, 0] / 1000, data[:, 1]
+
+    @staticmethod
+    async def remove_before(timestamp):
+        async with Model.db.connect() as conn:
+            await conn.execute(
+                "DELETE FROM measurement WHERE timestamp < ?",
+                (to_epoch(timestamp),),
+            )
+            await conn.commit()
+
+    def data(self):
+        return {
+            "name": self.name,
+            "timestamp": to_epoch(self.timestamp),
+            "value": self.value,
+        }
+
+    async def save(self):
+        async with self.db.connect() as conn:
+            await conn.execute(
+                """INSERT INTO measurement VALUES (
+                    :name, :timestamp, :value
+                )
+                ON CONFLICT (name, timestamp) DO UPDATE SET
+                    value = excluded.value
+                """,
+                self.data(),
+            )
+            await conn.commit()
+
+    @staticmethod
+    async def save_all(measurements):
+        async with Model.db.connect() as conn:
+            await conn.executemany(
+                """INSERT INTO measurement VALUES (
+                    :name, :timestamp, :value
+                )
+                ON CONFLICT (name, timestamp) DO UPDATE SET
+                    value = excluded.value
+                """,
+                [m.data() for m in measurements],
+            )
+            await conn.commit()
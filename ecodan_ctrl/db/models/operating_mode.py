@@ -17,11 +17,13 @@
 import datetime
 from enum import Enum
 import pytz
-from db.base import Model
+from db.base import Model, from_epoch, to_epoch
+from db.models.event import Event
 
 
 class Circuit(Enum):
     DHW = 'dhw'
+    HEATING = 'heating'
 
 
 class DhwMode(Enum):
@@ -48,15 +50,12 @@ class OperatingMode(Model):
         self.last_modified = last_modified
 
     @staticmethod
-    def from_naieve_utc(*args, **kwargs):
-        def to_localtime(timestamp):
-            return timestamp.replace(tzinfo=pytz.utc).astimezone(pytz.timezone('Europe/Brussels'))
-
+    def from_row(*args, **kwargs):
         operating_mode = OperatingMode(*args, **kwargs)
         operating_mode.circuit = Circuit(operating_mode.circuit)
         if operating_mode.circuit == Circuit.DHW:
             operating_mode.mode = DhwMode(operating_mode.mode)
-        operating_mode.last_modified = to_localtime(
+        operating_mode.last_modified = from_epoch(
             operating_mode.last_modified)
         return operating_mode
 
@@ -67,22 +66,25 @@ class OperatingMode(Model):
                     'SELECT * FROM operating_mode WHERE circuit = ?', (circuit,)) as curs:
                 result = await curs.fetchone()
                 if result:
-                    return OperatingMode.from_naieve_utc(*result)
+                    return OperatingMode.from_row(*result)
 
     def data(self):
-        def to_naieve_utc(timestamp):
-            return timestamp.astimezone(pytz.utc).replace(tzinfo=None)
-
         now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
 
         return {
             'circuit': self.circuit.value,
             'mode': self.mode.value,
-            'last_modified': to_naieve_utc(now)
+            'last_modified': to_epoch(now)
         }
 
     async def save(self):
+        data = self.data()
+
         async with self.db.connect() as conn:
+            async with conn.execute(
+                    'SELECT mode FROM operating_mode WHERE circuit = ?', (data['circuit'],)) as curs:
+                previous = await curs.fetchone()
+
             await conn.execute(
                 """INSERT INTO operating_mode VALUES (
                     :circuit, :mode, :last_modified
@@ -90,5 +92,15 @@ class OperatingMode(Model):
                 ON CONFLICT (circuit) DO UPDATE SET
                     mode = excluded.mode,
                     last_modified = excluded.last_modified
-                """, self.data())
+                """, data)
+
+            if previous is None or previous[0] != data['mode']:
+                await Event(
+                    kind='mode',
+                    timestamp=from_epoch(data['last_modified']),
+                    timestamp_end=None,
+                    text=f'{data["circuit"]}: {previous[0] if previous else "unknown"} → {data["mode"]}',
+                    tags=f'{data["circuit"]},{data["mode"]}'
+                ).insert(conn)
+
             await conn.commit()
@@ -0,0 +1,106 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from db.base import Model, from_epoch, to_epoch
+
+
+class Price(Model):
+    def __init__(self, timestamp, value, unit):
+        self.timestamp = timestamp
+        self.value = value
+        self.unit = unit
+
+    @staticmethod
+    def from_row(*args, **kwargs):
+        price = Price(*args, **kwargs)
+        price.timestamp = from_epoch(price.timestamp)
+        return price
+
+    @staticmethod
+    async def get_series(start, end):
+        async with Model.db.connect() as conn:
+            async with conn.execute(
+                """SELECT * FROM price
+                WHERE timestamp >= ? AND timestamp <= ?
+                ORDER BY timestamp""",
+                (to_epoch(start), to_epoch(end)),
+            ) as curs:
+                return [Price.from_row(*r) for r in await curs.fetchall()]
+
+    @staticmethod
+    async def get_arrays(start, end):
+        """
+        Prices between `start` and `end` in columnar form.
+
+        Returns
+        -------
+        tuple
+            Timestamps as epoch seconds, values and unit.
+        """
+        async with Model.db.connect() as conn:
+            async with conn.execute(
+                """SELECT timestamp, value, unit FROM price
+                WHERE timestamp >= ? AND timestamp <= ?
+                ORDER BY timestamp""",
+                (to_epoch(start), to_epoch(end)),
+            ) as curs:
+                rows = await curs.fetchall()
+
+        data = np.array([r[:2] for r in rows], dtype=float).reshape(-1, 2)
+        return data[:, 0] / 1000, data[:, 1], rows[0][2] if rows else None
+
+    @staticmethod
+    async def get_last():
+        async with Model.db.connect() as conn:
+            async with conn.execute(
+                "SELECT * FROM price ORDER BY timestamp DESC LIMIT 1"
+            ) as curs:
+                result = await curs.fetchone()
+                if result:
+                    return Price.from_row(*result)
+
+    @staticmethod
+    async def remove_before(timestamp):
+        async with Model.db.connect() as conn:
+            await conn.execute(
+                "DELETE FROM price WHERE timestamp < ?",
+                (to_epoch(timestamp),),
+            )
+            await conn.commit()
+
+    def data(self):
+        return {
+            "timestamp": to_epoch(self.timestamp),
+            "value": self.value,
+            "unit": self.unit,
+        }
+
+    @staticmethod
+    async def save_all(prices):
+        async with Model.db.connect() as conn:
+            await conn.executemany(
+                """INSERT INTO price VALUES (
+                    :timestamp, :value, :unit
+                )
+                ON CONFLICT (timestamp) DO UPDATE SET
+                    value = excluded.value,
+                    unit = excluded.unit
+                """,
+                [p.data() for p in prices],
+            )
+            await conn.commit()
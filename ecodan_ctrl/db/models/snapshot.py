@@ -0,0 +1,58 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from db.base import Model, from_epoch, to_epoch
+
+
+class Snapshot(Model):
+    def __init__(self, name, timestamp, state):
+        self.name = name
+        self.timestamp = timestamp
+        self.state = state
+
+    @staticmethod
+    def from_row(*args, **kwargs):
+        snapshot = Snapshot(*args, **kwargs)
+        snapshot.timestamp = from_epoch(snapshot.timestamp)
+        return snapshot
+
+    @staticmethod
+    async def from_name(name):
+        async with Model.db.connect() as conn:
+            async with conn.execute(
+                    'SELECT * FROM snapshot WHERE name = ?', (name,)) as curs:
+                result = await curs.fetchone()
+                if result:
+                    return Snapshot.from_row(*result)
+
+    def data(self):
+        return {
+            'name': self.name,
+            'timestamp': to_epoch(self.timestamp),
+            'state': self.state
+        }
+
+    async def save(self):
+        async with self.db.connect() as conn:
+            await conn.execute(
+                """INSERT INTO snapshot VALUES (
+                    :name, :timestamp, :state
+                )
+                ON CONFLICT (name) DO UPDATE SET
+                    timestamp = excluded.timestamp,
+                    state = excluded.state
+                """, self.data())
+            await conn.commit()
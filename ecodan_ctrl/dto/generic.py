@@ -18,8 +18,11 @@ from dataclasses import dataclass
 import datetime
 from typing import Optional
 
+import numpy as np
+import pytz
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class TimeDataDto:
     timestamp: datetime.datetime
     value: float
@@ -34,7 +37,7 @@ class TimeDataDto:
         )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TimePeriodStatsDto:
     start: datetime.datetime
     end: datetime.datetime
@@ -59,7 +62,7 @@ class TimePeriodStatsDto:
         )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TimestampDto:
     timestamp: datetime.datetime
 
@@ -70,7 +73,7 @@ class TimestampDto:
         )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TimeRangeDto:
     start: datetime.datetime
     end: datetime.datetime
@@ -86,3 +89,42 @@ class TimeRangeDto:
             end = datetime.datetime.fromisoformat(json['end'])
 
         return TimeRangeDto(start, end)
+
+
+@dataclass(frozen=True, slots=True)
+class TimeSeriesDto:
+    """
+    Series of values in columnar form, with timestamps as epoch seconds.
+
+    Indexing and iterating yield `TimeDataDto` instances, built on access.
+    """
+    timestamps: np.ndarray
+    values: np.ndarray
+    unit: str
+
+    @staticmethod
+    def from_json(json):
+        timestamps = np.fromiter(
+            (datetime.datetime.fromisoformat(i['timestamp']).timestamp() for i in json),
+            dtype=float, count=len(json))
+        values = np.fromiter((i['value'] for i in json), dtype=float, count=len(json))
+        unit = json[0]['unit'] if len(json) > 0 else None
+
+        return TimeSeriesDto(timestamps, values, unit)
+
+    def to_datetime(self, epoch):
+        return datetime.datetime.fromtimestamp(epoch, tz=pytz.timezone('Europe/Brussels'))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        return TimeDataDto(
+            timestamp=self.to_datetime(self.timestamps[index]),
+            value=float(self.values[index]),
+            unit=self.unit
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -18,6 +18,8 @@ from dataclasses import dataclass
 import datetime
 from enum import Enum
 
+import pytz
+
 
 @dataclass
 class SetpointDto:
@@ -40,5 +42,21 @@ class SetpointDto:
             self.setpoint = None
         self.setpoint_type = setpoint_type
 
+    @staticmethod
+    def from_json(json):
+        return SetpointDto(
+            timestamp=datetime.datetime.fromisoformat(json['timestamp']).astimezone(
+                pytz.timezone('Europe/Brussels')),
+            setpoint=json['setpoint'],
+            setpoint_type=SetpointDto.SetpointType[json['setpoint_type'].upper()]
+        )
+
+    def to_json(self):
+        return {
+            'timestamp': self.timestamp.isoformat(),
+            'setpoint': self.setpoint,
+            'setpoint_type': self.setpoint_type.name.lower()
+        }
+
     def __str__(self):
         return f"<dto.heating.SetPointDto {self.timestamp}, {self.setpoint}, {self.setpoint_type}>"
@@ -17,14 +17,14 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HeatPumpStatusDto:
     operating_mode: str
     heat_source: str
     defrost_status: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HeatPumpSetpointDto:
     dhw: float
     heating: float
@@ -17,7 +17,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SolarProductionDto:
     weather_data: float
     clearsky: float
@@ -0,0 +1,322 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Load test the controller against many virtual installations.
+
+Starts the stand-in APIs with one physics model per installation, and drives
+a controller per installation, each with its own database, from a single
+event loop. For every number of installations the evaluation runs once per
+slot for the given duration::
+
+    python loadtest.py --installations 1,10,50,100 --slot 30 --duration 120
+
+The report shows tick latency percentiles and missed slots, event loop lag,
+peak thread count, SQLite connection waits and lock errors, and memory use.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import datetime
+import os
+import random
+import resource
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytz
+
+from clients.ecodan import EcodanClient
+from clients.hab import HabClient
+from clients.mme_soleil import MmeSoleilClient
+from clients.transport import HttpTransport
+from config import Config
+from db.base import Database
+from services.controller import ControllerService
+from services.cop import CopService
+from services.dhw import DhwService
+from services.heating import HeatingService
+from services.legionella import LegionellaService
+from services.lock import LockService
+from services.preview import PreviewScheduler
+from services.simulation import NullLogger
+from services.tariff import TariffService
+from services.thermal import ThermalService
+
+
+class LoadStats:
+    def __init__(self):
+        self.ticks = []
+        self.errors = {}
+        self.connect_waits = []
+        self.loop_lags = []
+        self.threads = 0
+        self.rss = 0
+
+    def add_error(self, error):
+        name = type(error).__name__
+        if isinstance(error, sqlite3.OperationalError) and 'locked' in str(error):
+            name = 'locked'
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+
+class TimedConnect:
+    """
+    Measures how long opening a connection takes, which includes starting the
+    aiosqlite thread and waiting for file locks.
+    """
+
+    def __init__(self, connect, stats):
+        self.connect = connect
+        self.stats = stats
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        connection = await self.connect.__aenter__()
+        self.stats.connect_waits.append(time.perf_counter() - start)
+        return connection
+
+    async def __aexit__(self, *exc_info):
+        return await self.connect.__aexit__(*exc_info)
+
+
+class RoutingDatabase(Database):
+    """
+    Database of the installation the running task belongs to.
+    """
+
+    installation_path = contextvars.ContextVar('installation_path')
+
+    def __init__(self, app, stats):
+        super().__init__(app)
+        self.stats = stats
+
+    def connect(self):
+        self.db_path = self.installation_path.get()
+        return TimedConnect(super().connect(), self.stats)
+
+
+class InstallationApp:
+    """
+    Application stand-in for one virtual installation.
+    """
+
+    def __init__(self, config, index, db_path):
+        self.config = config
+        self.db_path = db_path
+        self.scheduler = PreviewScheduler()
+        self.log = NullLogger()
+        self.read_only = False
+        self.startup_time = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        transport = HttpTransport(self)
+        self.clients = SimpleNamespace(
+            transport=transport,
+            ecodan=EcodanClient(self, transport, f'{config["ECODAN_API_BASE_URL"]}/{index}',
+                                'loadtest', 'loadtest'),
+            hab=HabClient(self, transport, f'{config["HAB_API_BASE_URL"]}/{index}',
+                          'loadtest', 'loadtest'),
+            mme_soleil=MmeSoleilClient(self, transport, f'{config["MME_SOLEIL_BASE_URL"]}/{index}',
+                                       'loadtest', 'loadtest'),
+        )
+
+        self.locks = LockService(self)
+
+        self.services = SimpleNamespace(app=self)
+        self.services.thermal = ThermalService(self)
+        self.services.tariff = TariffService(self)
+        self.services.cop = CopService(self)
+        self.services.legionella = LegionellaService(self)
+        self.services.dhw = DhwService(self)
+        self.services.heating = HeatingService(self)
+        self.services.controller = ControllerService(self)
+
+    def run(self, coroutine):
+        # tasks inherit the context, so every query of this task uses our database
+        token = RoutingDatabase.installation_path.set(self.db_path)
+        try:
+            return asyncio.create_task(coroutine)
+        finally:
+            RoutingDatabase.installation_path.reset(token)
+
+    async def startup(self, db):
+        await db.migrate()
+        await self.services.controller.set_operating_mode_from_state()
+        await self.services.legionella.plan()
+        await self.services.heating.update_from_state()
+        await self.services.heating.plan()
+
+    async def drive(self, stats, slot, end):
+        # spread the installations over the slot, like independent controllers
+        next_tick = time.perf_counter() + random.uniform(0, slot)
+
+        while next_tick < end:
+            await asyncio.sleep(max(next_tick - time.perf_counter(), 0))
+
+            start = time.perf_counter()
+            try:
+                await self.services.controller.evaluate()
+            except Exception as e:
+                stats.add_error(e)
+            stats.ticks.append(time.perf_counter() - start)
+
+            next_tick += slot
+
+    async def shutdown(self):
+        await asyncio.gather(
+            self.clients.ecodan.shutdown(),
+            self.clients.hab.shutdown(),
+            self.clients.mme_soleil.shutdown(),
+        )
+
+
+def get_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def monitor(stats, interval=0.1):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        stats.loop_lags.append(time.perf_counter() - start - interval)
+        stats.threads = max(stats.threads, threading.active_count())
+        stats.rss = max(stats.rss, get_rss())
+
+
+async def run_step(config, count, slot, duration, tmp):
+    stats = LoadStats()
+    db = RoutingDatabase(SimpleNamespace(config=config), stats)
+
+    installations = [
+        InstallationApp(config, i, os.path.join(tmp, f'{count}-{i}.db')) for i in range(count)
+    ]
+
+    startup = await asyncio.gather(
+        *[i.run(i.startup(db)) for i in installations], return_exceptions=True)
+    for error in startup:
+        if isinstance(error, Exception):
+            stats.add_error(error)
+
+    stats.connect_waits = []
+    monitor_task = asyncio.create_task(monitor(stats))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[i.run(i.drive(stats, slot, start + duration)) for i in installations])
+
+    monitor_task.cancel()
+    await asyncio.gather(*[i.shutdown() for i in installations])
+
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if len(values) > 0 else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Drive many virtual installations and report where the controller saturates.')
+    parser.add_argument('--installations', default='1,10,25,50',
+                        help='comma separated numbers of installations to test, default 1,10,25,50')
+    parser.add_argument('--slot', type=float, default=30,
+                        help='seconds between evaluations of an installation, default 30')
+    parser.add_argument('--duration', type=float, default=120,
+                        help='seconds to run every step, default 120')
+    parser.add_argument('--latency-ms', type=float, default=20,
+                        help='latency of the stand-in APIs, default 20')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of failing stand-in requests, default 0')
+    parser.add_argument('--port', type=int, default=8101,
+                        help='first of three ports for the stand-in APIs, default 8101')
+    args = parser.parse_args()
+
+    try:
+        counts = [int(c) for c in args.installations.split(',')]
+    except ValueError:
+        parser.error('--installations expects comma separated numbers')
+
+    host = '127.0.0.1'
+    standin = subprocess.Popen([
+        sys.executable, '-m', 'standin', '--installations', str(max(counts)),
+        '--host', host, '--hab-port', str(args.port), '--mme-soleil-port', str(args.port + 1),
+        '--ecodan-port', str(args.port + 2), '--latency-ms', str(args.latency_ms),
+        '--error-rate', str(args.error_rate), '--dhw-setpoint', str(Config.DHW_TEMP_OFF),
+    ], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL)
+
+    try:
+        if not wait_for_port(host, args.port + 2):
+            print('Stand-in APIs did not start.', file=sys.stderr)
+            return 1
+
+        config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+        config['HAB_API_BASE_URL'] = f'http://{host}:{args.port}'
+        config['MME_SOLEIL_BASE_URL'] = f'http://{host}:{args.port + 1}'
+        config['ECODAN_API_BASE_URL'] = f'http://{host}:{args.port + 2}'
+        config['HTTP_CASSETTE_MODE'] = ''
+
+        print(f'{"inst":>5}  {"ticks":>6}  {"p50 ms":>7}  {"p95 ms":>7}  {"p99 ms":>7}  '
+              f'{"max ms":>8}  {"missed":>6}  {"lag p99":>7}  {"lag max":>7}  {"threads":>7}  '
+              f'{"conn/s":>7}  {"conn p95":>8}  {"locked":>6}  {"errors":>6}  {"rss MB":>6}')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for count in counts:
+                stats = asyncio.run(run_step(config, count, args.slot, args.duration, tmp))
+
+                missed = len([t for t in stats.ticks if t > args.slot])
+                errors = sum(v for k, v in stats.errors.items() if k != 'locked')
+                print(f'{count:>5}  {len(stats.ticks):>6}  {percentile(stats.ticks, 50):>7.1f}  '
+                      f'{percentile(stats.ticks, 95):>7.1f}  {percentile(stats.ticks, 99):>7.1f}  '
+                      f'{percentile(stats.ticks, 100):>8.1f}  {missed:>6}  '
+                      f'{percentile(stats.loop_lags, 99):>7.1f}  {percentile(stats.loop_lags, 100):>7.1f}  '
+                      f'{stats.threads:>7}  {len(stats.connect_waits) / stats.elapsed:>7.1f}  '
+                      f'{percentile(stats.connect_waits, 95):>8.2f}  {stats.errors.get("locked", 0):>6}  '
+                      f'{errors:>6}  {stats.rss / 2 ** 20:>6.0f}', flush=True)
+
+                if len(stats.errors) > 0:
+                    print(f'       errors: {stats.errors}', file=sys.stderr)
+    finally:
+        standin.terminate()
+        standin.wait()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
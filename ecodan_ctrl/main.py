@@ -17,6 +17,8 @@
 import asyncio
 import datetime
 import logging
+import logging.handlers
+import queue
 
 import pytz
 
@@ -31,22 +33,40 @@ from db.base import Database
 from clients.ecodan import EcodanClient
 from clients.hab import HabClient
 from clients.mme_soleil import MmeSoleilClient
+from clients.transport import HttpTransport
 
 from services.dhw import DhwService
 from services.heating import HeatingService
+from services.history import HistoryService
+from services.leader import LeaderService
 from services.legionella import LegionellaService
+from services.lock import LockService
+from services.preview import PreviewService
+from services.snapshot import SnapshotService
+from services.config import ConfigService
 from services.controller import ControllerService
+from services.cop import CopService
+from services.tariff import TariffService
+from services.thermal import ThermalService
 
+from blueprints.config import config
 from blueprints.grafana import grafana
+from blueprints.plan import plan
 from blueprints.status import status
 
+from util.fastjson import FastJSONProvider
+from util.log import LazyQueueHandler, RingBufferHandler, StructuredMessage
+
 
 class Clients:
     def __init__(self, app):
         self.app = app
 
+        self.transport = HttpTransport(app)
+
         self.ecodan = EcodanClient(
             app=self.app,
+            transport=self.transport,
             base_url=self.app.config['ECODAN_API_BASE_URL'],
             username=self.app.config['ECODAN_API_USERNAME'],
             password=self.app.config['ECODAN_API_PASSWORD']
@@ -54,6 +74,7 @@ class Clients:
 
         self.hab = HabClient(
             app=self.app,
+            transport=self.transport,
             base_url=self.app.config['HAB_API_BASE_URL'],
             username=self.app.config['HAB_API_USERNAME'],
             password=self.app.config['HAB_API_PASSWORD']
@@ -61,6 +82,7 @@ class Clients:
 
         self.mme_soleil = MmeSoleilClient(
             app=self.app,
+            transport=self.transport,
             base_url=self.app.config['MME_SOLEIL_BASE_URL'],
             username=self.app.config['MME_SOLEIL_USERNAME'],
             password=self.app.config['MME_SOLEIL_PASSWORD']
@@ -78,36 +100,61 @@ class Services:
     def __init__(self, app):
         self.app = app
 
+        self.history = HistoryService(app)
+        self.thermal = ThermalService(app)
+        self.tariff = TariffService(app)
+        self.cop = CopService(app)
+
         self.legionella = LegionellaService(app)
         self.dhw = DhwService(app)
         self.heating = HeatingService(app)
 
         self.controller = ControllerService(app)
+        self.preview = PreviewService(app)
+        self.config = ConfigService(app)
+        self.snapshot = SnapshotService(app)
+        self.leader = LeaderService(app)
 
 
 class Logger:
     def __init__(self, app):
         self.app = app
         self.logger = logging.getLogger('ecodan_ctrl')
-        hdlr = logging.StreamHandler()
-        hdlr.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-        self.logger.addHandler(hdlr)
-        self.logger.setLevel(logging.DEBUG)
+        self.configure(self.app.config)
+
+        stream_hdlr = logging.StreamHandler()
+        stream_hdlr.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+
+        self.buffer = RingBufferHandler(self.app.config['LOG_BUFFER_SIZE'])
 
-    def log(self, *args, **kwargs):
-        return self.logger.log(*args, **kwargs)
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(LazyQueueHandler(log_queue))
+        self.listener = logging.handlers.QueueListener(
+            log_queue, stream_hdlr, self.buffer)
+        self.listener.start()
 
-    def debug(self, message):
-        return self.log(logging.DEBUG, message)
+    def configure(self, config):
+        self.logger.setLevel(config['LOG_LEVEL'])
 
-    def info(self, message):
-        return self.log(logging.INFO, message)
+    def shutdown(self):
+        self.listener.stop()
 
-    def warning(self, message):
-        return self.log(logging.WARNING, message)
+    def log(self, level, message, **fields):
+        if self.logger.isEnabledFor(level):
+            message = StructuredMessage(message, fields)
+            self.logger.log(level, message, extra={'fields': message.fields})
 
-    def error(self, message):
-        return self.log(logging.ERROR, message)
+    def debug(self, message, **fields):
+        return self.log(logging.DEBUG, message, **fields)
+
+    def info(self, message, **fields):
+        return self.log(logging.INFO, message, **fields)
+
+    def warning(self, message, **fields):
+        return self.log(logging.WARNING, message, **fields)
+
+    def error(self, message, **fields):
+        return self.log(logging.ERROR, message, **fields)
 
 
 app = Quart(__name__)
@@ -115,8 +162,10 @@ app.config.from_object(Config)
 app.secret_key = app.config['SECRET_KEY']
 
 app.db = Database(app)
+app.read_only = False
 app.auth = QuartAuth(app)
 app.log = Logger(app)
+app.json = FastJSONProvider(app)
 
 
 @app.before_serving
@@ -125,25 +174,29 @@ async def startup():
 
     loop = asyncio.get_event_loop()
 
-    app.scheduler = AsyncIOScheduler(event_loop=loop)
-    app.scheduler.start()
+    # coalesce runs missed while paused on standby
+    app.scheduler = AsyncIOScheduler(event_loop=loop, job_defaults={'coalesce': True})
+    app.scheduler.start(paused=True)
+    app.locks = LockService(app)
 
     app.startup_time = datetime.datetime.now(tz=pytz.timezone("Europe/Brussels"))
 
     app.clients = Clients(app)
     app.services = Services(app)
 
-    await app.services.controller.set_operating_mode_from_state()
-    await app.services.legionella.plan()
-
-    await app.services.heating.update_from_state()
-    await app.services.heating.plan()
+    app.services.config.start()
+    await app.services.leader.start()
 
     app.register_blueprint(grafana, url_prefix='/grafana')
     app.register_blueprint(status, url_prefix='/status')
+    app.register_blueprint(plan, url_prefix='/plan')
+    app.register_blueprint(config, url_prefix='/config')
 
 
 @app.after_serving
 async def shutdown():
     app.scheduler.shutdown()
+    app.services.config.stop()
+    await app.services.leader.stop()
     await app.clients.shutdown()
+    app.log.shutdown()
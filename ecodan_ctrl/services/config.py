@@ -0,0 +1,199 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import copy
+import os
+
+from config import load_config
+from db.models.operating_mode import Circuit
+
+
+class ConfigService:
+    def __init__(self, app):
+        self.app = app
+
+        self.config_file = self.app.config['CONFIG_FILE']
+        self.watch_interval = self.app.config['CONFIG_WATCH_INTERVAL_SECONDS']
+        self.config_mtime = self.get_mtime()
+
+        self.reload_lock = asyncio.Lock()
+        self.task = None
+
+        # only read while starting up
+        self.restart_prefixes = (
+            'QUART_', 'ECODAN_API_', 'HAB_API_', 'MME_SOLEIL_', 'DATABASE_', 'CONFIG_',
+            'LOG_BUFFER_', 'HISTORY_INTERVAL_', 'SNAPSHOT_INTERVAL_', 'HTTP_', 'JSON_',
+            'HEATING_REPLAN_INTERVAL_', 'HA_', 'RUNNER_',
+            'LOCK_WAIT_HISTORY'
+        )
+
+        # settings each plan depends on
+        self.plan_prefixes = {
+            'heating': ('HEATING_',),
+            'dhw': ('DHW_', 'HEATING_SUMMER_MODE_'),
+            'legionella': ('DHW_LEGIONELLA_', 'DHW_TEMP_LEGIONELLA', 'DHW_MIN_INTERVAL_'),
+        }
+
+    def get_mtime(self):
+        if self.config_file is None:
+            return None
+
+        try:
+            return os.stat(self.config_file).st_mtime
+        except OSError:
+            return None
+
+    @staticmethod
+    def read_env_file(path):
+        environ = {}
+
+        with open(path, 'r') as env_file:
+            for line in env_file:
+                line = line.strip()
+                if not line or line.startswith('#') or '=' not in line:
+                    continue
+
+                key, value = line.split('=', 1)
+                key = key.removeprefix('export ').strip()
+                environ[key] = value.strip().strip('"\'')
+
+        return environ
+
+    def load(self):
+        environ = dict(os.environ)
+        if self.config_file is not None:
+            environ.update(self.read_env_file(self.config_file))
+
+        config = load_config(environ)
+        return {k: getattr(config, k) for k in dir(config) if k.isupper()}
+
+    def get_services(self):
+        return [
+            service for name, service in vars(self.app.services).items()
+            if name != 'app' and hasattr(service, 'configure')
+        ]
+
+    async def reload(self):
+        """
+        Reload the configuration and apply the changed settings to the running
+        services, replanning only the schedules that depend on them.
+
+        The new settings are validated against copies of the services first,
+        then all services are switched over without yielding to other tasks.
+
+        Returns
+        -------
+        dict
+            The changed settings, the settings that need a restart to take
+            effect and the replanned schedules.
+
+        Raises
+        ------
+        ValueError
+            When the new configuration is invalid, nothing is changed then.
+        """
+        async with self.reload_lock:
+            try:
+                config = self.load()
+            except (OSError, TypeError, ValueError) as e:
+                raise ValueError(f'Invalid configuration: {e}')
+
+            changed = sorted(k for k, v in config.items() if self.app.config.get(k) != v)
+            restart = [k for k in changed if k.startswith(self.restart_prefixes)]
+            changed = [k for k in changed if k not in restart]
+
+            if len(restart) > 0:
+                self.app.log.warning(
+                    'Changed settings {settings} only take effect after a restart.',
+                    settings=restart)
+
+            if len(changed) == 0:
+                return {'changed': [], 'restart': restart, 'replanned': []}
+
+            new_config = dict(self.app.config)
+            new_config.update({k: config[k] for k in changed})
+
+            services = self.get_services()
+            try:
+                for service in services:
+                    copy.copy(service).configure(new_config)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f'Invalid configuration: {e}')
+
+            self.app.config.update({k: config[k] for k in changed})
+            for service in services:
+                service.configure(self.app.config)
+            self.app.log.configure(self.app.config)
+
+            replanned = []
+            if self.app.services.leader.is_leader:
+                # a standby gets the plans of the leader through its snapshot
+                replanned = [
+                    name for name, prefixes in self.plan_prefixes.items()
+                    if any(k.startswith(prefixes) for k in changed)
+                ]
+
+            self.app.log.info(
+                'Reloaded configuration, changed settings: {settings}, replanning: {replanned}.',
+                settings=changed, replanned=replanned)
+
+            locks = self.app.locks
+            for name in replanned:
+                if name == 'heating':
+                    async with locks.hold(Circuit.HEATING, 'ConfigService.reload'):
+                        await self.app.services.heating.plan()
+                else:
+                    async with locks.hold(Circuit.DHW, 'ConfigService.reload'):
+                        await getattr(self.app.services, name).plan(replan=True)
+
+            return {
+                'changed': changed,
+                'restart': restart,
+                'replanned': replanned
+            }
+
+    async def watch(self):
+        mtime = self.get_mtime()
+        if mtime is None or mtime == self.config_mtime:
+            return
+
+        self.config_mtime = mtime
+        self.app.log.info('Configuration file {file} changed.', file=self.config_file)
+
+        try:
+            await self.reload()
+        except ValueError as e:
+            self.app.log.error('Not reloading configuration: {error}', error=e)
+
+    def start(self):
+        # not a scheduler job, the scheduler is paused on a standby and on
+        # workers not running the controller, which must reload as well
+        if self.config_file is not None:
+            self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                await self.watch()
+            except Exception as e:
+                # checked again on the next round, the loop must keep running
+                self.app.log.error('Failed to watch the configuration: {error}.', error=str(e))
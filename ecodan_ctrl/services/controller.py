@@ -18,6 +18,7 @@ import asyncio
 import datetime
 
 import pytz
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
 
 from db.models.dhw_schedule import DhwSchedule
 from db.models.operating_mode import Circuit, DhwMode, OperatingMode
@@ -27,14 +28,21 @@ class ControllerService:
     def __init__(self, app):
         self.app = app
 
-        self.dhw_temp_off = self.app.config['DHW_TEMP_OFF']
-        self.dhw_temp_base = self.app.config['DHW_TEMP_BASE']
-        self.dhw_temp_buffer = self.app.config['DHW_TEMP_BUFFER']
-        self.dhw_temp_legionella = self.app.config['DHW_TEMP_LEGIONELLA']
-        self.dhw_temp_drop_ecodan = self.app.config['DHW_TEMP_DROP_ECODAN']
+        self.configure(self.app.config)
 
         self.__scheduled_jobs()
 
+    def configure(self, config):
+        self.dhw_temp_off = config['DHW_TEMP_OFF']
+        self.dhw_temp_base = config['DHW_TEMP_BASE']
+        self.dhw_temp_buffer = config['DHW_TEMP_BUFFER']
+        self.dhw_temp_legionella = config['DHW_TEMP_LEGIONELLA']
+        self.dhw_temp_drop_ecodan = config['DHW_TEMP_DROP_ECODAN']
+
+        self.tick_fast_seconds = config['CONTROLLER_TICK_FAST_SECONDS']
+        self.tick_seconds = config['CONTROLLER_TICK_SECONDS']
+        self.tick_idle_seconds = config['CONTROLLER_TICK_IDLE_SECONDS']
+
     async def set_operating_mode_from_state(self):
         current_state, setpoint, current_operating_mode, dhw_temp = (
             await asyncio.gather(
@@ -79,10 +87,11 @@ class ControllerService:
 
         if current_operating_mode is not None and current_operating_mode.mode == mode:
             self.app.log.debug(
-                f'Operating mode was already set correctly to: {mode}')
+                'Operating mode was already set correctly to: {mode}', mode=mode)
             return
 
-        self.app.log.debug(f'Setting {Circuit.DHW} to mode: {mode}')
+        self.app.log.debug(
+            'Setting {circuit} to mode: {mode}', circuit=Circuit.DHW, mode=mode)
 
         operating_mode = OperatingMode(
             circuit=Circuit.DHW,
@@ -102,16 +111,27 @@ class ControllerService:
 
         if can_start:
             self.app.log.debug(
-                f'Allowed to start cycle: current consumption of {current_consumption.value} is '
-                f'below threshold value of {threshold}.')
+                'Allowed to start cycle: current consumption of {consumption} is '
+                'below threshold value of {threshold}.',
+                consumption=current_consumption.value, threshold=threshold)
         else:
             self.app.log.debug(
-                f'Preventing start of cycle: current consumption of {current_consumption.value} is '
-                f'above threshold value of {threshold}.')
+                'Preventing start of cycle: current consumption of {consumption} is '
+                'above threshold value of {threshold}.',
+                consumption=current_consumption.value, threshold=threshold)
 
         return can_start
 
     async def evaluate(self):
+        locks = self.app.locks
+
+        async with locks.hold(Circuit.DHW, 'ControllerService.evaluate'):
+            await self.evaluate_dhw()
+
+        async with locks.hold(Circuit.HEATING, 'ControllerService.evaluate'):
+            await self.app.services.heating.evaluate()
+
+    async def evaluate_dhw(self):
 
         def time_to_start(planned_start, now):
             if planned_start <= now:
@@ -130,7 +150,7 @@ class ControllerService:
         if operating_mode.mode in om_pending and operating_mode.last_modified <= (now - datetime.timedelta(minutes=15)):
             # pending for too long, turn back off
             self.app.log.debug(
-                f'DHW mode was {operating_mode.mode} for too long, aborting.')
+                'DHW mode was {mode} for too long, aborting.', mode=operating_mode.mode)
             if operating_mode.mode == DhwMode.PENDING_NORMAL:
                 await self.app.services.dhw.stop()
             elif operating_mode.mode == DhwMode.PENDING_LEGIONELLA:
@@ -161,9 +181,83 @@ class ControllerService:
         await self.app.services.dhw.update_from_state()
 
         await self.app.services.dhw.plan()
-        await self.app.services.heating.evaluate()
+
+    async def get_next_wakeup(self, now):
+        wakeups = []
+
+        dhw_planned = await DhwSchedule.get_next_planned()
+        if dhw_planned is not None:
+            wakeups.extend([dhw_planned.planned_start, dhw_planned.ultimate_start])
+
+        next_setpoint = self.app.services.heating.heating_plan.get_next_setpoint(now)
+        if next_setpoint is not None:
+            wakeups.append(next_setpoint.timestamp)
+
+        wakeups = [w for w in wakeups if w > now]
+        if len(wakeups) > 0:
+            return min(wakeups)
+
+    async def get_tick_delay(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        operating_mode = await OperatingMode.from_circuit('dhw')
+        mode = operating_mode.mode if operating_mode is not None else DhwMode.OFF
+
+        if mode in (DhwMode.RUNNING_BUFFER, DhwMode.RUNNING_STEPPED, DhwMode.RUNNING_LEGIONELLA):
+            # net power changes quickly, follow closely
+            return self.tick_fast_seconds
+
+        if mode != DhwMode.OFF or not await self.app.services.heating.is_settled():
+            delay = self.tick_seconds
+        else:
+            delay = self.tick_idle_seconds
+
+        next_wakeup = await self.get_next_wakeup(now)
+        if next_wakeup is not None:
+            # one second late, so the start is due when we evaluate
+            delay = min(delay, (next_wakeup - now).total_seconds() + 1)
+
+        return delay
+
+    def schedule_tick(self, delay):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        self.app.scheduler.add_job(
+            self.tick, 'date', id='controller_tick', replace_existing=True,
+            run_date=now + datetime.timedelta(seconds=delay))
+
+    async def tick(self):
+        # fallback in case the evaluation fails, replaced below
+        self.schedule_tick(self.tick_seconds)
+
+        await self.evaluate()
+
+        delay = await self.get_tick_delay()
+        self.app.log.debug('Next evaluation in {delay} seconds.', delay=round(delay))
+        self.schedule_tick(delay)
+
+    async def advance_tick(self):
+        job = self.app.scheduler.get_job('controller_tick')
+        if job is None:
+            # currently evaluating, will reschedule itself
+            return
+
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        delay = await self.get_tick_delay()
+
+        if now + datetime.timedelta(seconds=delay) < job.next_run_time:
+            self.app.log.debug(
+                'Advancing next evaluation to {delay} seconds.', delay=round(delay))
+            self.schedule_tick(delay)
+
+    def on_job_executed(self, event):
+        if event.job_id != 'controller_tick':
+            # other jobs may have changed the plans, check if we should wake earlier
+            asyncio.ensure_future(self.advance_tick())
 
     def __scheduled_jobs(self):
-        self.app.scheduler.add_job(self.evaluate, 'cron', second='15,45')
+        self.schedule_tick(self.tick_seconds)
+        self.app.scheduler.add_listener(
+            self.on_job_executed, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
         self.app.scheduler.add_job(
-            self.set_operating_mode_from_state, 'cron', minute='*/20')
+            self.app.locks.wrap(Circuit.DHW, self.set_operating_mode_from_state),
+            'cron', minute='*/20')
@@ -0,0 +1,149 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import datetime
+
+import numpy as np
+import pytz
+
+from db.models.measurement import Measurement
+from util.cop import CopModel
+
+
+class CopService:
+    def __init__(self, app):
+        self.app = app
+
+        self.configure(self.app.config)
+
+        # volumetric heat capacity of water in kWh/(l.K)
+        self.water_heat_capacity = 4.186 / 3600
+
+        self.model = None
+        self.fitted_at = None
+        self.fit_attempted = False
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
+        self.enabled = config['COP_MODEL_ENABLED']
+        self.history_period = datetime.timedelta(days=config['COP_MODEL_HISTORY_DAYS'])
+        self.tank_litres = config['DHW_TANK_LITRES']
+        self.dhw_temp_off = config['DHW_TEMP_OFF']
+        self.interval = config['HISTORY_INTERVAL_MINUTES'] * 60
+
+    def get_tank_heat_capacity(self):
+        return self.tank_litres * self.water_heat_capacity
+
+    async def get_model(self):
+        """
+        The fitted model, fitted on first use after a start. None when the
+        model is disabled or the history is too short, until the nightly fit.
+        """
+        if not self.enabled:
+            return None
+        if self.model is None and not self.fit_attempted:
+            try:
+                await self.fit()
+            except Exception as e:
+                # planning goes on with the configured cycle energy
+                self.app.log.warning('Failed to fit COP model: {error}.', error=str(e))
+        return self.model
+
+    async def fit(self):
+        if not self.enabled:
+            return
+
+        self.fit_attempted = True
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        start = now - self.history_period
+
+        self.app.log.debug('Fitting COP model of the heat pump.')
+
+        dhw_temp, dhw_setpoint, outside, consumption, baseline = await asyncio.gather(
+            Measurement.get_arrays('dhw_temp', start, now),
+            Measurement.get_arrays('dhw_setpoint', start, now),
+            Measurement.get_arrays('outside_temp', start, now),
+            Measurement.get_arrays('consumption', start, now),
+            self.app.clients.hab.get_baseline_consumption(),
+        )
+
+        model = CopModel.fit(
+            dhw_temp, dhw_setpoint, outside, consumption,
+            base_load_w=baseline.q50,
+            heat_capacity=self.get_tank_heat_capacity(),
+            dhw_temp_off=self.dhw_temp_off,
+            step=self.interval
+        )
+
+        if model is None:
+            self.app.log.debug(
+                'Not enough DHW cycles in the history to fit COP model, keeping previous model.')
+            return
+
+        self.app.log.debug(
+            'Fitted COP model on {samples} samples: a={a:.3f}, b={b:.4f}, c={c:.4f}, '
+            'rmse={rmse:.3f} kWh.',
+            samples=model.samples, a=model.a, b=model.b, c=model.c, rmse=model.rmse)
+
+        self.model = model
+        self.fitted_at = now
+
+    def get_cycle_kwh(self, outside_temp, temp_from, temp_to):
+        """
+        Electrical energy in kWh needed to heat the tank from `temp_from` to
+        `temp_to` at the given outside temperature, element-wise for arrays.
+
+        Returns
+        -------
+        float or numpy.ndarray or None
+            The energy, or None if no model is fitted.
+        """
+        if self.model is None:
+            return None
+
+        heat = self.get_tank_heat_capacity() * np.maximum(
+            np.asarray(temp_to, dtype=float) - temp_from, 0)
+        return heat / self.model.get_cop(outside_temp, (np.asarray(temp_from) + temp_to) / 2)
+
+    async def get_cycle_kwh_at(self, timestamp, temp_from, temp_to):
+        """
+        Electrical energy in kWh needed to heat the tank from `temp_from` to
+        `temp_to` in a cycle starting at `timestamp`, using the forecast
+        outside temperature.
+
+        Returns
+        -------
+        float or None
+            The energy, or None if no model is fitted or there is no forecast.
+        """
+        if await self.get_model() is None:
+            return None
+
+        forecast = await self.app.clients.mme_soleil.get_production_forecast()
+        if forecast is None or not forecast.covers(timestamp, timestamp):
+            return None
+
+        outside_temp = forecast.get_temperature_at(timestamp.timestamp())
+        if outside_temp is None:
+            return None
+
+        return float(self.get_cycle_kwh(outside_temp, temp_from, temp_to))
+
+    def __scheduled_jobs(self):
+        self.app.scheduler.add_job(self.fit, 'cron', hour='3', minute='50')
@@ -23,53 +23,81 @@ import pytz
 from db.models.dhw_schedule import DhwSchedule
 from db.models.operating_mode import Circuit, DhwMode, OperatingMode, DhwRunningMode
 from db.models.dhw_setpoint import DhwSetpoint
+from db.models.measurement import Measurement
 from errors.dhw import MaxRetriesExceededError
+from util.tank import TankModel
 
 
 class DhwService:
     def __init__(self, app):
         self.app = app
 
-        self.runtime_hours = self.app.config['DHW_NORMAL_RUNTIME_HOURS']
+        self.tank_model = None
+        self.tank_model_fitted = False
+
+        self.configure(self.app.config)
+
+        self.buffer_interval = 2
+        # net power samples as (epoch, watts), covering the last window
+        # regardless of the tick rate
+        self.buffer_power_stack = []
+        self.buffer_power_window = datetime.timedelta(minutes=4)
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
+        self.runtime_hours = config['DHW_NORMAL_RUNTIME_HOURS']
         self.runtime = datetime.timedelta(hours=self.runtime_hours)
 
         self.min_interval = datetime.timedelta(
-            minutes=self.app.config['DHW_MIN_INTERVAL_MINUTES']
+            minutes=config['DHW_MIN_INTERVAL_MINUTES']
         )
 
         self.min_interval_retry = datetime.timedelta(
-            minutes=self.app.config['DHW_MIN_INTERVAL_RETRY_MINUTES']
+            minutes=config['DHW_MIN_INTERVAL_RETRY_MINUTES']
         )
 
-        self.max_interval_hours = self.app.config['DHW_NORMAL_INTERVAL_MAX_HOURS']
+        self.max_interval_hours = config['DHW_NORMAL_INTERVAL_MAX_HOURS']
         self.max_interval = datetime.timedelta(hours=self.max_interval_hours)
 
-        self.max_retry = self.app.config['DHW_MAX_RETRY']
+        self.max_retry = config['DHW_MAX_RETRY']
 
-        self.running_mode = DhwRunningMode(self.app.config["DHW_RUNNING_MODE"])
-        self.running_mode_stepped_max_temp = self.app.config[
+        self.running_mode = DhwRunningMode(config["DHW_RUNNING_MODE"])
+        self.running_mode_stepped_max_temp = config[
             "DHW_RUNNING_MODE_AUTO_STEP_MAX_TEMP"
         ]
 
-        self.dhw_temp_off = self.app.config['DHW_TEMP_OFF']
-        self.dhw_temp_base = self.app.config['DHW_TEMP_BASE']
-        self.dhw_temp_buffer_max = self.app.config["DHW_TEMP_BUFFER"]
-        self.dhw_temp_drop = self.app.config['DHW_TEMP_DROP']
-        self.dhw_temp_drop_winter = self.app.config["DHW_TEMP_DROP_WINTER"]
-        self.dhw_temp_drop_ecodan = self.app.config['DHW_TEMP_DROP_ECODAN']
+        self.dhw_temp_off = config['DHW_TEMP_OFF']
+        self.dhw_temp_base = config['DHW_TEMP_BASE']
+        self.dhw_temp_buffer_max = config["DHW_TEMP_BUFFER"]
+        self.dhw_temp_drop = config['DHW_TEMP_DROP']
+        self.dhw_temp_drop_winter = config["DHW_TEMP_DROP_WINTER"]
+        self.dhw_temp_drop_ecodan = config['DHW_TEMP_DROP_ECODAN']
 
-        self.legionella_temp_min_start = self.app.config['DHW_TEMP_LEGIONELLA'] - \
+        self.legionella_temp_min_start = config['DHW_TEMP_LEGIONELLA'] - \
             self.dhw_temp_drop_ecodan
 
-        self.force_legionella_min_temp = self.app.config['HEATING_FADE_MIN_NEXTDAY_TEMP']
+        self.force_legionella_min_temp = config['HEATING_FADE_MIN_NEXTDAY_TEMP']
 
-        self.buffer_interval = 2
-        self.buffer_power_stack = []
-        self.buffer_power_stack_size = 8
+        self.consumption_kwh = config['DHW_NORMAL_KWH']
 
-        self.consumption_kwh = self.app.config['DHW_NORMAL_KWH']
+        self.model_enabled = config['DHW_MODEL_ENABLED']
+        self.model_history_period = datetime.timedelta(
+            days=config['DHW_MODEL_HISTORY_DAYS'])
 
-        self.__scheduled_jobs()
+        ambient_temp = config['DHW_MODEL_AMBIENT_TEMP']
+        if self.tank_model is None or self.tank_model.ambient_temp != ambient_temp:
+            self.tank_model = TankModel(ambient_temp)
+            self.tank_model_fitted = False
+
+    def get_state(self):
+        return {
+            'buffer_power_stack': self.buffer_power_stack
+        }
+
+    def set_state(self, state):
+        self.buffer_power_stack = [
+            tuple(sample) for sample in state['buffer_power_stack'] if isinstance(sample, list)]
 
     async def get_dhw_base_temp(self):
         summer_mode = await self.app.services.heating.is_summer_mode()
@@ -79,7 +107,75 @@ class DhwService:
         else:
             return self.dhw_temp_base - self.dhw_temp_drop_winter
 
-    async def plan(self):
+    async def get_cycle_kwh(self, timestamp):
+        """
+        Expected electrical energy in kWh of a DHW cycle starting at
+        `timestamp`, from the COP model when it is fitted.
+        """
+        cop = self.app.services.cop
+        if await cop.get_model() is None:
+            return 3
+
+        kwh = await cop.get_cycle_kwh_at(
+            timestamp, await self.get_dhw_base_temp(), self.dhw_temp_base)
+        return 3 if kwh is None else kwh
+
+    async def fit_tank_model(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        start = now - self.model_history_period
+
+        self.app.log.debug('Fitting DHW tank model.')
+
+        dhw_temp, dhw_setpoint = await asyncio.gather(
+            Measurement.get_series('dhw_temp', start, now),
+            Measurement.get_series('dhw_setpoint', start, now),
+        )
+
+        setpoints = {m.timestamp: m.value for m in dhw_setpoint}
+        heating = [
+            setpoints.get(m.timestamp, self.dhw_temp_off) > self.dhw_temp_off
+            for m in dhw_temp
+        ]
+
+        self.tank_model.fit(
+            [m.timestamp for m in dhw_temp],
+            [m.value for m in dhw_temp],
+            heating
+        )
+        self.tank_model_fitted = True
+
+    async def observe_tank(self, timestamp, dhw_temp):
+        if not self.model_enabled:
+            return
+
+        if not self.tank_model_fitted:
+            await self.fit_tank_model()
+
+        operating_mode = await OperatingMode.from_circuit('dhw')
+        self.tank_model.observe(
+            timestamp, dhw_temp, heating=operating_mode.mode != DhwMode.OFF)
+
+    def predict_crossing(self, now, dhw_temp, threshold):
+        if not self.model_enabled:
+            return None
+
+        return self.tank_model.predict_crossing(
+            now, dhw_temp, threshold, self.max_interval)
+
+    async def plan(self, replan=False):
+        new_schedule = await self.make_plan(replan)
+        if new_schedule is None:
+            return
+
+        self.app.log.debug(
+            'Saving new schedule. First start: {first_start}, planned start: {planned_start}, '
+            'ultimate start: {ultimate_start}.',
+            mode='dhw', first_start=new_schedule.first_start,
+            planned_start=new_schedule.planned_start, ultimate_start=new_schedule.ultimate_start)
+
+        await new_schedule.save()
+
+    async def make_plan(self, replan=False):
         now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
 
         self.app.log.debug('Planning DHW cycle')
@@ -95,26 +191,44 @@ class DhwService:
         ]:
             # already running
             self.app.log.debug('Already running, not planning.')
-            return
+            return None
 
         current_schedule = await DhwSchedule.from_mode('dhw')
-        if current_schedule and current_schedule.planned_start >= now:
+        if current_schedule and current_schedule.planned_start >= now and not replan:
             # already planned
             self.app.log.debug('Already planned, not replanning.')
-            return
+            return None
 
         current_temp, dhw_base_temp = await asyncio.gather(
             self.app.clients.hab.get_current_dhw_temp(), self.get_dhw_base_temp()
         )
 
+        first_start = now + self.min_interval
+        ultimate_start = now + self.max_interval - self.runtime
+        predicted = False
+
         if current_temp.value > dhw_base_temp:
-            # still hot enough
+            expected_crossing = self.predict_crossing(
+                now, current_temp.value, dhw_base_temp)
+
+            if expected_crossing is None:
+                # still hot enough
+                self.app.log.debug(
+                    'DHW above threshold temperature, not planning.')
+                return None
+
+            # plan ahead, from the moment the ecodan would start heating
+            expected_start = self.predict_crossing(
+                now, current_temp.value, self.dhw_temp_base - self.dhw_temp_drop_ecodan)
+
             self.app.log.debug(
-                'DHW above threshold temperature, not planning.')
-            return
+                'DHW expected to drop below threshold temperature of {threshold} '
+                'at {expected_crossing}, planning ahead.',
+                threshold=dhw_base_temp, expected_crossing=expected_crossing)
 
-        first_start = now + self.min_interval
-        ultimate_start = now + self.max_interval - self.runtime
+            first_start = max(first_start, expected_start or expected_crossing)
+            ultimate_start = expected_crossing + self.max_interval - self.runtime
+            predicted = True
 
         if ultimate_start.hour >= 22:
             ultimate_start = pytz.timezone("Europe/Brussels").localize(
@@ -134,24 +248,20 @@ class DhwService:
         planned_start = (await self.app.clients.mme_soleil.get_peak_production(
             start=first_start,
             end=ultimate_start,
-            min_kwh=3,
+            min_kwh=await self.get_cycle_kwh(first_start),
             peak_duration_h=self.runtime_hours,
             order='first'
         )).timestamp
 
-        self.app.log.debug(f'''Saving new schedule. First start: {first_start},
-                           planned start: {planned_start},
-                           ultimate_start: {ultimate_start}''')
-
-        new_schedule = DhwSchedule(
+        return DhwSchedule(
             mode='dhw',
             first_start=first_start,
             planned_start=planned_start,
             ultimate_start=ultimate_start,
             fast=True,
-            retry=0
+            retry=0,
+            predicted=predicted
         )
-        await new_schedule.save()
 
     async def reschedule(self):
         current_schedule = await DhwSchedule.from_mode('dhw')
@@ -163,11 +273,16 @@ class DhwService:
         )
 
         if current_temp.value > dhw_base_temp:
-            # hot enough for some reason (triggered manually?)
-            self.app.log.debug(
-                'DHW above threshold temperature, removing schedule.')
-            await current_schedule.remove()
-            return
+            now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+            expected_crossing = self.predict_crossing(
+                now, current_temp.value, dhw_base_temp)
+
+            if expected_crossing is None or expected_crossing > current_schedule.ultimate_start:
+                # hot enough for some reason (triggered manually?)
+                self.app.log.debug(
+                    'DHW above threshold temperature, removing schedule.')
+                await current_schedule.remove()
+                return
 
         self.app.log.debug('Rescheduling DHW cycle')
 
@@ -176,19 +291,20 @@ class DhwService:
         planned_start = (await self.app.clients.mme_soleil.get_peak_production(
             start=current_schedule.first_start,
             end=current_schedule.ultimate_start,
-            min_kwh=3,
+            min_kwh=await self.get_cycle_kwh(current_schedule.first_start),
             peak_duration_h=self.runtime_hours,
             order='first'
         )).timestamp
 
         if planned_start >= now + self.min_interval:
             self.app.log.debug(
-                f'Rescheduled to planned_start: {planned_start}')
+                'Rescheduled to planned start: {planned_start}', mode='dhw', planned_start=planned_start)
             current_schedule.planned_start = planned_start
             await current_schedule.save()
         else:
             self.app.log.debug(
-                f'Newly planned_start of {planned_start} is too close to current time, not rescheduling.')
+                'Newly planned start of {planned_start} is too close to current time, not rescheduling.',
+                planned_start=planned_start)
 
     async def postpone(self):
         current_schedule = await DhwSchedule.from_mode('dhw')
@@ -215,15 +331,16 @@ class DhwService:
         planned_start = (await self.app.clients.mme_soleil.get_peak_production(
             start=first_start,
             end=current_schedule.ultimate_start,
-            min_kwh=3,
+            min_kwh=await self.get_cycle_kwh(first_start),
             peak_duration_h=self.runtime_hours,
             order='first'
         )).timestamp
 
-        self.app.log.debug(f'''Postponing (retry {current_schedule.retry + 1})
-                           First start: {first_start},
-                           planned start: {planned_start},
-                           ultimate_start: {current_schedule.ultimate_start}''')
+        self.app.log.debug(
+            'Postponing (retry {retry}). First start: {first_start}, '
+            'planned start: {planned_start}, ultimate start: {ultimate_start}.',
+            mode='dhw', retry=current_schedule.retry + 1, first_start=first_start,
+            planned_start=planned_start, ultimate_start=current_schedule.ultimate_start)
 
         current_schedule.first_start = first_start
         current_schedule.planned_start = planned_start
@@ -242,17 +359,34 @@ class DhwService:
 
         self.app.log.debug('Starting DHW cycle')
 
-        can_start, next_legionella, outside_temp = await asyncio.gather(
+        can_start, current_schedule, next_legionella, outside_temp, dhw_temp = await asyncio.gather(
             self.app.services.controller.can_start(),
+            DhwSchedule.from_mode("dhw"),
             DhwSchedule.from_mode("legionella"),
             self.app.clients.hab.get_current_outside_temp(),
+            self.app.clients.hab.get_current_dhw_temp(),
         )
 
+        stepped = not (self.running_mode == DhwRunningMode.NORMAL or (
+            self.running_mode == DhwRunningMode.AUTO
+            and outside_temp.value > self.running_mode_stepped_max_temp
+        ))
+
+        if (self.model_enabled and current_schedule is not None and current_schedule.predicted
+                and not stepped
+                and dhw_temp.value >= self.dhw_temp_base - self.dhw_temp_drop_ecodan):
+            # planned ahead, but ecodan would not start heating yet
+            self.app.log.debug(
+                'DHW temperature of {temperature} °C still too hot for the ecodan to start.',
+                temperature=dhw_temp.value)
+            can_start = False
+
         now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
 
         if next_legionella is not None and next_legionella.planned_start <= now + self.runtime + (4 * self.min_interval):
             self.app.log.debug(
-                f'Will not start DHW cycle, Legionella cycle is due soon at {next_legionella.planned_start}')
+                'Will not start DHW cycle, Legionella cycle is due soon at {planned_start}',
+                planned_start=next_legionella.planned_start)
 
             self.app.log.debug('Removing DHW schedule.')
             schedule = await DhwSchedule.from_mode('dhw')
@@ -270,10 +404,7 @@ class DhwService:
             else:
                 return
 
-        if self.running_mode == DhwRunningMode.NORMAL or (
-            self.running_mode == DhwRunningMode.AUTO
-            and outside_temp.value > self.running_mode_stepped_max_temp
-        ):
+        if not stepped:
             dhw_setpoint = DhwSetpoint("current", self.dhw_temp_base)
             dhw_target_setpoint = DhwSetpoint("target", self.dhw_temp_base)
 
@@ -300,7 +431,7 @@ class DhwService:
             )
 
         self.app.log.debug(
-            f'Setting {Circuit.DHW} to mode: {DhwMode.PENDING_NORMAL}')
+            'Setting {circuit} to mode: {mode}', circuit=Circuit.DHW, mode=DhwMode.PENDING_NORMAL)
         operating_mode.mode = DhwMode.PENDING_NORMAL
         await operating_mode.save()
 
@@ -326,18 +457,20 @@ class DhwService:
             if dhw_setpoint.setpoint == dhw_target_setpoint.setpoint:
                 # setpoint already at target
                 self.app.log.debug(
-                    f"Current setpoint already equals target setpoint, nothing to do."
+                    "Current setpoint already equals target setpoint, nothing to do."
                 )
             elif dhw_temp.value < dhw_setpoint.setpoint - self.buffer_interval:
                 # not hot enough
                 self.app.log.debug(
-                    f"Still heating up (now: {dhw_temp.value}) to normal temperature, not enabling stepping mode."
+                    "Still heating up (now: {temperature}) to normal temperature, not enabling stepping mode.",
+                    temperature=dhw_temp.value
                 )
                 return
             else:
                 self.app.log.debug("Enabling DHW stepping mode.")
                 self.app.log.debug(
-                    f"Setting {Circuit.DHW} to mode: {DhwMode.RUNNING_STEPPED}"
+                    "Setting {circuit} to mode: {mode}",
+                    circuit=Circuit.DHW, mode=DhwMode.RUNNING_STEPPED
                 )
                 operating_mode.mode = DhwMode.RUNNING_STEPPED
                 await operating_mode.save()
@@ -346,8 +479,10 @@ class DhwService:
             if dhw_temp.value >= dhw_setpoint.setpoint - self.buffer_interval:
                 if dhw_setpoint.setpoint <= dhw_target_setpoint.setpoint - 1:
                     self.app.log.debug(
-                        f"""Current DHW temperature of {dhw_temp.value}° is within {self.buffer_interval}° of current target.
-                        Setting target to {dhw_setpoint.setpoint + 1}°."""
+                        "Current DHW temperature of {temperature}° is within {interval}° of current target. "
+                        "Setting target to {setpoint}°.",
+                        temperature=dhw_temp.value, interval=self.buffer_interval,
+                        setpoint=dhw_setpoint.setpoint + 1
                     )
                     dhw_setpoint.setpoint += 1
                     await asyncio.gather(
@@ -358,12 +493,14 @@ class DhwService:
                     )
                 else:
                     self.app.log.debug(
-                        f"""Current target of {dhw_setpoint.setpoint}° is the final target, not increasing."""
+                        "Current target of {setpoint}° is the final target, not increasing.",
+                        setpoint=dhw_setpoint.setpoint
                     )
             else:
                 self.app.log.debug(
-                    f"""Current DHW temperature of {dhw_temp.value}° is not yet within {self.buffer_interval}° of current target.
-                        Not increasing target yet."""
+                    "Current DHW temperature of {temperature}° is not yet within {interval}° of current target. "
+                    "Not increasing target yet.",
+                    temperature=dhw_temp.value, interval=self.buffer_interval
                 )
 
     async def buffer(self):
@@ -386,12 +523,8 @@ class DhwService:
         )
 
         if next_legionella is not None:
-            next_legionella_outdoor_temp = (
-                await self.app.clients.mme_soleil.get_temperature_stats(
-                    next_legionella.planned_start,
-                    next_legionella.planned_start + datetime.timedelta(hours=2),
-                )
-            )
+            next_legionella_outdoor_temp = \
+                await self.app.services.legionella.get_planned_outside_temp(next_legionella)
         else:
             next_legionella_outdoor_temp = None
 
@@ -401,7 +534,8 @@ class DhwService:
             if dhw_temp.value < dhw_setpoint.setpoint - self.buffer_interval:
                 # not hot enough
                 self.app.log.debug(
-                    f"Still heating up (now: {dhw_temp.value}) to normal temperature, not enabling buffer mode."
+                    "Still heating up (now: {temperature}) to normal temperature, not enabling buffer mode.",
+                    temperature=dhw_temp.value
                 )
                 return
             elif (
@@ -411,7 +545,8 @@ class DhwService:
                 # enable buffer mode
                 self.app.log.debug("Enabling DHW buffer mode.")
                 self.app.log.debug(
-                    f"Setting {Circuit.DHW} to mode: {DhwMode.RUNNING_BUFFER}"
+                    "Setting {circuit} to mode: {mode}",
+                    circuit=Circuit.DHW, mode=DhwMode.RUNNING_BUFFER
                 )
                 self.buffer_power_stack.clear()
                 operating_mode.mode = DhwMode.RUNNING_BUFFER
@@ -419,8 +554,9 @@ class DhwService:
             else:
                 # not enabling buffer mode
                 self.app.log.debug(
-                    f"Not enabling DHW buffer mode: heatsource is {heatpump_status.heat_source} and "
-                    f"current net power is {current_net_power.value}."
+                    "Not enabling DHW buffer mode: heatsource is {heat_source} and "
+                    "current net power is {net_power}.",
+                    heat_source=heatpump_status.heat_source, net_power=current_net_power.value
                 )
 
         if operating_mode.mode == DhwMode.RUNNING_BUFFER:
@@ -431,13 +567,15 @@ class DhwService:
                 and (
                     next_legionella.planned_start
                     <= now + self.runtime + (16 * self.min_interval)
-                    or next_legionella_outdoor_temp.q50
+                    or next_legionella_outdoor_temp
                     <= self.force_legionella_min_temp
                 )
             ):
                 self.app.log.debug(
-                    f"Legionella cycle was planned soon at {next_legionella.planned_start} or "
-                    f"when expecting cold temperature ({next_legionella_outdoor_temp.q50}°), starting already."
+                    "Legionella cycle was planned soon at {planned_start} or "
+                    "when expecting cold temperature ({outside_temperature}°), starting already.",
+                    planned_start=next_legionella.planned_start,
+                    outside_temperature=next_legionella_outdoor_temp
                 )
                 await self.app.services.legionella.start(force_start=True)
                 return
@@ -448,7 +586,8 @@ class DhwService:
             ):
                 # using booster, stop
                 self.app.log.debug(
-                    f"Stopping DHW buffer mode: heatsource is {heatpump_status.heat_source}"
+                    "Stopping DHW buffer mode: heatsource is {heat_source}",
+                    heat_source=heatpump_status.heat_source
                 )
                 await self.stop_buffer()
                 return
@@ -457,7 +596,8 @@ class DhwService:
             if not self._check_buffer_power_stack():
                 # drawing power from the net, stopping buffering
                 self.app.log.debug(
-                    f"Stopping DHW buffer mode: net power draw was {self.buffer_power_stack}"
+                    "Stopping DHW buffer mode: net power draw was {net_power}",
+                    net_power=[net_power for _, net_power in self.buffer_power_stack]
                 )
                 await self.stop_buffer()
                 self.buffer_power_stack.clear()
@@ -468,8 +608,10 @@ class DhwService:
             if dhw_temp.value >= dhw_setpoint.setpoint - self.buffer_interval:
                 if dhw_setpoint.setpoint <= self.dhw_temp_buffer_max - 1:
                     self.app.log.debug(
-                        f"""Current DHW temperature of {dhw_temp.value}° is within {self.buffer_interval}° of current target.
-                        Setting target to {dhw_setpoint.setpoint + 1}°."""
+                        "Current DHW temperature of {temperature}° is within {interval}° of current target. "
+                        "Setting target to {setpoint}°.",
+                        temperature=dhw_temp.value, interval=self.buffer_interval,
+                        setpoint=dhw_setpoint.setpoint + 1
                     )
                     dhw_setpoint.setpoint += 1
                     await asyncio.gather(
@@ -480,12 +622,14 @@ class DhwService:
                     )
                 else:
                     self.app.log.debug(
-                        f"""Current target of {dhw_setpoint.setpoint}° is the final target, not increasing."""
+                        "Current target of {setpoint}° is the final target, not increasing.",
+                        setpoint=dhw_setpoint.setpoint
                     )
             else:
                 self.app.log.debug(
-                    f"""Current DHW temperature of {dhw_temp.value}° is lower than or equal to 
-                        {dhw_setpoint.setpoint - self.buffer_interval}°, nothing to do."""
+                    "Current DHW temperature of {temperature}° is lower than or equal to "
+                    "{threshold}°, nothing to do.",
+                    temperature=dhw_temp.value, threshold=dhw_setpoint.setpoint - self.buffer_interval
                 )
 
     async def stop_buffer(self):
@@ -497,13 +641,14 @@ class DhwService:
         if dhw_temp.value < self.dhw_temp_base:
             # not hot enough, back to normal mode
             self.app.log.debug(
-                f'Current DHW temperature of {dhw_temp.value} is below base temperature of {self.dhw_temp_base}, '
-                'switching back to normal operation.')
+                'Current DHW temperature of {temperature} is below base temperature of {threshold}, '
+                'switching back to normal operation.',
+                temperature=dhw_temp.value, threshold=self.dhw_temp_base)
 
             await self.app.clients.ecodan.set_dhw_target_temp(self.dhw_temp_base)
 
             self.app.log.debug(
-                f'Setting {Circuit.DHW} to mode: {DhwMode.RUNNING_NORMAL}')
+                'Setting {circuit} to mode: {mode}', circuit=Circuit.DHW, mode=DhwMode.RUNNING_NORMAL)
             operating_mode.mode = DhwMode.RUNNING_NORMAL
             await operating_mode.save()
 
@@ -520,7 +665,8 @@ class DhwService:
 
         await self.app.clients.ecodan.set_dhw_target_temp(self.dhw_temp_off)
 
-        self.app.log.debug(f'Setting {Circuit.DHW} to mode: {DhwMode.OFF}')
+        self.app.log.debug(
+            'Setting {circuit} to mode: {mode}', circuit=Circuit.DHW, mode=DhwMode.OFF)
         operating_mode.mode = DhwMode.OFF
         await operating_mode.save()
 
@@ -553,7 +699,8 @@ class DhwService:
         if operating_mode.mode == DhwMode.PENDING_NORMAL:
             if current_state.operating_mode == 'Hot water':
                 self.app.log.debug(
-                    f'Setting {Circuit.DHW} to mode: {DhwMode.RUNNING_NORMAL}')
+                    'Setting {circuit} to mode: {mode}',
+                    circuit=Circuit.DHW, mode=DhwMode.RUNNING_NORMAL)
                 operating_mode.mode = DhwMode.RUNNING_NORMAL
                 await operating_mode.save()
         elif operating_mode.mode in [
@@ -568,16 +715,23 @@ class DhwService:
                 await self.buffer()
 
     def _update_buffer_power_stack(self, net_power):
-        if len(self.buffer_power_stack) >= self.buffer_power_stack_size:
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels')).timestamp()
+        start = now - self.buffer_power_window.total_seconds()
+
+        while len(self.buffer_power_stack) > 0 and self.buffer_power_stack[0][0] <= start:
             self.buffer_power_stack.pop(0)
-        self.buffer_power_stack.append(net_power)
+        self.buffer_power_stack.append((now, net_power))
 
     def _check_buffer_power_stack(self):
         # can buffering continue?
-        for net_power in self.buffer_power_stack:
+        for _, net_power in self.buffer_power_stack:
             if net_power <= 0:
                 return True
         return False
 
     def __scheduled_jobs(self):
-        self.app.scheduler.add_job(self.reschedule, 'cron', minute='54')
+        self.app.scheduler.add_job(
+            self.app.locks.wrap(Circuit.DHW, self.reschedule), 'cron', minute='54')
+        if self.model_enabled:
+            self.app.scheduler.add_job(
+                self.fit_tank_model, 'cron', hour='3', minute='40')
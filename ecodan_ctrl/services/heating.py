@@ -17,18 +17,29 @@
 import asyncio
 import datetime
 
+import numpy as np
 import pytz
 
+from db.models.event import Event
 from db.models.heating_setpoint import HeatingSetpoint
-from db.models.operating_mode import DhwMode, OperatingMode
+from db.models.measurement import Measurement
+from db.models.operating_mode import Circuit, DhwMode, OperatingMode
 from dto.heating import SetpointDto
 
 from util.cluster import ClusterSet
 
 
 class HeatingSchedule:
+    LEVEL_TYPES = (
+        SetpointDto.SetpointType.RAISE,
+        SetpointDto.SetpointType.DROP,
+        SetpointDto.SetpointType.RAISE_BUFFER,
+    )
+    STATE_TYPES = (SetpointDto.SetpointType.STOP, SetpointDto.SetpointType.RESUME)
+
     def __init__(self, setpoints=None):
         self.setpoints = []
+        self.series = None
 
         if setpoints is not None:
             self.setpoints.extend(setpoints)
@@ -39,12 +50,7 @@ class HeatingSchedule:
                 [
                     sp
                     for sp in self.setpoints
-                    if sp.setpoint_type
-                    in (
-                        SetpointDto.SetpointType.RAISE,
-                        SetpointDto.SetpointType.DROP,
-                        SetpointDto.SetpointType.RAISE_BUFFER,
-                    )
+                    if sp.setpoint_type in self.LEVEL_TYPES
                 ]
             )
             == 0
@@ -52,10 +58,74 @@ class HeatingSchedule:
 
     def add_setpoint(self, setpoint):
         self.setpoints.append(setpoint)
+        self.series = None
 
     def get_last_setpoint(self):
         return self.setpoints[-1]
 
+    def get_size(self):
+        return len(self.setpoints)
+
+    def compact(self, since):
+        """
+        Fold setpoints up to `since` into the effective one of their class,
+        dropping those superseded by a later setpoint of the same class.
+
+        Returns
+        -------
+        int
+            Number of setpoints removed.
+        """
+        effective = {}
+        for sp in self.__chrono():
+            if sp.timestamp > since:
+                break
+            if sp.setpoint_type in self.LEVEL_TYPES:
+                effective[self.LEVEL_TYPES] = sp
+            else:
+                effective[self.STATE_TYPES] = sp
+
+        keep = {id(sp) for sp in effective.values()}
+        return self.__retain(
+            [sp for sp in self.setpoints if sp.timestamp > since or id(sp) in keep])
+
+    def truncate(self, max_size):
+        """
+        Drop the setpoints furthest ahead until at most `max_size` remain. A
+        stop whose resume is dropped is dropped as well, so heating is never
+        left paused.
+
+        Returns
+        -------
+        int
+            Number of setpoints removed.
+        """
+        if len(self.setpoints) <= max_size:
+            return 0
+
+        chrono = self.__chrono()
+        kept = chrono[:max_size]
+
+        if any(sp.setpoint_type == SetpointDto.SetpointType.RESUME for sp in chrono[max_size:]):
+            last_resume = max(
+                (i for i, sp in enumerate(kept)
+                 if sp.setpoint_type == SetpointDto.SetpointType.RESUME),
+                default=-1)
+            kept = [
+                sp for i, sp in enumerate(kept)
+                if i < last_resume or sp.setpoint_type != SetpointDto.SetpointType.STOP
+            ]
+
+        keep = {id(sp) for sp in kept}
+        return self.__retain([sp for sp in self.setpoints if id(sp) in keep])
+
+    def __retain(self, setpoints):
+        removed = len(self.setpoints) - len(setpoints)
+        if removed > 0:
+            self.setpoints = setpoints
+            self.series = None
+        return removed
+
     def get_most_recent_setpoint_of_type(self, setpoint_type):
         return [d for d in self.__chrono() if d.setpoint_type == setpoint_type][-1]
 
@@ -65,12 +135,7 @@ class HeatingSchedule:
             sp
             for sp in self.__chrono()
             if sp.timestamp <= now
-            and sp.setpoint_type
-            in (
-                SetpointDto.SetpointType.RAISE,
-                SetpointDto.SetpointType.DROP,
-                SetpointDto.SetpointType.RAISE_BUFFER,
-            )
+            and sp.setpoint_type in self.LEVEL_TYPES
         ]
 
         if len(past_setpoints) > 0:
@@ -78,14 +143,40 @@ class HeatingSchedule:
         else:
             return None
 
+    def get_next_setpoint(self, now):
+        future_setpoints = [sp for sp in self.__chrono() if sp.timestamp > now]
+
+        if len(future_setpoints) > 0:
+            return future_setpoints[0]
+        else:
+            return None
+
+    def get_pauses(self):
+        """
+        Periods between a STOP and the next RESUME setpoint.
+        """
+        pauses = []
+        stop = None
+
+        for sp in self.__chrono():
+            if sp.setpoint_type == SetpointDto.SetpointType.STOP and stop is None:
+                stop = sp
+            elif sp.setpoint_type == SetpointDto.SetpointType.RESUME and stop is not None:
+                pauses.append((stop, sp))
+                stop = None
+
+        if stop is not None:
+            pauses.append((stop, None))
+
+        return pauses
+
     def get_current_state(self):
         now = datetime.datetime.now(tz=pytz.timezone("Europe/Brussels"))
         past_setpoints = [
             sp
             for sp in self.__chrono()
             if sp.timestamp <= now
-            and sp.setpoint_type
-            in (SetpointDto.SetpointType.STOP, SetpointDto.SetpointType.RESUME)
+            and sp.setpoint_type in self.STATE_TYPES
         ]
 
         if len(past_setpoints) > 0:
@@ -112,60 +203,151 @@ class HeatingSchedule:
             if sp.setpoint_type == SetpointDto.SetpointType.RESUME:
                 sp.setpoint = setpoint
 
+        self.series = None
+
+    def get_series(self):
+        """
+        Planned setpoints as a step series, computed once per change of the
+        plan.
+
+        Returns
+        -------
+        tuple
+            Epoch milliseconds and setpoints.
+        """
+        if self.series is None:
+            timestamps, values = [], []
+
+            for sp in self.__chrono():
+                if sp.setpoint is None:
+                    continue
+
+                timestamp = int(sp.timestamp.timestamp() * 1000)
+                if len(values) > 0:
+                    # hold the previous value until just before the change
+                    timestamps.append(timestamp - 1)
+                    values.append(values[-1])
+
+                timestamps.append(timestamp)
+                values.append(sp.setpoint)
+
+            self.series = (timestamps, values)
+
+        return self.series
+
     def __chrono(self):
         return sorted(self.setpoints, key=lambda sp: sp.timestamp)
 
+    @staticmethod
+    def from_json(json):
+        return HeatingSchedule([SetpointDto.from_json(sp) for sp in json])
+
+    def to_json(self):
+        return [sp.to_json() for sp in self.__chrono()]
+
     def __str__(self):
         return f'<services.heating.HeatingSchedule [\n  {", \n  ".join(sp.__str__() for sp in self.__chrono())}\n]>'
 
 
 class HeatingService:
+    # parts of the day planned independently, in order of planning
+    SEGMENTS = ('raise', 'night_drop', 'buffer', 'price')
+
+    SEGMENT_INPUTS = {
+        'raise': ('production_start',),
+        'night_drop': (
+            'production_end', 'night_temp', 'tomorrow_day_temp', 'tomorrows_production'),
+        'buffer': (
+            'production_start', 'buffer_start', 'buffer_end', 'night_temp',
+            'todays_production'),
+        'price': ('price_threshold', 'prices'),
+    }
+
+    INPUT_KINDS = {
+        'production_start': 'time',
+        'production_end': 'time',
+        'buffer_start': 'time',
+        'buffer_end': 'time',
+        'night_temp': 'temp',
+        'tomorrow_day_temp': 'temp',
+        'tomorrows_production': 'ratio',
+        'todays_production': 'ratio',
+        'price_threshold': 'price',
+        'prices': 'price',
+    }
+
     def __init__(self, app):
         self.app = app
 
-        self.temp_min = self.app.config['HEATING_TEMP_MIN']
-        self.temp_night = self.app.config['HEATING_TEMP_NIGHT']
-        self.temp_day = self.app.config['HEATING_TEMP_DAY']
-
-        self.buffer_min_clearsky_ratio = self.app.config['HEATING_BUFFER_MIN_CLEARSKY_RATIO']
-        self.buffer_min_production_w = self.app.config['HEATING_BUFFER_MIN_PRODUCTION_W']
-        self.buffer_min_production_hours = self.app.config['HEATING_BUFFER_MIN_PRODUCTION_HOURS']
-        self.buffer_min_prediction_ratio = self.app.config['HEATING_BUFFER_MIN_PREDICTION_RATIO']
-        self.buffer_temp_added = self.app.config['HEATING_BUFFER_TEMP_ADDED']
-        self.buffer_max_temp_night = self.app.config['HEATING_BUFFER_MAX_TEMP_NIGHT']
-
-        self.fade_min_temp_night = self.app.config['HEATING_FADE_MIN_TEMP_NIGHT']
-        self.fade_min_temp_force_off = self.app.config['HEATING_FADE_MIN_TEMP_FORCE_OFF']
-        self.fade_min_clearsky_ratio = self.app.config['HEATING_FADE_MIN_CLEARSKY_RATIO']
-        self.fade_min_nextday_temp = self.app.config['HEATING_FADE_MIN_NEXTDAY_TEMP']
-
-        self.summer_mode_min_outside = self.app.config['HEATING_SUMMER_MODE_MIN_OUTSIDE']
-        self.summer_mode_min_outside_days = self.app.config['HEATING_SUMMER_MODE_MIN_OUTSIDE_DAYS']
-        self.summer_mode_min_inside = self.app.config['HEATING_SUMMER_MODE_MIN_INSIDE']
-        self.summer_mode_min_inside_force = self.app.config['HEATING_SUMMER_MODE_MIN_INSIDE_FORCE']
-        self.summer_mode_max_outside_force_off = self.app.config[
+        self.configure(self.app.config)
+
+        self.heating_plan = HeatingSchedule()
+        self.in_idle_state_since = None
+
+        self.plan_inputs = None
+        self.plan_segments = {}
+        self.plan_fingerprint = None
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
+        self.temp_min = config['HEATING_TEMP_MIN']
+        self.temp_night = config['HEATING_TEMP_NIGHT']
+        self.temp_day = config['HEATING_TEMP_DAY']
+
+        self.buffer_min_clearsky_ratio = config['HEATING_BUFFER_MIN_CLEARSKY_RATIO']
+        self.buffer_min_production_w = config['HEATING_BUFFER_MIN_PRODUCTION_W']
+        self.buffer_min_production_hours = config['HEATING_BUFFER_MIN_PRODUCTION_HOURS']
+        self.buffer_min_prediction_ratio = config['HEATING_BUFFER_MIN_PREDICTION_RATIO']
+        self.buffer_temp_added = config['HEATING_BUFFER_TEMP_ADDED']
+        self.buffer_max_temp_night = config['HEATING_BUFFER_MAX_TEMP_NIGHT']
+
+        self.fade_min_temp_night = config['HEATING_FADE_MIN_TEMP_NIGHT']
+        self.fade_min_temp_force_off = config['HEATING_FADE_MIN_TEMP_FORCE_OFF']
+        self.fade_min_clearsky_ratio = config['HEATING_FADE_MIN_CLEARSKY_RATIO']
+        self.fade_min_nextday_temp = config['HEATING_FADE_MIN_NEXTDAY_TEMP']
+
+        self.model_enabled = config['HEATING_MODEL_ENABLED']
+        self.model_comfort_margin = config['HEATING_MODEL_COMFORT_MARGIN']
+
+        self.summer_mode_min_outside = config['HEATING_SUMMER_MODE_MIN_OUTSIDE']
+        self.summer_mode_min_outside_days = config['HEATING_SUMMER_MODE_MIN_OUTSIDE_DAYS']
+        self.summer_mode_min_inside = config['HEATING_SUMMER_MODE_MIN_INSIDE']
+        self.summer_mode_min_inside_force = config['HEATING_SUMMER_MODE_MIN_INSIDE_FORCE']
+        self.summer_mode_max_outside_force_off = config[
             'HEATING_SUMMER_MODE_MAX_OUTSIDE_FORCE_OFF']
-        self.summer_mode_temp = self.app.config['HEATING_SUMMER_MODE_TEMP']
+        self.summer_mode_temp = config['HEATING_SUMMER_MODE_TEMP']
 
         self.price_pause_baseline_period = datetime.timedelta(
-            days=self.app.config["HEATING_PRICE_PAUSE_BASELINE_PERIOD_DAYS"]
+            days=config["HEATING_PRICE_PAUSE_BASELINE_PERIOD_DAYS"]
         )
-        self.price_pause_max_count = self.app.config["HEATING_PRICE_PAUSE_MAX_COUNT"]
+        self.price_pause_max_count = config["HEATING_PRICE_PAUSE_MAX_COUNT"]
         self.price_pause_max_size = datetime.timedelta(
-            minutes=self.app.config["HEATING_PRICE_PAUSE_MAX_SIZE_MINUTES"]
+            minutes=config["HEATING_PRICE_PAUSE_MAX_SIZE_MINUTES"]
         )
         self.price_pause_min_interval = datetime.timedelta(
-            minutes=self.app.config["HEATING_PRICE_PAUSE_MIN_INTERVAL_MINUTES"]
+            minutes=config["HEATING_PRICE_PAUSE_MIN_INTERVAL_MINUTES"]
         )
         self.price_pause_grace_period = datetime.timedelta(
-            minutes=self.app.config["HEATING_PRICE_PAUSE_GRACE_PERIOD_MINUTES"]
+            minutes=config["HEATING_PRICE_PAUSE_GRACE_PERIOD_MINUTES"]
         )
 
+        self.plan_max_size = config['HEATING_PLAN_MAX_SIZE']
+        self.plan_history = datetime.timedelta(hours=config['HEATING_PLAN_HISTORY_HOURS'])
+
+        self.replan_interval_minutes = config['HEATING_REPLAN_INTERVAL_MINUTES']
+        self.replan_tolerances = {
+            'time': config['HEATING_REPLAN_TOLERANCE_MINUTES'] * 60,
+            'temp': config['HEATING_REPLAN_TOLERANCE_TEMP'],
+            'ratio': config['HEATING_REPLAN_TOLERANCE_RATIO'],
+            'price': config['HEATING_REPLAN_TOLERANCE_PRICE'],
+        }
+
         self.fade_period = datetime.timedelta(
-            hours=self.app.config['HEATING_FADE_PERIOD_HOURS'])
-        self.fade_steps = self.app.config['HEATING_FADE_STEPS']
+            hours=config['HEATING_FADE_PERIOD_HOURS'])
+        self.fade_steps = config['HEATING_FADE_STEPS']
 
-        fade_during = self.app.config['HEATING_FADE_DURING'].lower()
+        fade_during = config['HEATING_FADE_DURING'].lower()
         if fade_during == 'day':
             self.fade_offset_sunrise = datetime.timedelta(seconds=0)
             self.fade_offset_sunset = self.fade_period
@@ -179,23 +361,93 @@ class HeatingService:
             raise ValueError(
                 'Invalid setting for HEATING_FADE_DURING: should be day, night, or dusk.')
 
-        self.heating_plan = HeatingSchedule()
-        self.in_idle_state_since = None
+    def get_state(self):
+        return {
+            'heating_plan': self.heating_plan.to_json(),
+            'in_idle_state_since': self.in_idle_state_since.isoformat()
+            if self.in_idle_state_since is not None else None,
+            'plan_inputs': {
+                'day': self.plan_inputs['day'].isoformat(),
+                'summer_mode': self.plan_inputs['summer_mode'],
+                'temp_night': self.plan_inputs.get('temp_night')
+            } if self.plan_inputs is not None else None,
+            'plan_segments': {
+                name: [sp.to_json() for sp in setpoints]
+                for name, setpoints in self.plan_segments.items()
+            },
+            'plan_fingerprint': {
+                key: np.asarray(value).tolist() if value is not None else None
+                for key, value in self.plan_fingerprint.items()
+            } if self.plan_fingerprint is not None else None
+        }
+
+    def set_state(self, state):
+        self.heating_plan = HeatingSchedule.from_json(state['heating_plan'])
+        self.in_idle_state_since = datetime.datetime.fromisoformat(
+            state['in_idle_state_since']) if state['in_idle_state_since'] is not None else None
+
+        # replan only needs the day, summer mode and night temperature of the
+        # inputs, the others are gathered again on the first replan
+        plan_inputs = state.get('plan_inputs')
+        self.plan_inputs = {
+            'day': datetime.date.fromisoformat(plan_inputs['day']),
+            'summer_mode': plan_inputs['summer_mode'],
+            'temp_night': plan_inputs.get('temp_night', self.temp_night)
+        } if plan_inputs is not None else None
+        self.plan_fingerprint = state.get('plan_fingerprint')
+
+        # segments refer to the setpoints of the plan, so replan can tell
+        # them apart from setpoints added later
+        setpoints = {
+            (sp.timestamp, sp.setpoint_type): sp for sp in self.heating_plan.setpoints
+        }
+        self.plan_segments = {
+            name: [
+                setpoints.pop((sp.timestamp, sp.setpoint_type), sp)
+                for sp in (SetpointDto.from_json(sp) for sp in segment)
+            ]
+            for name, segment in state.get('plan_segments', {}).items()
+        }
+
+        self.compact_plan()
 
-        self.__scheduled_jobs()
-
-    async def is_summer_mode(self, log=False):
+    def add_setpoint(self, setpoint):
+        self.heating_plan.add_setpoint(setpoint)
+        self.compact_plan()
+
+    def compact_plan(self):
+        """
+        Keep the live plan bounded: fold superseded setpoints older than
+        `plan_history` and drop the furthest ahead beyond `plan_max_size`.
+        The recent past is kept for the planned setpoint series, unless the
+        plan would exceed `plan_max_size`.
+        """
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        self.heating_plan.compact(now - self.plan_history)
+        if self.heating_plan.get_size() > self.plan_max_size:
+            self.heating_plan.compact(now)
+
+        dropped = self.heating_plan.truncate(self.plan_max_size)
+        if dropped > 0:
+            self.app.log.warning(
+                'Heating plan exceeds {max_size} setpoints, dropped {count} furthest ahead.',
+                max_size=self.plan_max_size, count=dropped)
+
+    async def is_summer_mode(self, log=False, day=None):
+        if day is None:
+            day = datetime.date.today()
 
         async def get_temp_stats(day_offset):
             start_time = pytz.timezone('Europe/Brussels').localize(
                 datetime.datetime.combine(
-                    datetime.date.today() + datetime.timedelta(days=day_offset),
+                    day + datetime.timedelta(days=day_offset),
                     datetime.time(10, 0, 0))
             )
 
             end_time = pytz.timezone('Europe/Brussels').localize(
                 datetime.datetime.combine(
-                    datetime.date.today() + datetime.timedelta(days=day_offset),
+                    day + datetime.timedelta(days=day_offset),
                     datetime.time(19, 59, 59))
             )
 
@@ -213,33 +465,37 @@ class HeatingService:
 
         if outside_temp < self.summer_mode_max_outside_force_off:
             log and self.app.log.debug(
-                f"Average outside temp of {outside_temp} is lower than {self.summer_mode_max_outside_force_off}: "
-                f"force disabling summer mode."
+                "Average outside temp of {outside_temperature} is lower than {threshold}: "
+                "force disabling summer mode.",
+                outside_temperature=outside_temp, threshold=self.summer_mode_max_outside_force_off
             )
             summer_mode = False
 
         elif inside_temp.q50 >= self.summer_mode_min_inside_force:
             log and self.app.log.debug(
-                f"Internal temp of {inside_temp.q50} is greater than or equal to {self.summer_mode_min_inside_force}: "
-                f"force enabling summer mode."
+                "Internal temp of {inside_temperature} is greater than or equal to {threshold}: "
+                "force enabling summer mode.",
+                inside_temperature=inside_temp.q50, threshold=self.summer_mode_min_inside_force
             )
             summer_mode = True
 
         elif outside_temp >= self.summer_mode_min_outside or inside_temp.q50 >= self.summer_mode_min_inside:
             log and self.app.log.debug(
-                f"Average outside temp of {outside_temp} is greater than or equal to {self.summer_mode_min_outside} "
-                f"or internal temp of {inside_temp.q50} is greater than or equal to {self.summer_mode_min_inside}: "
-                f"enabling summer mode."
+                "Average outside temp of {outside_temperature} is greater than or equal to {outside_threshold} "
+                "or internal temp of {inside_temperature} is greater than or equal to {inside_threshold}: "
+                "enabling summer mode.",
+                outside_temperature=outside_temp, outside_threshold=self.summer_mode_min_outside,
+                inside_temperature=inside_temp.q50, inside_threshold=self.summer_mode_min_inside
             )
             summer_mode = True
 
         return summer_mode
 
-    async def plan_summer_mode(self):
-        summer_mode = await self.is_summer_mode(log=True)
+    async def plan_summer_mode(self, day):
+        summer_mode = await self.is_summer_mode(log=True, day=day)
 
         today_start = pytz.timezone("Europe/Brussels").localize(
-            datetime.datetime.combine(datetime.date.today(), datetime.time(0, 0, 0))
+            datetime.datetime.combine(day, datetime.time(0, 0, 0))
         )
 
         if summer_mode:
@@ -253,49 +509,60 @@ class HeatingService:
                 ]
             )
 
-    async def plan_price_exclusions(self):
+    async def get_price_inputs(self, day):
+        """
+        Threshold of a high price and the simulated prices of `day` the price
+        pauses are planned on, or None if they are unknown or disabled.
+        """
         if self.price_pause_max_count < 1:
-            return []
+            return None
 
         today_start = pytz.timezone("Europe/Brussels").localize(
-            datetime.datetime.combine(datetime.date.today(), datetime.time(0, 0, 0))
+            datetime.datetime.combine(day, datetime.time(0, 0, 0))
         )
 
         today_end = pytz.timezone("Europe/Brussels").localize(
-            datetime.datetime.combine(datetime.date.today(), datetime.time(23, 59, 59))
+            datetime.datetime.combine(day, datetime.time(23, 59, 59))
         )
 
         tomorrow_end = pytz.timezone("Europe/Brussels").localize(
             datetime.datetime.combine(
-                datetime.date.today() + datetime.timedelta(days=1),
+                day + datetime.timedelta(days=1),
                 datetime.time(23, 59, 59),
             )
         )
 
         baseline_price, simulated_price = await asyncio.gather(
-            self.app.clients.hab.get_simulated_price_baseline(
+            self.app.services.tariff.get_baseline(
                 today_start - self.price_pause_baseline_period, tomorrow_end
             ),
-            self.app.clients.hab.get_simulated_price_detail(today_start, today_end),
+            self.app.services.tariff.get_detail(today_start, today_end),
         )
         if baseline_price is None:
-            baseline_price = await self.app.clients.hab.get_simulated_price_baseline(
+            baseline_price = await self.app.services.tariff.get_baseline(
                 today_start - self.price_pause_baseline_period, today_end
             )
 
         if baseline_price is None or simulated_price is None:
+            return None
+
+        return baseline_price.q50 + 1.2 * baseline_price.stddev, simulated_price
+
+    def plan_price_exclusions(self, prices):
+        if prices is None:
             return []
 
+        high_price_threshold, simulated_price = prices
+
         cluster_set = ClusterSet(
             max_count=self.price_pause_max_count,
             max_size=self.price_pause_max_size,
             min_interval=self.price_pause_min_interval,
         )
-        high_price_threshold = baseline_price.q50 + 1.2 * baseline_price.stddev
 
-        for quarter in sorted(simulated_price, key=lambda x: x.value, reverse=True):
-            if quarter.value >= high_price_threshold:
-                cluster_set.add_datapoint(quarter)
+        for i in np.argsort(-simulated_price.values, kind='stable'):
+            if simulated_price.values[i] >= high_price_threshold:
+                cluster_set.add_datapoint(simulated_price[i])
             else:
                 break
 
@@ -306,7 +573,8 @@ class HeatingService:
             timestamp_resume = c.get_end() + datetime.timedelta(minutes=15)
 
             self.app.log.debug(
-                f"Heating will pause on {timestamp_stop} and resume on {timestamp_resume}, due to high price."
+                "Heating will pause on {timestamp_stop} and resume on {timestamp_resume}, due to high price.",
+                timestamp_stop=timestamp_stop, timestamp_resume=timestamp_resume
             )
 
             setpoints.extend(
@@ -320,35 +588,192 @@ class HeatingService:
 
         return setpoints
 
+    def plan_night_drop_thresholds(self, night_temp, tomorrow_day_temp, tomorrows_production):
+        if night_temp.q50 <= self.fade_min_temp_force_off:
+            # too cold, don't drop
+            drop_night_temp = False
+
+            self.app.log.debug(
+                'Expected median night temperature of {night_temperature:.2f} is equal to or below '
+                'threshold of {threshold}, forced to keep setpoint at {setpoint} tonight.',
+                night_temperature=night_temp.q50, threshold=self.fade_min_temp_force_off,
+                setpoint=self.temp_day)
+
+        elif night_temp.q50 <= self.fade_min_temp_night:
+            # between force on and force off
+
+            if tomorrows_production.ratio >= self.fade_min_clearsky_ratio:
+                # tomorrow sunny, drop
+                drop_night_temp = True
+
+                self.app.log.debug(
+                    'Expected median night temperature of {night_temperature:.2f} is equal to or below '
+                    'threshold of {threshold}, but tomorrow will be sunny '
+                    '(clearsky ratio: {clearsky_ratio:.2f} >= {clearsky_threshold}), '
+                    'dropping setpoint to {setpoint} tonight.',
+                    night_temperature=night_temp.q50, threshold=self.fade_min_temp_night,
+                    clearsky_ratio=tomorrows_production.ratio,
+                    clearsky_threshold=self.fade_min_clearsky_ratio, setpoint=self.temp_night)
+
+            elif tomorrow_day_temp.q50 >= self.fade_min_nextday_temp:
+                # tomorrow warm, drop
+                drop_night_temp = True
+
+                self.app.log.debug(
+                    'Expected median night temperature of {night_temperature:.2f} is equal to or below '
+                    'threshold of {threshold}, but tomorrow will be warm '
+                    '({day_temperature:.2f} >= {day_threshold}), '
+                    'dropping setpoint to {setpoint} tonight.',
+                    night_temperature=night_temp.q50, threshold=self.fade_min_temp_night,
+                    day_temperature=tomorrow_day_temp.q50, day_threshold=self.fade_min_nextday_temp,
+                    setpoint=self.temp_night)
+
+            else:
+                # tomorrow cold and cloudy, don't drop
+                drop_night_temp = False
+
+                self.app.log.debug(
+                    'Expected median night temperature of {night_temperature:.2f} is equal to or below '
+                    'threshold of {threshold}, keeping setpoint at {setpoint} tonight.',
+                    night_temperature=night_temp.q50, threshold=self.fade_min_temp_night,
+                    setpoint=self.temp_day)
+
+        elif night_temp.q50 >= self.fade_min_nextday_temp:
+            # warm enough tonight
+
+            if tomorrow_day_temp.q50 <= self.fade_min_temp_night:
+                # tomorrow cold, don't drop
+                drop_night_temp = False
+
+                self.app.log.debug(
+                    'Expected median night temperature of {night_temperature:.2f} is above '
+                    'threshold of {threshold}, but tomorrow will be cold '
+                    '({day_temperature:.2f} <= {threshold}), '
+                    'keeping setpoint at {setpoint} tonight.',
+                    night_temperature=night_temp.q50, threshold=self.fade_min_temp_night,
+                    day_temperature=tomorrow_day_temp.q50, setpoint=self.temp_day)
+            else:
+                # tomorrow warm, drop
+                drop_night_temp = True
+
+                self.app.log.debug(
+                    'Expected median night temperature of {night_temperature:.2f} is above '
+                    'threshold of {threshold}, dropping setpoint to {setpoint} tonight.',
+                    night_temperature=night_temp.q50, threshold=self.fade_min_temp_night,
+                    setpoint=self.temp_night)
+        else:
+            drop_night_temp = True
+
+            self.app.log.debug(
+                'Expected median night temperature of {night_temperature:.2f} is above '
+                'threshold of {threshold}, dropping setpoint to {setpoint} tonight.',
+                night_temperature=night_temp.q50, threshold=self.fade_min_temp_night,
+                setpoint=self.temp_night)
+
+        return drop_night_temp
+
+    async def plan_night_drop_model(self, heat_drop_start, night_end, temp_night, step_interval,
+                                    night_temp, tomorrow_day_temp):
+        thermal_model = await self.app.services.thermal.get_model()
+        if thermal_model is None:
+            return None
+
+        thermal = self.app.services.thermal
+
+        grid = thermal.get_grid(heat_drop_start, night_end + self.fade_period)
+        outside = np.where(
+            grid < night_end.timestamp(), night_temp.q50, tomorrow_day_temp.q50)
+
+        step_temp = (self.temp_day - temp_night) / self.fade_steps
+
+        morning_raise = [
+            SetpointDto(
+                timestamp=night_end + (i * step_interval),
+                setpoint=temp_night + ((i + 1) * step_temp),
+                setpoint_type=SetpointDto.SetpointType.RAISE,
+            ) for i in range(self.fade_steps)
+        ]
+
+        night_drop = [
+            SetpointDto(
+                timestamp=heat_drop_start + ((i + 1) * step_interval),
+                setpoint=self.temp_day - ((i + 1) * step_temp),
+                setpoint_type=SetpointDto.SetpointType.DROP,
+            ) for i in range(self.fade_steps)
+        ]
+
+        candidates = np.vstack([
+            thermal.get_trajectory(grid, [], self.temp_day),
+            thermal.get_trajectory(grid, night_drop + morning_raise, self.temp_day),
+        ])
+
+        keep, drop = thermal_model.predict(self.temp_day, outside, candidates)
+
+        night = grid < night_end.timestamp()
+        drop_night_min = drop[night].min() if night.any() else drop[0]
+
+        drop_night_temp = bool(
+            drop_night_min >= temp_night - self.model_comfort_margin
+            and drop[-1] >= self.temp_day - self.model_comfort_margin
+        )
+
+        self.app.log.debug(
+            'Thermal model predicts a minimum of {drop_min:.2f} tonight and {drop_end:.2f} at '
+            '{timestamp} when dropping the setpoint, versus {keep_end:.2f} when keeping it at '
+            '{setpoint}: {decision} setpoint tonight.',
+            drop_min=drop_night_min, drop_end=drop[-1], timestamp=night_end + self.fade_period,
+            keep_end=keep[-1], setpoint=self.temp_day,
+            decision='dropping' if drop_night_temp else 'keeping')
+
+        return drop_night_temp
+
     async def plan(self):
-        self.app.log.debug('Planning heating schedule.')
+        self.heating_plan, self.plan_inputs, self.plan_segments = await self.__make_plan()
+        self.plan_fingerprint = self.get_fingerprint(self.plan_inputs)
+        await self.record_pauses()
+
+    async def record_pauses(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        await Event.replace_from('heating_pause', now, [
+            Event(
+                kind='heating_pause',
+                timestamp=stop.timestamp,
+                timestamp_end=resume.timestamp if resume is not None else None,
+                text=f'Heating paused at {stop.setpoint}°C',
+                tags='heating,pause'
+            )
+            for stop, resume in self.heating_plan.get_pauses()
+        ])
 
-        summer_mode_schedule = await self.plan_summer_mode()
-        if summer_mode_schedule is not None:
-            self.heating_plan = summer_mode_schedule
-            return
+    async def get_plan_inputs(self, day, temp_night=None):
+        """
+        Forecasts and heat pump state the heating plan of `day` is made from.
 
+        The night temperature is capped by the current heat pump setpoint,
+        unless `temp_night` of an earlier plan is given.
+        """
         today_start = pytz.timezone('Europe/Brussels').localize(
             datetime.datetime.combine(
-                datetime.date.today(),
+                day,
                 datetime.time(0, 0, 0))
         )
 
         today_end = pytz.timezone('Europe/Brussels').localize(
             datetime.datetime.combine(
-                datetime.date.today(),
+                day,
                 datetime.time(23, 59, 59))
         )
 
         tomorrow_start = pytz.timezone('Europe/Brussels').localize(
             datetime.datetime.combine(
-                datetime.date.today() + datetime.timedelta(days=1),
+                day + datetime.timedelta(days=1),
                 datetime.time(0, 0, 0))
         )
 
         tomorrow_end = pytz.timezone('Europe/Brussels').localize(
             datetime.datetime.combine(
-                datetime.date.today() + datetime.timedelta(days=1),
+                day + datetime.timedelta(days=1),
                 datetime.time(23, 59, 59))
         )
 
@@ -357,18 +782,20 @@ class HeatingService:
 
         night_start = pytz.timezone('Europe/Brussels').localize(
             datetime.datetime.combine(
-                datetime.date.today(),
+                day,
                 datetime.time(20, 0, 0))
         )
 
         night_end = pytz.timezone('Europe/Brussels').localize(
             datetime.datetime.combine(
-                datetime.date.today() + datetime.timedelta(days=1),
+                day + datetime.timedelta(days=1),
                 datetime.time(8, 0, 0))
         )
 
-        production_bounds, night_temp, tomorrow_day_temp, tomorrows_production, todays_production, heatpump_setpoint = await asyncio.gather(
-            self.app.clients.mme_soleil.get_production_bounds(),
+        production_bounds, buffer_bounds, night_temp, tomorrow_day_temp, tomorrows_production, todays_production, heatpump_setpoint, prices = await asyncio.gather(
+            self.app.clients.mme_soleil.get_production_bounds(date=day),
+            self.app.clients.mme_soleil.get_production_bounds(
+                date=day, min_kw=self.buffer_min_production_w/1000),
             self.app.clients.mme_soleil.get_temperature_stats(
                 night_start, night_end),
             self.app.clients.mme_soleil.get_temperature_stats(
@@ -377,34 +804,90 @@ class HeatingService:
                 tomorrow_start, tomorrow_end),
             self.app.clients.mme_soleil.get_production_weather(
                 today_start, today_end),
-            self.app.clients.hab.get_setpoint()
+            self.app.clients.hab.get_setpoint(),
+            self.get_price_inputs(day)
         )
 
-        self.app.log.debug(
-            f'Production today will start at {production_bounds.start} and end at {production_bounds.end}.')
-
-        heat_raise_start = production_bounds.start - self.fade_offset_sunrise
-        heat_drop_start = production_bounds.end - self.fade_offset_sunset
+        return {
+            'day': day,
+            'summer_mode': False,
+            'night_end': night_end,
+            'production_bounds': production_bounds,
+            'buffer_bounds': buffer_bounds,
+            'night_temp': night_temp,
+            'tomorrow_day_temp': tomorrow_day_temp,
+            'tomorrows_production': tomorrows_production,
+            'todays_production': todays_production,
+            'temp_night': temp_night if temp_night is not None
+            else min(self.temp_night, heatpump_setpoint.heating),
+            'prices': prices,
+        }
+
+    def get_fingerprint(self, inputs):
+        """
+        Values of the plan inputs compared by `replan`, keyed as in
+        `INPUT_KINDS`.
+        """
+        if inputs['summer_mode']:
+            return None
 
-        temp_night = min(self.temp_night, heatpump_setpoint.heating)
+        def epoch(timestamp):
+            return timestamp.timestamp() if timestamp is not None else None
+
+        production_bounds = inputs['production_bounds']
+        buffer_bounds = inputs['buffer_bounds']
+        prices = inputs['prices']
+
+        return {
+            'production_start': epoch(production_bounds.start),
+            'production_end': epoch(production_bounds.end),
+            'buffer_start': epoch(buffer_bounds.start) if buffer_bounds is not None else None,
+            'buffer_end': epoch(buffer_bounds.end) if buffer_bounds is not None else None,
+            'night_temp': inputs['night_temp'].q50,
+            'tomorrow_day_temp': inputs['tomorrow_day_temp'].q50,
+            'tomorrows_production': inputs['tomorrows_production'].ratio,
+            'todays_production': inputs['todays_production'].ratio,
+            'price_threshold': prices[0] if prices is not None else None,
+            'prices': prices[1].values if prices is not None else None,
+        }
+
+    def get_changed_inputs(self, old, new):
+        """
+        Keys of the fingerprint values that moved beyond their replan
+        tolerance.
+        """
+        changed = []
+
+        for key, kind in self.INPUT_KINDS.items():
+            if old[key] is None or new[key] is None:
+                if old[key] is not new[key]:
+                    changed.append(key)
+            elif np.shape(old[key]) != np.shape(new[key]) or np.max(
+                    np.abs(np.subtract(new[key], old[key])), initial=0) > self.replan_tolerances[kind]:
+                changed.append(key)
+
+        return changed
+
+    def plan_raise(self, inputs):
+        heat_raise_start = inputs['production_bounds'].start - self.fade_offset_sunrise
+        temp_night = inputs['temp_night']
 
         step_temp = (self.temp_day - temp_night) / self.fade_steps
         step_interval = self.fade_period / self.fade_steps
 
-        heating_schedule = HeatingSchedule()
-
-        self.app.log.debug(f'Heat buildup will start at {heat_raise_start}.')
+        self.app.log.debug(
+            'Heat buildup will start at {timestamp}.', timestamp=heat_raise_start)
 
-        heating_schedule.add_setpoint(
+        setpoints = [
             SetpointDto(
                 timestamp=heat_raise_start,
                 setpoint=temp_night,
                 setpoint_type=SetpointDto.SetpointType.RAISE,
             )
-        )
+        ]
 
         for i in range(self.fade_steps):
-            heating_schedule.add_setpoint(
+            setpoints.append(
                 SetpointDto(
                     timestamp=heat_raise_start + ((i + 1) * step_interval),
                     setpoint=temp_night + ((i + 1) * step_temp),
@@ -412,114 +895,64 @@ class HeatingService:
                 )
             )
 
-        if night_temp.q50 <= self.fade_min_temp_force_off:
-            # too cold, don't drop
-            drop_night_temp = False
-
-            self.app.log.debug(
-                f'Expected median night temperature of {round(night_temp.q50, 2)} is equal to or below '
-                f'threshold of {self.fade_min_temp_force_off}, '
-                f'forced to keep setpoint at {self.temp_day} tonight.')
-
-        elif night_temp.q50 <= self.fade_min_temp_night:
-            # between force on and force off
-
-            if tomorrows_production.ratio >= self.fade_min_clearsky_ratio:
-                # tomorrow sunny, drop
-                drop_night_temp = True
-
-                self.app.log.debug(
-                    f'Expected median night temperature of {round(night_temp.q50, 2)} is equal to or below '
-                    f'threshold of {self.fade_min_temp_night}, '
-                    f'but tomorrow will be sunny '
-                    f'(clearsky ratio: {round(tomorrows_production.ratio, 2)} >= {self.fade_min_clearsky_ratio}), '
-                    f'dropping setpoint to {self.temp_night} tonight.')
-
-            elif tomorrow_day_temp.q50 >= self.fade_min_nextday_temp:
-                # tomorrow warm, drop
-                drop_night_temp = True
-
-                self.app.log.debug(
-                    f'Expected median night temperature of {round(night_temp.q50, 2)} is equal to or below '
-                    f'threshold of {self.fade_min_temp_night}, '
-                    f'but tomorrow will be warm '
-                    f'({round(tomorrow_day_temp.q50, 2)} >= {self.fade_min_nextday_temp}), '
-                    f'dropping setpoint to {self.temp_night} tonight.')
-
-            else:
-                # tomorrow cold and cloudy, don't drop
-                drop_night_temp = False
+        return setpoints
 
-                self.app.log.debug(
-                    f'Expected median night temperature of {round(night_temp.q50, 2)} is equal to or below '
-                    f'threshold of {self.fade_min_temp_night}, '
-                    f'keeping setpoint at {self.temp_day} tonight.')
+    async def plan_night_drop(self, inputs):
+        heat_drop_start = inputs['production_bounds'].end - self.fade_offset_sunset
+        temp_night = inputs['temp_night']
 
-        elif night_temp.q50 >= self.fade_min_nextday_temp:
-            # warm enough tonight
+        step_temp = (self.temp_day - temp_night) / self.fade_steps
+        step_interval = self.fade_period / self.fade_steps
 
-            if tomorrow_day_temp.q50 <= self.fade_min_temp_night:
-                # tomorrow cold, don't drop
-                drop_night_temp = False
+        drop_night_temp = None
+        if self.model_enabled:
+            drop_night_temp = await self.plan_night_drop_model(
+                heat_drop_start, inputs['night_end'], temp_night, step_interval,
+                inputs['night_temp'], inputs['tomorrow_day_temp'])
 
-                self.app.log.debug(
-                    f'Expected median night temperature of {round(night_temp.q50, 2)} is above '
-                    f'threshold of {self.fade_min_temp_night}, '
-                    f'but tomorrow will be cold '
-                    f'({round(tomorrow_day_temp.q50, 2)} <= {self.fade_min_temp_night}), '
-                    f'keeping setpoint at {self.temp_day} tonight.')
-            else:
-                # tomorrow warm, drop
-                drop_night_temp = True
+        if drop_night_temp is None:
+            drop_night_temp = self.plan_night_drop_thresholds(
+                inputs['night_temp'], inputs['tomorrow_day_temp'], inputs['tomorrows_production'])
 
-                self.app.log.debug(
-                    f'Expected median night temperature of {round(night_temp.q50, 2)} is above '
-                    f'threshold of {self.fade_min_temp_night}, '
-                    f'dropping setpoint to {self.temp_night} tonight.')
-        else:
-            drop_night_temp = True
+        if not drop_night_temp:
+            return []
 
-            self.app.log.debug(
-                f'Expected median night temperature of {round(night_temp.q50, 2)} is above '
-                f'threshold of {self.fade_min_temp_night}, '
-                f'dropping setpoint to {self.temp_night} tonight.')
+        setpoints = [
+            SetpointDto(
+                timestamp=heat_drop_start,
+                setpoint=self.temp_day,
+                setpoint_type=SetpointDto.SetpointType.DROP,
+            )
+        ]
 
-        if drop_night_temp:
-            heating_schedule.add_setpoint(
+        for i in range(self.fade_steps):
+            setpoints.append(
                 SetpointDto(
-                    timestamp=heat_drop_start,
-                    setpoint=self.temp_day,
+                    timestamp=heat_drop_start + ((i + 1) * step_interval),
+                    setpoint=setpoints[-1].setpoint - step_temp,
                     setpoint_type=SetpointDto.SetpointType.DROP,
                 )
             )
 
-            for i in range(self.fade_steps):
-                heating_schedule.add_setpoint(
-                    SetpointDto(
-                        timestamp=heat_drop_start + ((i + 1) * step_interval),
-                        setpoint=heating_schedule.get_last_setpoint().setpoint
-                        - step_temp,
-                        setpoint_type=SetpointDto.SetpointType.DROP,
-                    )
-                )
+        return setpoints
 
+    def plan_buffer(self, inputs, raise_setpoints):
         fade_offset = self.fade_period / 4
         step_temp = self.buffer_temp_added / self.fade_steps
         step_interval = self.fade_period / self.fade_steps
 
-        buffer_bounds = await self.app.clients.mme_soleil.get_production_bounds(
-            min_kw=self.buffer_min_production_w/1000)
+        buffer_bounds = inputs['buffer_bounds']
 
         # always drop buffer
         if buffer_bounds is None or buffer_bounds.end is None:
-            most_recent_raise = heating_schedule.get_most_recent_setpoint_of_type(
-                SetpointDto.SetpointType.RAISE
-            )
-            buffer_drop_start = most_recent_raise.timestamp
+            buffer_drop_start = max(sp.timestamp for sp in raise_setpoints)
         else:
             buffer_drop_start = buffer_bounds.end - fade_offset
 
-        if todays_production.ratio >= self.buffer_min_clearsky_ratio and night_temp.q50 <= self.buffer_max_temp_night:
+        setpoints = []
+
+        if inputs['todays_production'].ratio >= self.buffer_min_clearsky_ratio \
+                and inputs['night_temp'].q50 <= self.buffer_max_temp_night:
 
             if buffer_bounds.start is not None \
                     and buffer_bounds.end is not None \
@@ -528,16 +961,17 @@ class HeatingService:
 
                 # enable heat buffer
                 self.app.log.debug(
-                    f'Expect a sunny day today, and a cold night tonight, enabling heat buffer mode.'
+                    'Expect a sunny day today, and a cold night tonight, enabling heat buffer mode.'
                 )
 
                 buffer_raise_start = buffer_bounds.start - fade_offset
 
                 self.app.log.debug(
-                    f'Buffering will occur between {buffer_raise_start} and {buffer_drop_start}.')
+                    'Buffering will occur between {start} and {end}.',
+                    start=buffer_raise_start, end=buffer_drop_start)
 
                 for i in range(self.fade_steps):
-                    heating_schedule.add_setpoint(
+                    setpoints.append(
                         SetpointDto(
                             timestamp=buffer_raise_start + ((i + 1) * step_interval),
                             setpoint=self.temp_day + ((i + 1) * step_temp),
@@ -546,7 +980,7 @@ class HeatingService:
                     )
 
         for i in range(self.fade_steps):
-            heating_schedule.add_setpoint(
+            setpoints.append(
                 SetpointDto(
                     timestamp=buffer_drop_start + ((i + 1) * step_interval),
                     setpoint=self.temp_day
@@ -556,12 +990,169 @@ class HeatingService:
                 )
             )
 
-        for setpoint in await self.plan_price_exclusions():
-            heating_schedule.add_setpoint(setpoint)
+        return setpoints
+
+    async def plan_segment(self, name, inputs, segments):
+        """
+        Plan the setpoints of one segment of the day, see `SEGMENTS`. Segments
+        planned before it in `segments` may be used.
+        """
+        if name == 'raise':
+            return self.plan_raise(inputs)
+        elif name == 'night_drop':
+            return await self.plan_night_drop(inputs)
+        elif name == 'buffer':
+            return self.plan_buffer(inputs, segments['raise'])
+        elif name == 'price':
+            return self.plan_price_exclusions(inputs['prices'])
+
+    def build_schedule(self, inputs, segments, setpoints=()):
+        heating_schedule = HeatingSchedule(
+            [sp for name in self.SEGMENTS for sp in segments[name]] + list(setpoints))
+        heating_schedule.calculate_resume_setpoints(inputs['temp_night'])
+        return heating_schedule
+
+    async def make_plan(self, day=None):
+        heating_schedule, _, _ = await self.__make_plan(day)
+        return heating_schedule
+
+    async def __make_plan(self, day=None):
+        if day is None:
+            day = datetime.date.today()
+
+        self.app.log.debug('Planning heating schedule.', day=day)
+
+        summer_mode_schedule = await self.plan_summer_mode(day)
+        if summer_mode_schedule is not None:
+            return summer_mode_schedule, {'day': day, 'summer_mode': True}, {}
+
+        inputs = await self.get_plan_inputs(day)
+
+        self.app.log.debug(
+            'Production today will start at {start} and end at {end}.',
+            start=inputs['production_bounds'].start, end=inputs['production_bounds'].end)
+
+        segments = {}
+        for name in self.SEGMENTS:
+            segments[name] = await self.plan_segment(name, inputs, segments)
+
+        heating_schedule = self.build_schedule(inputs, segments)
+        self.app.log.debug('Planned heating schedule: {schedule}', schedule=heating_schedule)
+        return heating_schedule, inputs, segments
+
+    async def replan(self):
+        """
+        Replan the segments of today's heating plan whose inputs moved beyond
+        the replan tolerances since they were planned. Setpoints outside the
+        planned segments, like idle drops, are kept.
+
+        Returns
+        -------
+        dict or None
+            The changed inputs, the replanned segments and the setpoints they
+            removed and added, or None if nothing was replanned.
+        """
+        day = datetime.date.today()
+        heating_plan = self.heating_plan
+
+        if self.plan_inputs is None or self.plan_inputs['day'] != day:
+            # nothing to compare against before today's plan is made
+            return None
+
+        summer_mode = await self.is_summer_mode(day=day)
+        if summer_mode != self.plan_inputs['summer_mode']:
+            self.app.log.info(
+                'Summer mode changed to {summer_mode}, replanning heating schedule.',
+                summer_mode=summer_mode)
+            await self.plan()
+            return None
+
+        if summer_mode:
+            return None
 
-        heating_schedule.calculate_resume_setpoints(temp_night)
-        print(heating_schedule)
-        self.heating_plan = heating_schedule
+        # the heat pump setpoint is lowered by the plan itself (stops, idle
+        # drops), keep the night temperature the plan was made with
+        inputs = await self.get_plan_inputs(day, temp_night=self.plan_inputs['temp_night'])
+        fingerprint = self.get_fingerprint(inputs)
+        changed = self.get_changed_inputs(self.plan_fingerprint, fingerprint)
+
+        names = [
+            name for name in self.SEGMENTS
+            if any(key in changed for key in self.SEGMENT_INPUTS[name])
+        ]
+        if len(names) == 0:
+            return None
+
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        segments = dict(self.plan_segments)
+        for name in names:
+            segments[name] = await self.plan_segment(name, inputs, segments)
+
+        # segments that have passed entirely are left as they were
+        names = [
+            name for name in names
+            if any(sp.timestamp > now for sp in self.plan_segments[name] + segments[name])
+        ]
+        segments = {
+            name: segments[name] if name in names else self.plan_segments[name]
+            for name in self.SEGMENTS
+        }
+
+        if heating_plan is not self.heating_plan:
+            # planned from scratch in the meantime
+            return None
+
+        planned = {id(sp) for name in self.SEGMENTS for sp in self.plan_segments[name]}
+        resumed = {
+            sp.timestamp for sp in heating_plan.setpoints
+            if sp.setpoint_type == SetpointDto.SetpointType.RESUME and sp.setpoint is None
+        }
+
+        self.heating_plan = self.build_schedule(
+            inputs, segments, [sp for sp in heating_plan.setpoints if id(sp) not in planned])
+
+        # don't resume twice, also when the resume was planned again
+        for sp in self.heating_plan.setpoints:
+            if sp.setpoint_type == SetpointDto.SetpointType.RESUME and sp.timestamp in resumed:
+                sp.setpoint = None
+
+        self.compact_plan()
+
+        def diff_setpoints(setpoints, other):
+            keys = {(sp.timestamp, sp.setpoint, sp.setpoint_type) for sp in other}
+            return [
+                sp.to_json() for sp in sorted(setpoints, key=lambda sp: sp.timestamp)
+                if (sp.timestamp, sp.setpoint, sp.setpoint_type) not in keys
+            ]
+
+        old = [sp for name in names for sp in self.plan_segments[name]]
+        new = [sp for name in names for sp in segments[name]]
+
+        diff = {
+            'inputs': changed,
+            'segments': names,
+            'removed': diff_setpoints(old, new),
+            'added': diff_setpoints(new, old),
+        }
+
+        self.plan_inputs = inputs
+        self.plan_segments = segments
+        self.plan_fingerprint.update({k: fingerprint[k] for k in changed})
+
+        self.app.log.info(
+            'Plan inputs {inputs} changed, replanned heating segments {segments}: '
+            'removed {removed}, added {added}.', **diff)
+
+        await Event(
+            'heating_replan', now, None,
+            f'Replanned {", ".join(names)}: {len(diff["removed"])} setpoints removed, '
+            f'{len(diff["added"])} added', 'heating,replan').save()
+
+        if 'price' in names:
+            await self.record_pauses()
+
+        return diff
 
     async def evaluate(self):
         if self.heating_plan.is_empty():
@@ -585,11 +1176,10 @@ class HeatingService:
         if current_state.setpoint_type == SetpointDto.SetpointType.STOP:
             if not state_setpoint.equals(current_state.setpoint):
                 self.app.log.debug("Stopping heating.")
-                await self.app.clients.ecodan.set_heating_target_temp(
-                    current_state.setpoint
-                )
-                state_setpoint.setpoint = current_state.setpoint
-                await state_setpoint.save()
+                await self.apply_setpoint(state_setpoint, current_state.setpoint)
+                await Event(
+                    'heating', datetime.datetime.now(tz=pytz.timezone('Europe/Brussels')), None,
+                    f'Heating stopped at {current_state.setpoint}°C', 'heating,stop').save()
             return
 
         if (
@@ -602,11 +1192,10 @@ class HeatingService:
                     current_setpoint is None
                     or current_setpoint.setpoint_type != SetpointDto.SetpointType.RAISE
                 ):
-                    await self.app.clients.ecodan.set_heating_target_temp(
-                        current_state.setpoint
-                    )
-                    state_setpoint.setpoint = current_state.setpoint
-                    await state_setpoint.save()
+                    await self.apply_setpoint(state_setpoint, current_state.setpoint)
+                    await Event(
+                        'heating', datetime.datetime.now(tz=pytz.timezone('Europe/Brussels')), None,
+                        f'Heating resumed at {current_state.setpoint}°C', 'heating,resume').save()
                     current_state.setpoint = None # only resume once
                 else:
                     self.app.log.debug("Current setpoint is of type RAISE, let's await that.")
@@ -620,8 +1209,9 @@ class HeatingService:
                     return
 
             self.app.log.debug(
-                f'State setpoint of {state_setpoint.setpoint} differs from current target setpoint '
-                f'of {current_setpoint.setpoint}.')
+                'State setpoint of {state_setpoint} differs from current target setpoint '
+                'of {setpoint}.',
+                state_setpoint=state_setpoint.setpoint, setpoint=current_setpoint.setpoint)
 
             if (
                 current_setpoint.setpoint_type == SetpointDto.SetpointType.RAISE
@@ -660,11 +1250,31 @@ class HeatingService:
                         'Not raising setpoint during heat drop.')
                     return
 
-            await self.app.clients.ecodan.set_heating_target_temp(current_setpoint.setpoint)
-            state_setpoint.setpoint = current_setpoint.setpoint
-            await state_setpoint.save()
+            await self.apply_setpoint(state_setpoint, current_setpoint.setpoint)
+
+    async def is_settled(self):
+        current_setpoint = self.heating_plan.get_current_setpoint()
+        if current_setpoint is None:
+            return True
+
+        state_setpoint = await HeatingSetpoint.from_zone('zone1')
+        return state_setpoint is not None and state_setpoint.equals(current_setpoint.setpoint)
+
+    async def apply_setpoint(self, state_setpoint, setpoint):
+        await self.app.clients.ecodan.set_heating_target_temp(setpoint)
+        state_setpoint.setpoint = setpoint
+        await asyncio.gather(
+            state_setpoint.save(),
+            Measurement(
+                'heating_applied', datetime.datetime.now(tz=pytz.timezone('Europe/Brussels')),
+                setpoint).save()
+        )
 
     async def check_idling(self):
+        if self.heating_plan.get_current_state().setpoint_type == SetpointDto.SetpointType.STOP:
+            # heating is stopped, nothing to interfere with
+            return
+
         heatpump_state, heatpump_setpoint, dhw_mode, = await asyncio.gather(
             self.app.clients.hab.get_current_state(),
             self.app.clients.hab.get_setpoint(),
@@ -693,10 +1303,11 @@ class HeatingService:
                     new_setpoint = heatpump_setpoint.heating - 0.5
 
                     self.app.log.debug(
-                        f'Detected heatpump in idle state since {self.in_idle_state_since}, dropping temperature '
-                        f'to {new_setpoint}.')
+                        'Detected heatpump in idle state since {idle_since}, dropping temperature '
+                        'to {setpoint}.',
+                        idle_since=self.in_idle_state_since, setpoint=new_setpoint)
 
-                    self.heating_plan.add_setpoint(
+                    self.add_setpoint(
                         SetpointDto(
                             timestamp=now,
                             setpoint=new_setpoint,
@@ -758,12 +1369,23 @@ class HeatingService:
         heatpump_setpoint = await self.app.clients.hab.get_setpoint()
 
         self.app.log.debug(
-            f'Setting heating state setpoint from heatpump state, to a value of {heatpump_setpoint.heating}.')
+            'Setting heating state setpoint from heatpump state, to a value of {setpoint}.',
+            setpoint=heatpump_setpoint.heating)
         state_setpoint = HeatingSetpoint('zone1', heatpump_setpoint.heating)
         await state_setpoint.save()
 
     def __scheduled_jobs(self):
-        self.app.scheduler.add_job(self.plan, 'cron', hour='4', minute='10')
-        self.app.scheduler.add_job(self.plan, 'cron', hour='13', minute='10')
-        self.app.scheduler.add_job(self.plan, 'cron', hour='15', minute='10')
-        self.app.scheduler.add_job(self.check_idling, 'cron', minute='*/5')
+        locks = self.app.locks
+
+        self.app.scheduler.add_job(
+            locks.wrap(Circuit.HEATING, self.plan), 'cron', hour='4', minute='10')
+        self.app.scheduler.add_job(
+            locks.wrap(Circuit.HEATING, self.plan), 'cron', hour='13', minute='10')
+        self.app.scheduler.add_job(
+            locks.wrap(Circuit.HEATING, self.plan), 'cron', hour='15', minute='10')
+        self.app.scheduler.add_job(
+            locks.wrap(Circuit.HEATING, self.check_idling), 'cron', minute='*/5')
+        if self.replan_interval_minutes > 0:
+            self.app.scheduler.add_job(
+                locks.wrap(Circuit.HEATING, self.replan),
+                'cron', minute=f'*/{self.replan_interval_minutes}')
@@ -0,0 +1,81 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import datetime
+
+import pytz
+
+from db.models.event import Event
+from db.models.measurement import Measurement
+
+
+class HistoryService:
+    def __init__(self, app):
+        self.app = app
+
+        self.configure(self.app.config)
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
+        self.interval_minutes = config['HISTORY_INTERVAL_MINUTES']
+        self.interval = datetime.timedelta(minutes=self.interval_minutes)
+        self.retention = datetime.timedelta(
+            days=config['HISTORY_RETENTION_DAYS'])
+
+    async def record(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        house_temp, outside_temp, setpoint, dhw_temp, net_power, consumption = await asyncio.gather(
+            self.app.clients.hab.get_house_temperature(
+                start=now - self.interval, end=now),
+            self.app.clients.hab.get_current_outside_temp(),
+            self.app.clients.hab.get_setpoint(),
+            self.app.clients.hab.get_current_dhw_temp(),
+            self.app.clients.hab.get_current_net_power(),
+            self.app.clients.hab.get_current_consumption(),
+        )
+
+        measurements = [
+            Measurement('outside_temp', now, outside_temp.value),
+            Measurement('heating_setpoint', now, setpoint.heating),
+            Measurement('dhw_setpoint', now, setpoint.dhw),
+            Measurement('dhw_temp', now, dhw_temp.value),
+            Measurement('net_power', now, net_power.value),
+            Measurement('consumption', now, consumption.value),
+        ]
+
+        if house_temp is not None:
+            measurements.append(Measurement('house_temp', now, house_temp.q50))
+
+        await Measurement.save_all(measurements)
+        await self.app.services.dhw.observe_tank(now, dhw_temp.value)
+
+    async def cleanup(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        self.app.log.debug(
+            'Removing measurement and event history from before {timestamp}.',
+            timestamp=now - self.retention)
+        await Measurement.remove_before(now - self.retention)
+        await Event.remove_before(now - self.retention)
+
+    def __scheduled_jobs(self):
+        self.app.scheduler.add_job(
+            self.record, 'cron', minute=f'*/{self.interval_minutes}')
+        self.app.scheduler.add_job(self.cleanup, 'cron', hour='3', minute='0')
@@ -0,0 +1,191 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import datetime
+import os
+import socket
+
+import aiosqlite
+import pytz
+
+from db.models.event import Event
+from db.models.lease import Lease
+from db.models.operating_mode import Circuit
+from util.runner import RunnerLock
+
+
+class LeaderService:
+    """
+    Elect the one process that controls the heat pump.
+
+    Of the workers serving one database on a host, only the one holding the
+    runner lock file may lead. With HA_ENABLED it also needs the lease in
+    the shared database, for an active/standby pair of hosts.
+
+    Only the leader runs the scheduled jobs and writes to the Ecodan. The
+    others keep trying to become leader, restore the snapshot saved by the
+    leader and keep the forecast and models fresh. They serve the API from
+    that state and can take over as soon as the lock or lease is released.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+        self.name = 'controller'
+
+        self.configure(self.app.config)
+
+        self.instance_id = self.app.config['HA_INSTANCE_ID'] \
+            or f'{socket.gethostname()}-{os.getpid()}'
+
+        self.lock = RunnerLock(
+            self.app.config['RUNNER_LOCK_FILE'] or f"{self.app.config['DATABASE_PATH']}.lock")
+
+        self.is_leader = False
+        self.expires = None
+        self.warmed_at = None
+        self.models_warmed = False
+        self.task = None
+
+    def configure(self, config):
+        self.enabled = config['HA_ENABLED']
+        self.lease_duration = datetime.timedelta(seconds=config['HA_LEASE_SECONDS'])
+        # a standby notices a released lock or expired lease within a
+        # quarter of the lease duration
+        self.renew_seconds = config['HA_LEASE_SECONDS'] / 4
+        self.warm_seconds = config['SNAPSHOT_INTERVAL_SECONDS']
+
+    async def start(self):
+        self.app.clients.ecodan.writes_enabled = False
+        await self.renew()
+        self.task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+        if self.is_leader:
+            await self.app.services.snapshot.save()
+            if self.enabled:
+                await Lease.release(self.name, self.instance_id)
+
+        self.lock.release()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.renew_seconds)
+            try:
+                await self.renew()
+            except Exception as e:
+                # retried on the next round, the loop must keep running
+                self.app.log.error('Failed to elect the leader: {error}.', error=str(e))
+
+    async def renew(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        leader = self.lock.acquire()
+
+        if leader and self.enabled:
+            try:
+                leader = await Lease.acquire(
+                    self.name, self.instance_id, now, self.lease_duration)
+            except aiosqlite.Error as e:
+                self.app.log.warning('Failed to renew the lease: {error}.', error=str(e))
+                # keep our role until the lease we hold runs out, without
+                # extending it
+                leader = self.is_leader and now < self.expires
+            else:
+                if leader:
+                    self.expires = now + self.lease_duration
+
+        if leader and not self.is_leader:
+            self.app.log.info(
+                'Instance {instance} is the leader, taking over.', instance=self.instance_id)
+            await Event(
+                'leader', now, None, f'{self.instance_id} took over', 'ha,leader').save()
+
+            await self.take_over()
+            # jobs missed on standby are skipped, evaluate right away
+            self.app.services.controller.schedule_tick(0)
+
+        elif not leader and self.is_leader:
+            self.app.log.warning(
+                'Instance {instance} is no longer the leader, switching to standby.',
+                instance=self.instance_id)
+            self.stand_by()
+
+        elif not leader:
+            await self.warm_up(now)
+
+    async def take_over(self):
+        locks = self.app.locks
+
+        restored = await self.app.services.snapshot.restore()
+
+        async with locks.hold(Circuit.DHW, 'LeaderService.take_over'):
+            await self.app.services.controller.set_operating_mode_from_state()
+            await self.app.services.legionella.plan()
+
+        async with locks.hold(Circuit.HEATING, 'LeaderService.take_over'):
+            await self.app.services.heating.update_from_state()
+            if not restored:
+                await self.app.services.heating.plan()
+
+        self.is_leader = True
+        self.app.clients.ecodan.writes_enabled = True
+        self.app.scheduler.resume()
+
+    def stand_by(self):
+        self.is_leader = False
+        self.app.clients.ecodan.writes_enabled = False
+        self.app.scheduler.pause()
+
+    async def warm_up(self, now):
+        if self.warmed_at is not None \
+                and now - self.warmed_at < datetime.timedelta(seconds=self.warm_seconds):
+            return
+
+        self.warmed_at = now
+
+        if not self.models_warmed:
+            self.models_warmed = True
+
+            dhw = self.app.services.dhw
+            if dhw.model_enabled and not dhw.tank_model_fitted:
+                await dhw.fit_tank_model()
+
+            if self.app.services.heating.model_enabled:
+                await self.app.services.thermal.get_model()
+
+            await self.app.services.cop.fit()
+
+        await asyncio.gather(
+            self.app.services.snapshot.restore(),
+            self.app.clients.mme_soleil.get_production_forecast()
+        )
+
+    async def get_status(self):
+        lease = await Lease.from_name(self.name)
+
+        return {
+            'enabled': self.enabled,
+            'instance': self.instance_id,
+            'pid': os.getpid(),
+            'leader': self.is_leader,
+            'lease': lease.to_json() if lease is not None else None
+        }
@@ -18,6 +18,7 @@ import asyncio
 import datetime
 
 import math
+import numpy as np
 import pytz
 
 from db.models.dhw_schedule import DhwSchedule
@@ -30,54 +31,205 @@ class LegionellaService:
     def __init__(self, app):
         self.app = app
 
+        self.configure(self.app.config)
+
+        self.buffer_interval = 2
+
+        # relative change of the COP per °C outside temperature, around the A7 rating point
+        self.cop_temp_coefficient = 0.025
+        self.cop_reference_temp = 7
+
+        # planned start and its expected outside temperature
+        self.planned_slot = None
+
+        # fallback
+        self.timestamp_started = datetime.datetime.now(
+            tz=pytz.timezone("Europe/Brussels")
+        )
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
         self.interval = datetime.timedelta(
-            days=self.app.config['DHW_LEGIONELLA_INTERVAL_DAYS'])
+            days=config['DHW_LEGIONELLA_INTERVAL_DAYS'])
 
         self.min_interval = datetime.timedelta(
-            days=self.app.config['DHW_LEGIONELLA_MIN_INTERVAL_DAYS'])
+            days=config['DHW_LEGIONELLA_MIN_INTERVAL_DAYS'])
 
         self.min_start_interval = datetime.timedelta(
-            minutes=self.app.config['DHW_MIN_INTERVAL_MINUTES']
+            minutes=config['DHW_MIN_INTERVAL_MINUTES']
         )
 
         self.min_start_interval_retry = datetime.timedelta(
-            minutes=self.app.config['DHW_MIN_INTERVAL_RETRY_MINUTES']
+            minutes=config['DHW_MIN_INTERVAL_RETRY_MINUTES']
         )
 
-        self.runtime_hours = self.app.config['DHW_LEGIONELLA_RUNTIME_HOURS']
+        self.runtime_hours = config['DHW_LEGIONELLA_RUNTIME_HOURS']
         self.runtime = datetime.timedelta(hours=self.runtime_hours)
 
-        self.max_runtime_hours_ecodan = self.app.config["DHW_ECODAN_MAX_RUNTIME_HOURS"]
+        self.max_runtime_hours_ecodan = config["DHW_ECODAN_MAX_RUNTIME_HOURS"]
         self.max_runtime_ecodan = datetime.timedelta(
             hours=self.max_runtime_hours_ecodan
         )
 
-        self.max_retry = self.app.config['DHW_MAX_RETRY']
+        self.max_retry = config['DHW_MAX_RETRY']
 
-        self.running_mode = DhwRunningMode(self.app.config["DHW_RUNNING_MODE"])
-        self.running_mode_stepped_max_temp = self.app.config[
+        self.running_mode = DhwRunningMode(config["DHW_RUNNING_MODE"])
+        self.running_mode_stepped_max_temp = config[
             "DHW_RUNNING_MODE_AUTO_STEP_MAX_TEMP"
         ]
 
-        self.dhw_temp_off = self.app.config['DHW_TEMP_OFF']
-        self.dhw_temp_legionella = self.app.config['DHW_TEMP_LEGIONELLA']
-        self.dhw_temp_drop = self.app.config['DHW_TEMP_DROP']
-        self.dhw_temp_drop_ecodan = self.app.config['DHW_TEMP_DROP_ECODAN']
+        self.dhw_temp_off = config['DHW_TEMP_OFF']
+        self.dhw_temp_legionella = config['DHW_TEMP_LEGIONELLA']
+        self.dhw_temp_drop = config['DHW_TEMP_DROP']
+        self.dhw_temp_drop_ecodan = config['DHW_TEMP_DROP_ECODAN']
 
         self.legionella_temp_min_start = self.dhw_temp_legionella - self.dhw_temp_drop_ecodan
 
-        self.consumption_kwh = self.app.config['DHW_LEGIONELLA_KWH']
+        self.consumption_kwh = config['DHW_LEGIONELLA_KWH']
 
-        self.buffer_interval = 2
+        # starts within this much grid energy of the best are equally good
+        self.slot_tolerance_kwh = 0.05 * self.consumption_kwh
 
-        # fallback
-        self.timestamp_started = datetime.datetime.now(
-            tz=pytz.timezone("Europe/Brussels")
-        )
+    def get_state(self):
+        return {
+            'timestamp_started': self.timestamp_started.isoformat(),
+            'planned_slot': [self.planned_slot[0].isoformat(), self.planned_slot[1]]
+            if self.planned_slot is not None else None
+        }
 
-        self.__scheduled_jobs()
+    def set_state(self, state):
+        self.timestamp_started = datetime.datetime.fromisoformat(state['timestamp_started'])
+
+        planned_slot = state.get('planned_slot')
+        self.planned_slot = (
+            datetime.datetime.fromisoformat(planned_slot[0]), planned_slot[1]
+        ) if planned_slot is not None else None
+
+    async def get_expected_tank_temp(self, timestamps):
+        dhw = self.app.services.dhw
+        if not dhw.model_enabled:
+            return None
+
+        if not dhw.tank_model_fitted:
+            await dhw.fit_tank_model()
+
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        current_temp, dhw_base_temp = await asyncio.gather(
+            self.app.clients.hab.get_current_dhw_temp(), dhw.get_dhw_base_temp())
+
+        expected = dhw.tank_model.predict(now, current_temp.value, timestamps)
+        if expected is None:
+            return None
+
+        # regular DHW cycles keep the tank above its base temperature
+        return np.maximum(expected, dhw_base_temp)
+
+    def score(self, energy, temperature, tank_temp):
+        """
+        Expected grid energy in kWh of a legionella cycle per candidate start.
+
+        Parameters
+        ----------
+        energy : numpy.ndarray
+            Forecast solar production during the cycle in kWh.
+        temperature : numpy.ndarray or None
+            Forecast mean outside temperature during the cycle.
+        tank_temp : numpy.ndarray or None
+            Expected tank temperature at the start of the cycle.
+
+        The fitted COP model gives the demand directly; otherwise the
+        configured consumption is scaled by the temperature lift and a linear
+        COP proxy.
+        """
+        cop = self.app.services.cop
+        if cop.enabled and cop.model is not None and temperature is not None and tank_temp is not None:
+            return np.maximum(
+                cop.get_cycle_kwh(temperature, tank_temp, self.dhw_temp_legionella) - energy, 0)
+
+        demand = np.full(len(energy), self.consumption_kwh, dtype=float)
+
+        if tank_temp is not None:
+            lift = np.maximum(self.dhw_temp_legionella - tank_temp, 0)
+            if lift.mean() > 0:
+                demand *= lift / lift.mean()
+
+        if temperature is not None:
+            demand *= np.clip(
+                1 - self.cop_temp_coefficient * (temperature - self.cop_reference_temp), 0.5, 1.5)
+
+        return np.maximum(demand - energy, 0)
+
+    async def find_start(self, first_start, ultimate_start, order):
+        """
+        Find the start of a legionella cycle between `first_start` and
+        `ultimate_start`.
+
+        Every start in the production forecast is scored in one pass on its
+        expected grid energy. Of the starts within `slot_tolerance_kwh` of the
+        best one, `order` picks the first or the last. Without a forecast the
+        remote production peak is used.
+        """
+        forecast = await self.app.clients.mme_soleil.get_production_forecast()
+
+        if forecast is not None and forecast.covers(first_start, first_start):
+            starts, energy, temperature = forecast.get_windows(
+                first_start, ultimate_start, self.runtime_hours)
+
+            if len(starts) > 0:
+                await self.app.services.cop.get_model()
+                grid_kwh = self.score(
+                    energy, temperature, await self.get_expected_tank_temp(starts))
+
+                candidates = np.flatnonzero(grid_kwh <= grid_kwh.min() + self.slot_tolerance_kwh)
+                idx = candidates[0] if order == 'first' else candidates[-1]
+
+                planned_start = forecast.to_datetime(starts[idx])
+                self.planned_slot = (
+                    planned_start, float(temperature[idx])
+                ) if temperature is not None else None
+
+                self.app.log.debug(
+                    'Scored {count} legionella starts, picked {planned_start} expecting '
+                    '{grid_kwh:.2f} kWh from the grid.',
+                    count=len(starts), planned_start=planned_start, grid_kwh=grid_kwh[idx])
+                return planned_start
+
+        return (await self.app.clients.mme_soleil.get_peak_production(
+            start=first_start,
+            end=ultimate_start,
+            min_kwh=self.consumption_kwh,
+            peak_duration_h=self.runtime_hours,
+            order=order
+        )).timestamp
+
+    async def get_planned_outside_temp(self, schedule):
+        """
+        Expected outside temperature during the planned legionella cycle,
+        fetched only when the planner did not provide it.
+        """
+        if self.planned_slot is None or self.planned_slot[0] != schedule.planned_start:
+            stats = await self.app.clients.mme_soleil.get_temperature_stats(
+                schedule.planned_start, schedule.planned_start + self.runtime)
+            self.planned_slot = (
+                schedule.planned_start, stats.q50 if stats is not None else None)
+
+        return self.planned_slot[1]
+
+    async def plan(self, replan=False):
+        new_schedule = await self.make_plan(replan)
+        if new_schedule is None:
+            return
+
+        self.app.log.debug(
+            'Saving new schedule. First start: {first_start}, planned start: {planned_start}, '
+            'ultimate start: {ultimate_start}.',
+            mode='legionella', first_start=new_schedule.first_start,
+            planned_start=new_schedule.planned_start, ultimate_start=new_schedule.ultimate_start)
+
+        await new_schedule.save()
 
-    async def plan(self):
+    async def make_plan(self, replan=False):
         now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
 
         self.app.log.debug('Planning Legionella cycle')
@@ -87,15 +239,15 @@ class LegionellaService:
             OperatingMode.from_circuit('dhw')
         )
 
-        if current_schedule and current_schedule.planned_start >= now:
+        if current_schedule and current_schedule.planned_start >= now and not replan:
             # already planned
             self.app.log.debug('Already planned, not replanning.')
-            return
+            return None
 
         if operating_mode and operating_mode.mode in [DhwMode.PENDING_LEGIONELLA, DhwMode.RUNNING_LEGIONELLA]:
             # already started
             self.app.log.debug('Already started, not planning.')
-            return
+            return None
 
         last_start = (await self.app.clients.hab.get_last_legionella_start()).timestamp
         ultimate_start = pytz.timezone('Europe/Brussels').localize(
@@ -120,19 +272,9 @@ class LegionellaService:
             now + self.min_start_interval
         )
 
-        planned_start = (await self.app.clients.mme_soleil.get_peak_production(
-            start=first_start,
-            end=ultimate_start,
-            min_kwh=self.consumption_kwh,
-            peak_duration_h=self.runtime_hours,
-            order=order
-        )).timestamp
-
-        self.app.log.debug(f'''Saving new schedule. First start: {first_start},
-                           planned start: {planned_start},
-                           ultimate_start: {ultimate_start}''')
+        planned_start = await self.find_start(first_start, ultimate_start, order)
 
-        new_schedule = DhwSchedule(
+        return DhwSchedule(
             mode='legionella',
             first_start=first_start,
             planned_start=planned_start,
@@ -140,7 +282,6 @@ class LegionellaService:
             fast=(order == 'first'),
             retry=0
         )
-        await new_schedule.save()
 
     async def reschedule(self):
         current_schedule = await DhwSchedule.from_mode('legionella')
@@ -161,8 +302,10 @@ class LegionellaService:
 
         if new_ultimate_start > current_schedule.ultimate_start:
             self.app.log.debug(
-                f'''Ultimate start {new_ultimate_start} is after current ultimate start
-                of {current_schedule.ultimate_start}, rescheduling beyond ultimate start.''')
+                'Ultimate start {new_ultimate_start} is after current ultimate start '
+                'of {ultimate_start}, rescheduling beyond ultimate start.',
+                new_ultimate_start=new_ultimate_start,
+                ultimate_start=current_schedule.ultimate_start)
             ultimate_start = new_ultimate_start
             first_start = max(
                 ultimate_start - (self.interval - self.min_interval),
@@ -172,25 +315,23 @@ class LegionellaService:
             ultimate_start = current_schedule.ultimate_start
             first_start = current_schedule.first_start
 
-        planned_start = (await self.app.clients.mme_soleil.get_peak_production(
-            start=first_start,
-            end=ultimate_start,
-            min_kwh=self.consumption_kwh,
-            peak_duration_h=self.runtime_hours,
-            order='first' if current_schedule.fast else 'last'
-        )).timestamp
+        planned_start = await self.find_start(
+            first_start, ultimate_start, 'first' if current_schedule.fast else 'last')
 
         if planned_start >= now + self.min_start_interval:
-            self.app.log.debug(f'''Rescheduled Legionella cycle. First start: {first_start},
-                    planned start: {planned_start},
-                    ultimate_start: {ultimate_start}''')
+            self.app.log.debug(
+                'Rescheduled Legionella cycle. First start: {first_start}, '
+                'planned start: {planned_start}, ultimate start: {ultimate_start}.',
+                mode='legionella', first_start=first_start, planned_start=planned_start,
+                ultimate_start=ultimate_start)
             current_schedule.first_start = first_start
             current_schedule.ultimate_start = ultimate_start
             current_schedule.planned_start = planned_start
             await current_schedule.save()
         else:
             self.app.log.debug(
-                f'Newly planned_start of {planned_start} is too close to current time, not rescheduling.')
+                'Newly planned start of {planned_start} is too close to current time, not rescheduling.',
+                planned_start=planned_start)
 
     async def postpone(self):
         current_schedule = await DhwSchedule.from_mode('legionella')
@@ -214,18 +355,15 @@ class LegionellaService:
             self.app.log.debug('First start would be after ultimate start.')
             raise MaxRetriesExceededError
 
-        planned_start = (await self.app.clients.mme_soleil.get_peak_production(
-            start=first_start,
-            end=current_schedule.ultimate_start,
-            min_kwh=self.consumption_kwh,
-            peak_duration_h=self.runtime_hours,
-            order='first' if current_schedule.fast else 'last'
-        )).timestamp
+        planned_start = await self.find_start(
+            first_start, current_schedule.ultimate_start,
+            'first' if current_schedule.fast else 'last')
 
-        self.app.log.debug(f'''Postponing (retry {current_schedule.retry + 1})
-                           First start: {first_start},
-                           planned start: {planned_start},
-                           ultimate_start: {current_schedule.ultimate_start}''')
+        self.app.log.debug(
+            'Postponing (retry {retry}). First start: {first_start}, '
+            'planned start: {planned_start}, ultimate start: {ultimate_start}.',
+            mode='legionella', retry=current_schedule.retry + 1, first_start=first_start,
+            planned_start=planned_start, ultimate_start=current_schedule.ultimate_start)
 
         current_schedule.first_start = first_start
         current_schedule.planned_start = planned_start
@@ -241,7 +379,8 @@ class LegionellaService:
         if current_temp.value > self.legionella_temp_min_start:
             # too hot to start
             self.app.log.debug(
-                f'DHW temperature of {current_temp.value} °C  still too hot.')
+                'DHW temperature of {temperature} °C still too hot.',
+                temperature=current_temp.value)
             return False
         else:
             return can_start
@@ -299,7 +438,8 @@ class LegionellaService:
             )
 
         self.app.log.debug(
-            f'Setting {Circuit.DHW} to mode: {DhwMode.PENDING_LEGIONELLA}')
+            'Setting {circuit} to mode: {mode}',
+            circuit=Circuit.DHW, mode=DhwMode.PENDING_LEGIONELLA)
         operating_mode.mode = DhwMode.PENDING_LEGIONELLA
         await operating_mode.save()
 
@@ -334,18 +474,21 @@ class LegionellaService:
         if dhw_setpoint.setpoint == dhw_target_setpoint.setpoint:
             # setpoint already at target
             self.app.log.debug(
-                f"Current setpoint already equals target setpoint, nothing to do."
+                "Current setpoint already equals target setpoint, nothing to do."
             )
         elif dhw_temp.value < dhw_setpoint.setpoint - self.buffer_interval:
             # not hot enough
             self.app.log.debug(
-                f"Still heating up (now: {dhw_temp.value}) to normal temperature, not increasing current target yet."
+                "Still heating up (now: {temperature}) to normal temperature, not increasing current target yet.",
+                temperature=dhw_temp.value
             )
         elif dhw_temp.value >= dhw_setpoint.setpoint - self.buffer_interval:
             if dhw_setpoint.setpoint <= dhw_target_setpoint.setpoint - 1:
                 self.app.log.debug(
-                    f"""Current DHW temperature of {dhw_temp.value}° is within {self.buffer_interval}° of current target.
-                    Setting target to {dhw_setpoint.setpoint + 1}°."""
+                    "Current DHW temperature of {temperature}° is within {interval}° of current target. "
+                    "Setting target to {setpoint}°.",
+                    temperature=dhw_temp.value, interval=self.buffer_interval,
+                    setpoint=dhw_setpoint.setpoint + 1
                 )
                 dhw_setpoint.setpoint += 1
                 await asyncio.gather(
@@ -354,13 +497,15 @@ class LegionellaService:
                 )
             else:
                 self.app.log.debug(
-                    f"""Current DHW temperature of {dhw_temp.value}° is not yet within {self.buffer_interval}° of current target.
-                    Not increasing target yet."""
+                    "Current DHW temperature of {temperature}° is not yet within {interval}° of current target. "
+                    "Not increasing target yet.",
+                    temperature=dhw_temp.value, interval=self.buffer_interval
                 )
         else:
             self.app.log.debug(
-                f"""Current DHW temperature of {dhw_temp.value}° is not yet within {self.buffer_interval}° of current target.
-                    Not increasing target yet."""
+                "Current DHW temperature of {temperature}° is not yet within {interval}° of current target. "
+                "Not increasing target yet.",
+                temperature=dhw_temp.value, interval=self.buffer_interval
             )
 
     async def stop(self):
@@ -372,7 +517,8 @@ class LegionellaService:
 
         await self.app.clients.ecodan.set_dhw_target_temp(self.dhw_temp_off)
 
-        self.app.log.debug(f'Setting {Circuit.DHW} to mode: {DhwMode.OFF}')
+        self.app.log.debug(
+            'Setting {circuit} to mode: {mode}', circuit=Circuit.DHW, mode=DhwMode.OFF)
         operating_mode.mode = DhwMode.OFF
         await operating_mode.save()
 
@@ -381,7 +527,8 @@ class LegionellaService:
         if dhw_temp.value >= self.dhw_temp_legionella:
             now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
             self.app.scheduler.add_job(
-                self.plan, 'date', run_date=now + datetime.timedelta(minutes=60))
+                self.app.locks.wrap(Circuit.DHW, self.plan),
+                'date', run_date=now + datetime.timedelta(minutes=60))
         else:
             await self.plan()
 
@@ -393,7 +540,8 @@ class LegionellaService:
             current_state = await self.app.clients.hab.get_current_state()
             if current_state.operating_mode == 'Hot water':
                 self.app.log.debug(
-                    f'Setting {Circuit.DHW} to mode: {DhwMode.RUNNING_LEGIONELLA}')
+                    'Setting {circuit} to mode: {mode}',
+                    circuit=Circuit.DHW, mode=DhwMode.RUNNING_LEGIONELLA)
                 operating_mode.mode = DhwMode.RUNNING_LEGIONELLA
                 await operating_mode.save()
         elif operating_mode.mode == DhwMode.RUNNING_LEGIONELLA:
@@ -412,6 +560,9 @@ class LegionellaService:
                 await self.step()
 
     def __scheduled_jobs(self):
+        locks = self.app.locks
+
+        self.app.scheduler.add_job(
+            locks.wrap(Circuit.DHW, self.plan), 'cron', hour='4,8,12,16,20', minute='0')
         self.app.scheduler.add_job(
-            self.plan, 'cron', hour='4,8,12,16,20', minute='0')
-        self.app.scheduler.add_job(self.reschedule, 'cron', minute='56')
+            locks.wrap(Circuit.DHW, self.reschedule), 'cron', minute='56')
@@ -0,0 +1,127 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import collections
+import contextlib
+import datetime
+import functools
+import time
+
+import pytz
+
+from db.models.operating_mode import Circuit
+
+
+class LockService:
+    """
+    One lock per circuit, so jobs changing the same circuit run one at a
+    time while jobs on the other circuit go ahead.
+
+    The time spent waiting for a lock is kept per circuit, for the last
+    `LOCK_WAIT_HISTORY` acquisitions.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+        self.configure(self.app.config)
+
+        self.locks = {circuit: asyncio.Lock() for circuit in Circuit}
+        self.holders = {}
+
+        self.waits = {
+            circuit: collections.deque(maxlen=self.app.config['LOCK_WAIT_HISTORY'])
+            for circuit in Circuit
+        }
+        self.stats = {
+            circuit: {'count': 0, 'waited': 0, 'total_wait_ms': 0, 'max_wait_ms': 0}
+            for circuit in Circuit
+        }
+
+    def configure(self, config):
+        self.wait_warning_seconds = config['LOCK_WAIT_WARNING_SECONDS']
+
+    @contextlib.asynccontextmanager
+    async def hold(self, circuit, name):
+        """
+        Hold the lock of `circuit` on behalf of the job called `name`.
+        """
+        lock = self.locks[circuit]
+
+        start = time.monotonic()
+        async with lock:
+            self.record(circuit, name, time.monotonic() - start)
+
+            self.holders[circuit] = (
+                name, datetime.datetime.now(tz=pytz.timezone('Europe/Brussels')))
+            try:
+                yield
+            finally:
+                del self.holders[circuit]
+
+    def wrap(self, circuit, func):
+        """
+        Wrap a coroutine function to run while holding the lock of `circuit`,
+        for use as scheduled job.
+        """
+        @functools.wraps(func)
+        async def locked(*args, **kwargs):
+            async with self.hold(circuit, func.__qualname__):
+                return await func(*args, **kwargs)
+
+        return locked
+
+    def record(self, circuit, name, wait):
+        wait_ms = round(wait * 1000)
+
+        stats = self.stats[circuit]
+        stats['count'] += 1
+        stats['total_wait_ms'] += wait_ms
+        stats['max_wait_ms'] = max(stats['max_wait_ms'], wait_ms)
+        if wait_ms > 0:
+            stats['waited'] += 1
+
+        self.waits[circuit].append((int(time.time() * 1000), wait_ms))
+
+        if wait >= self.wait_warning_seconds:
+            self.app.log.warning(
+                '{name} waited {wait:.1f} seconds for the {circuit} lock.',
+                name=name, wait=wait, circuit=circuit.value)
+
+    def get_series(self, circuit):
+        """
+        Recent lock waits of `circuit`.
+
+        Returns
+        -------
+        tuple
+            Epoch milliseconds of the acquisitions and the waits in ms.
+        """
+        waits = self.waits[circuit]
+        return [t for t, _ in waits], [w for _, w in waits]
+
+    def get_stats(self):
+        return {
+            circuit.value: {
+                **self.stats[circuit],
+                'holder': self.holders[circuit][0] if circuit in self.holders else None,
+                'held_since': self.holders[circuit][1].isoformat()
+                if circuit in self.holders else None
+            }
+            for circuit in Circuit
+        }
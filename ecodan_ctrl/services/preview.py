@@ -0,0 +1,145 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import copy
+import datetime
+
+from db.models.dhw_schedule import DhwSchedule
+from services.cop import CopService
+from services.dhw import DhwService
+from services.heating import HeatingService
+from services.legionella import LegionellaService
+from services.tariff import TariffService
+from util.settings import apply_overrides
+
+
+class PreviewScheduler:
+    def add_job(self, *args, **kwargs):
+        # preview services are short lived, their jobs never run
+        pass
+
+    def add_listener(self, *args, **kwargs):
+        pass
+
+    def get_job(self, job_id):
+        return None
+
+
+class PreviewLogger:
+    def __init__(self, log):
+        self.logger = log
+
+    def log(self, level, message, **fields):
+        return self.logger.log(level, message, preview=True, **fields)
+
+    def debug(self, message, **fields):
+        return self.logger.debug(message, preview=True, **fields)
+
+    def info(self, message, **fields):
+        return self.logger.info(message, preview=True, **fields)
+
+    def warning(self, message, **fields):
+        return self.logger.warning(message, preview=True, **fields)
+
+    def error(self, message, **fields):
+        return self.logger.error(message, preview=True, **fields)
+
+
+class PreviewApp:
+    """
+    Application stand-in running the planners with overridden configuration.
+
+    Clients, the thermal model and the fitted tank model are shared with the
+    live application, so cached forecasts are reused. Nothing is written to
+    the Ecodan or the database.
+    """
+
+    def __init__(self, app, config):
+        self.config = config
+        self.db = app.db
+        self.clients = app.clients
+        self.startup_time = app.startup_time
+        self.scheduler = PreviewScheduler()
+        self.locks = app.locks
+        self.log = PreviewLogger(app.log)
+        self.read_only = True
+
+        self.services = copy.copy(app.services)
+        self.services.app = self
+        self.services.tariff = TariffService(self)
+        self.services.cop = CopService(self)
+        self.services.legionella = LegionellaService(self)
+        self.services.dhw = DhwService(self)
+        self.services.heating = HeatingService(self)
+
+        self.services.dhw.tank_model = app.services.dhw.tank_model
+        self.services.dhw.tank_model_fitted = app.services.dhw.tank_model_fitted
+        self.services.cop.model = app.services.cop.model
+        self.services.cop.fit_attempted = app.services.cop.fit_attempted
+
+
+class PreviewService:
+    def __init__(self, app):
+        self.app = app
+
+        self.prefixes = ('HEATING_', 'DHW_')
+
+    async def plan(self, overrides, day=None):
+        """
+        Plan the heating, DHW and legionella schedules with `overrides`
+        applied, without saving or applying them.
+
+        Parameters
+        ----------
+        overrides : dict
+            Heating and DHW settings to override.
+        day : datetime.date, optional
+            Day to plan the heating schedule for, defaults to today. DHW and
+            legionella cycles are always planned from now.
+
+        Returns
+        -------
+        dict
+            The planned schedules. The DHW and legionella schedules are the
+            current ones when they would not be replanned.
+        """
+        if day is None:
+            day = datetime.date.today()
+
+        preview_app = PreviewApp(
+            self.app, apply_overrides(self.app.config, overrides, self.prefixes))
+        services = preview_app.services
+
+        heating_schedule, dhw_schedule, legionella_schedule = await asyncio.gather(
+            services.heating.make_plan(day),
+            services.dhw.make_plan(),
+            services.legionella.make_plan()
+        )
+
+        if dhw_schedule is None:
+            dhw_schedule = await DhwSchedule.from_mode('dhw')
+
+        if legionella_schedule is None:
+            legionella_schedule = await DhwSchedule.from_mode('legionella')
+
+        return {
+            'date': day.isoformat(),
+            'config': {k: preview_app.config[k] for k in overrides},
+            'heating': heating_schedule.to_json(),
+            'dhw': dhw_schedule.to_json() if dhw_schedule else None,
+            'legionella': legionella_schedule.to_json() if legionella_schedule else None
+        }
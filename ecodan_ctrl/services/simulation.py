@@ -0,0 +1,421 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytz
+
+from db.base import Database
+from dto.generic import TimePeriodStatsDto, TimeRangeDto, TimestampDto
+from dto.heating import SetpointDto
+from dto.heatpump import HeatPumpSetpointDto
+from dto.solar import SolarProductionDto
+from services.heating import HeatingService
+from services.lock import LockService
+from services.preview import PreviewScheduler
+from services.tariff import TariffService
+from services.thermal import ThermalService
+from util.forecast import ProductionForecast
+from util.settings import apply_overrides
+
+
+class SimulationInput:
+    """
+    Recorded history resampled on a regular grid.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray
+        Epoch seconds of each step, evenly spaced by `step`.
+    outside : numpy.ndarray
+        Outside temperature per step.
+    net_power : numpy.ndarray
+        Power drawn from the grid per step in W, negative while injecting.
+    price : numpy.ndarray
+        Energy price per kWh per step, NaN where unknown.
+    house_temp : float
+        Indoor temperature at the first step.
+    dhw_temp : float
+        Tank temperature at the first step.
+    thermal_model : util.thermal.ThermalModel
+        Fitted model of the house.
+    tank_model : util.tank.TankModel
+        Fitted model of the DHW tank.
+    step : int
+        Seconds between steps.
+    """
+
+    def __init__(self, timestamps, outside, net_power, price, house_temp, dhw_temp,
+                 thermal_model, tank_model, step=900):
+        self.timestamps = timestamps
+        self.outside = outside
+        self.net_power = net_power
+        self.price = price
+        self.house_temp = house_temp
+        self.dhw_temp = dhw_temp
+        self.thermal_model = thermal_model
+        self.tank_model = tank_model
+        self.step = step
+
+    def get_dates(self):
+        return np.array([
+            datetime.datetime.fromtimestamp(t, tz=pytz.timezone('Europe/Brussels')).date()
+            for t in self.timestamps
+        ])
+
+
+class NullLogger:
+    def log(self, level, message, **fields):
+        pass
+
+    def debug(self, message, **fields):
+        pass
+
+    def info(self, message, **fields):
+        pass
+
+    def warning(self, message, **fields):
+        pass
+
+    def error(self, message, **fields):
+        pass
+
+
+class HistoryMmeSoleilClient:
+    """
+    Answers forecast queries from the recorded history, using the solar
+    surplus as production.
+    """
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.surplus = np.maximum(-inputs.net_power, 0)
+
+        self.forecast = ProductionForecast(inputs.timestamps, self.surplus, inputs.outside)
+
+        dates = inputs.get_dates()
+        daily_energy = [
+            self.surplus[dates == d].sum() / 1000 * (inputs.step / 3600)
+            for d in np.unique(dates)
+        ]
+        self.max_daily_energy = max(max(daily_energy, default=0), 1e-6)
+
+    def to_datetime(self, epoch):
+        return datetime.datetime.fromtimestamp(epoch, tz=pytz.timezone('Europe/Brussels'))
+
+    def select(self, start, end):
+        return (self.inputs.timestamps >= start.timestamp()) \
+            & (self.inputs.timestamps <= end.timestamp())
+
+    async def get_peak_production(self, start, end, min_kwh, peak_duration_h, order):
+        timestamp = self.forecast.get_peak_production(
+            start, end, min_kwh, peak_duration_h, order)
+        return TimestampDto(timestamp=timestamp or start)
+
+    async def get_production_bounds(self, date=None, min_kw=0):
+        if date is None:
+            date = datetime.date.today()
+
+        start = pytz.timezone('Europe/Brussels').localize(
+            datetime.datetime.combine(date, datetime.time(0, 0, 0)))
+        producing = self.select(start, start + datetime.timedelta(days=1)) \
+            & (self.surplus > min_kw * 1000)
+
+        if not producing.any():
+            if min_kw > 0:
+                return TimeRangeDto(None, None)
+            # no surplus at all, assume a winter day
+            return TimeRangeDto(start.replace(hour=8), start.replace(hour=20))
+
+        timestamps = self.inputs.timestamps[producing]
+        return TimeRangeDto(
+            self.to_datetime(timestamps[0]),
+            self.to_datetime(timestamps[-1] + self.inputs.step)
+        )
+
+    async def get_temperature_stats(self, start, end):
+        values = self.inputs.outside[self.select(start, end)]
+        values = values[~np.isnan(values)]
+
+        if len(values) == 0:
+            return None
+
+        q25, q50, q75 = np.percentile(values, [25, 50, 75])
+        return TimePeriodStatsDto(
+            start=start, end=end, unit='°C', q25=float(q25), q50=float(q50), q75=float(q75),
+            stddev=float(values.std()))
+
+    async def get_production_weather(self, start, end):
+        selected = self.select(start, end)
+        energy = self.surplus[selected].sum() / 1000 * (self.inputs.step / 3600)
+
+        # the best recorded day stands in for a clear sky
+        clearsky = self.max_daily_energy * min(
+            selected.sum() * self.inputs.step / 86400, 1)
+
+        return SolarProductionDto(
+            weather_data=energy, clearsky=clearsky, ratio=energy / max(clearsky, 1e-6))
+
+
+class HistoryHabClient:
+    """
+    Answers heat pump and house queries from the running simulation.
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+
+    async def get_setpoint(self):
+        return HeatPumpSetpointDto(
+            dhw=self.simulation.dhw_setpoint, heating=self.simulation.heating_setpoint)
+
+    async def get_house_temperature(self, start=None, end=None):
+        temp = self.simulation.house_temp
+        return TimePeriodStatsDto(
+            start=start, end=end, unit='°C', q25=temp, q50=temp, q75=temp, stddev=0)
+
+
+class SimulationApp:
+    """
+    Application stand-in running the heating planner against the recorded
+    history. Prices are read from the database, which is never written to.
+    """
+
+    def __init__(self, config, inputs, simulation):
+        self.config = config
+        self.db = Database(self)
+        self.scheduler = PreviewScheduler()
+        self.log = NullLogger()
+        self.read_only = True
+
+        self.clients = SimpleNamespace(
+            mme_soleil=HistoryMmeSoleilClient(inputs),
+            hab=HistoryHabClient(simulation),
+        )
+
+        self.locks = LockService(self)
+
+        self.services = SimpleNamespace(app=self)
+        self.services.thermal = ThermalService(self)
+        self.services.thermal.model = inputs.thermal_model
+        self.services.tariff = TariffService(self)
+        self.services.heating = HeatingService(self)
+
+
+class Simulation:
+    """
+    Replay of the heating and DHW planning over recorded history.
+
+    Every day the heating schedule is planned by the heating service itself,
+    with forecasts answered from the history. The house then follows the
+    thermal model and the tank the fitted cooling and draw model, while DHW
+    cycles are planned at the first production peak once the tank drops below
+    its threshold, like the DHW service does.
+
+    The recorded net power includes the heat pump as it actually ran, so the
+    solar surplus is an approximation. Heat pump power is derived from the
+    heat the thermal model attributes to the setpoint, using a fixed heat
+    capacity of the house and COP.
+
+    Parameters
+    ----------
+    inputs : SimulationInput
+        Recorded history.
+    config : dict
+        Configuration to simulate.
+    comfort_day : float
+        Minimum indoor temperature between 8:00 and 20:00.
+    comfort_night : float
+        Minimum indoor temperature during the night.
+    heat_capacity : float
+        Heat capacity of the house in kWh/K.
+    cop : float
+        Coefficient of performance of the heat pump.
+    """
+
+    def __init__(self, inputs, config, comfort_day, comfort_night, heat_capacity=10.0, cop=3.5):
+        self.inputs = inputs
+        self.config = config
+        self.comfort_day = comfort_day
+        self.comfort_night = comfort_night
+        self.heat_capacity = heat_capacity
+        self.cop = cop
+
+        self.house_temp = inputs.house_temp
+        self.dhw_temp = inputs.dhw_temp
+        self.heating_setpoint = config['HEATING_TEMP_NIGHT']
+        self.dhw_setpoint = config['DHW_TEMP_OFF']
+
+        self.dhw_runtime = datetime.timedelta(hours=config['DHW_NORMAL_RUNTIME_HOURS'])
+        self.dhw_min_interval = datetime.timedelta(minutes=config['DHW_MIN_INTERVAL_MINUTES'])
+        self.dhw_max_interval = datetime.timedelta(hours=config['DHW_NORMAL_INTERVAL_MAX_HOURS'])
+
+        self.app = SimulationApp(config, inputs, self)
+
+    def get_setpoints(self, heating_schedule, grid):
+        """
+        Heating setpoint per step, with price pauses applied.
+        """
+        thermal = self.app.services.thermal
+
+        setpoints = [
+            sp for sp in heating_schedule.setpoints if sp.setpoint_type in (
+                SetpointDto.SetpointType.RAISE,
+                SetpointDto.SetpointType.DROP,
+                SetpointDto.SetpointType.RAISE_BUFFER,
+            )
+        ]
+        trajectory = thermal.get_trajectory(grid, setpoints, self.heating_setpoint)
+
+        stop = None
+        for sp in sorted(heating_schedule.setpoints, key=lambda sp: sp.timestamp):
+            if sp.setpoint_type == SetpointDto.SetpointType.STOP:
+                stop = sp
+            elif sp.setpoint_type == SetpointDto.SetpointType.RESUME and stop is not None:
+                paused = (grid >= stop.timestamp.timestamp()) & (grid < sp.timestamp.timestamp())
+                trajectory[paused] = stop.setpoint
+                stop = None
+
+        return trajectory
+
+    async def plan_dhw(self, now):
+        first_start = now + self.dhw_min_interval
+        ultimate_start = now + self.dhw_max_interval - self.dhw_runtime
+
+        return (await self.app.clients.mme_soleil.get_peak_production(
+            start=first_start,
+            end=ultimate_start,
+            min_kwh=3,
+            peak_duration_h=self.config['DHW_NORMAL_RUNTIME_HOURS'],
+            order='first'
+        )).timestamp
+
+    async def run_async(self):
+        config = self.config
+        inputs = self.inputs
+        heating = self.app.services.heating
+        model = inputs.thermal_model
+        step_h = inputs.step / 3600
+
+        k, draw = inputs.tank_model.get_coefficients()
+        surplus = self.app.clients.mme_soleil.surplus
+        price = np.where(np.isnan(inputs.price), np.nanmean(inputs.price), inputs.price) \
+            if not np.isnan(inputs.price).all() else np.zeros(len(inputs.price))
+
+        dhw_base = config['DHW_TEMP_BASE']
+        dhw_kwh_per_step = config['DHW_NORMAL_KWH'] * inputs.step / self.dhw_runtime.total_seconds()
+        dhw_runtime_steps = max(int(self.dhw_runtime.total_seconds() // inputs.step), 1)
+
+        dhw_planned = None
+        dhw_remaining = 0
+        dhw_rise = 0
+
+        result = {
+            'cost': 0.0,
+            'energy_kwh': 0.0,
+            'solar_kwh': 0.0,
+            'comfort_hours': 0.0,
+            'dhw_cycles': 0,
+        }
+
+        dates = inputs.get_dates()
+
+        # the last day has no forecast for tomorrow
+        for day in np.unique(dates)[:-1]:
+            steps = np.flatnonzero(dates == day)
+            grid = inputs.timestamps[steps]
+
+            summer_mode = await heating.is_summer_mode(day=day)
+            dhw_threshold = dhw_base - (
+                config['DHW_TEMP_DROP'] if summer_mode else config['DHW_TEMP_DROP_WINTER'])
+
+            setpoints = self.get_setpoints(await heating.make_plan(day), grid)
+
+            for i, setpoint in zip(steps, setpoints):
+                now = datetime.datetime.fromtimestamp(
+                    inputs.timestamps[i], tz=pytz.timezone('Europe/Brussels'))
+
+                gain = model.b * (setpoint - self.house_temp)
+                self.house_temp += model.a * (inputs.outside[i] - self.house_temp) + gain + model.c
+                self.heating_setpoint = setpoint
+
+                load_kwh = max(gain, 0) * self.heat_capacity / self.cop
+
+                if dhw_remaining == 0:
+                    how = inputs.tank_model.hour_of_week(now)
+                    self.dhw_temp -= (k * (self.dhw_temp - inputs.tank_model.ambient_temp)
+                                      + draw[how]) * step_h
+
+                    if dhw_planned is None and self.dhw_temp <= dhw_threshold:
+                        dhw_planned = await self.plan_dhw(now)
+
+                    if self.dhw_temp <= config['DHW_TEMP_OFF'] - config['DHW_TEMP_DROP_ECODAN'] \
+                            or (dhw_planned is not None and now >= dhw_planned):
+                        dhw_planned = None
+                        dhw_remaining = dhw_runtime_steps
+                        dhw_rise = max(dhw_base - self.dhw_temp, 0) / dhw_runtime_steps
+                        result['dhw_cycles'] += 1
+
+                if dhw_remaining > 0:
+                    self.dhw_temp += dhw_rise
+                    self.dhw_setpoint = dhw_base
+                    dhw_remaining -= 1
+                    load_kwh += dhw_kwh_per_step
+                else:
+                    self.dhw_setpoint = config['DHW_TEMP_OFF']
+
+                solar_kwh = min(load_kwh, surplus[i] / 1000 * step_h)
+
+                result['energy_kwh'] += load_kwh
+                result['solar_kwh'] += solar_kwh
+                result['cost'] += (load_kwh - solar_kwh) * price[i]
+
+                comfort = self.comfort_day if 8 <= now.hour < 20 else self.comfort_night
+                if self.house_temp < comfort:
+                    result['comfort_hours'] += step_h
+
+        result['self_consumption'] = result['solar_kwh'] / result['energy_kwh'] \
+            if result['energy_kwh'] > 0 else 0.0
+
+        return result
+
+    def run(self):
+        return asyncio.run(self.run_async())
+
+
+worker = SimpleNamespace(inputs=None, config=None, options=None)
+
+
+def init_worker(inputs, config, options):
+    worker.inputs = inputs
+    worker.config = config
+    worker.options = options
+
+
+def run_simulation(overrides):
+    """
+    Simulate the worker's history with `overrides` applied, for use with a
+    process pool initialised by `init_worker`.
+    """
+    simulation = Simulation(
+        worker.inputs,
+        apply_overrides(worker.config, overrides),
+        **worker.options
+    )
+    return overrides, simulation.run()
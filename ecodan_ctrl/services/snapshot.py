@@ -0,0 +1,83 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import json
+
+import pytz
+
+from db.models.snapshot import Snapshot
+
+
+class SnapshotService:
+    def __init__(self, app):
+        self.app = app
+
+        self.name = 'controller'
+        self.interval_seconds = self.app.config['SNAPSHOT_INTERVAL_SECONDS']
+
+        self.configure(self.app.config)
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
+        self.max_age = datetime.timedelta(minutes=config['SNAPSHOT_MAX_AGE_MINUTES'])
+
+    def get_services(self):
+        return {
+            name: service for name, service in vars(self.app.services).items()
+            if name != 'app' and hasattr(service, 'get_state')
+        }
+
+    async def save(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        state = {name: service.get_state() for name, service in self.get_services().items()}
+        await Snapshot(self.name, now, json.dumps(state, separators=(',', ':'))).save()
+
+    async def restore(self):
+        """
+        Restore the volatile state of the services from the last snapshot.
+
+        Returns
+        -------
+        bool
+            Whether a recent enough snapshot was restored.
+        """
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+
+        snapshot = await Snapshot.from_name(self.name)
+        if snapshot is None:
+            self.app.log.debug('No snapshot to restore.')
+            return False
+
+        if snapshot.timestamp < now - self.max_age:
+            self.app.log.debug(
+                'Snapshot of {timestamp} is too old, not restoring.', timestamp=snapshot.timestamp)
+            return False
+
+        state = json.loads(snapshot.state)
+        for name, service in self.get_services().items():
+            if name in state:
+                service.set_state(state[name])
+
+        self.app.log.debug(
+            'Restored state of {services} from snapshot of {timestamp}.',
+            services=sorted(state), timestamp=snapshot.timestamp)
+        return True
+
+    def __scheduled_jobs(self):
+        self.app.scheduler.add_job(self.save, 'interval', seconds=self.interval_seconds)
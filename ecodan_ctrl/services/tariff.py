@@ -0,0 +1,178 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import datetime
+
+import numpy as np
+import pytz
+
+from db.models.price import Price
+from dto.generic import TimePeriodStatsDto, TimeSeriesDto
+
+
+class TariffService:
+    def __init__(self, app):
+        self.app = app
+
+        # same flat load the remote price simulation uses
+        self.simulated_power_kw = 0.75
+        self.quarter = datetime.timedelta(minutes=15)
+
+        # planners asking for missing prices fetch at most this often, the
+        # hourly job fetches regardless
+        self.fetch_interval = datetime.timedelta(minutes=15)
+        self.fetched_at = None
+
+        self.configure(self.app.config)
+
+        self.update_lock = asyncio.Lock()
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
+        self.baseline_period = datetime.timedelta(
+            days=config['HEATING_PRICE_PAUSE_BASELINE_PERIOD_DAYS'])
+        self.retention = max(
+            datetime.timedelta(days=config['HISTORY_RETENTION_DAYS']),
+            self.baseline_period + datetime.timedelta(days=2)
+        )
+
+    def get_tomorrow_end(self):
+        return pytz.timezone('Europe/Brussels').localize(
+            datetime.datetime.combine(
+                datetime.date.today() + datetime.timedelta(days=1),
+                datetime.time(23, 59, 59))
+        )
+
+    async def update(self):
+        """
+        Fetch the price series from HAB unless tomorrow's prices are already
+        cached.
+        """
+        if self.app.read_only:
+            return
+
+        async with self.update_lock:
+            published = await self.__update()
+
+        if published:
+            await self.validate()
+
+    async def __update(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        tomorrow_end = self.get_tomorrow_end()
+
+        last_price = await Price.get_last()
+        if last_price is not None and last_price.timestamp + self.quarter > tomorrow_end:
+            return False
+
+        if last_price is not None and last_price.timestamp >= now - self.baseline_period:
+            start = last_price.timestamp + self.quarter
+        else:
+            start = pytz.timezone('Europe/Brussels').localize(
+                datetime.datetime.combine(datetime.date.today(), datetime.time(0, 0, 0))
+            ) - self.baseline_period
+
+        self.fetched_at = now
+        prices = await self.app.clients.hab.get_price_series(start, tomorrow_end)
+        if not prices:
+            self.app.log.debug('No new prices published yet.')
+            return False
+
+        self.app.log.debug(
+            'Caching {count} prices from {start} until {end}.',
+            count=len(prices), start=prices[0].timestamp, end=prices[-1].timestamp)
+
+        await Price.save_all([Price(p.timestamp, p.value, p.unit) for p in prices])
+        await Price.remove_before(now - self.retention)
+
+        return prices[-1].timestamp + self.quarter > tomorrow_end
+
+    async def get_costs(self, start, end):
+        """
+        Cost per quarter of a constant load of `simulated_power_kw`.
+
+        Returns
+        -------
+        TimeSeriesDto
+            Costs per quarter, or None if the cached prices do not cover the
+            period.
+        """
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        quarter = self.quarter.total_seconds()
+
+        timestamps, prices, unit = await Price.get_arrays(start, end)
+
+        if (len(timestamps) == 0 or timestamps[-1] + quarter <= end.timestamp()) and (
+                self.fetched_at is None or now - self.fetched_at >= self.fetch_interval):
+            await self.update()
+            timestamps, prices, unit = await Price.get_arrays(start, end)
+
+        if len(timestamps) == 0 or timestamps[-1] + quarter <= end.timestamp():
+            return None
+
+        costs = prices * self.simulated_power_kw * (quarter / 3600)
+
+        return TimeSeriesDto(timestamps, costs, unit)
+
+    async def get_baseline(self, start, end):
+        costs = await self.get_costs(start, end)
+        if costs is None:
+            return None
+
+        q25, q50, q75 = np.quantile(costs.values, (0.25, 0.5, 0.75))
+
+        return TimePeriodStatsDto(
+            start=costs[0].timestamp,
+            end=costs[-1].timestamp,
+            unit=costs.unit,
+            q25=float(q25),
+            q50=float(q50),
+            q75=float(q75),
+            stddev=float(np.std(costs.values)),
+            sum=float(np.sum(costs.values)),
+        )
+
+    async def get_detail(self, start, end):
+        return await self.get_costs(start, end)
+
+    async def validate(self):
+        """
+        Compare the local baseline of tomorrow with the remote price
+        simulation.
+        """
+        tomorrow_end = self.get_tomorrow_end()
+        tomorrow_start = pytz.timezone('Europe/Brussels').localize(
+            datetime.datetime.combine(tomorrow_end.date(), datetime.time(0, 0, 0))
+        )
+
+        local = await self.get_baseline(tomorrow_start, tomorrow_end)
+        remote = await self.app.clients.hab.get_simulated_price_baseline(
+            tomorrow_start, tomorrow_end)
+
+        if local is None or remote is None:
+            return
+
+        self.app.log.debug(
+            'Local price baseline for tomorrow: q50 {local_q50:.5f}, stddev {local_stddev:.5f}; '
+            'remote: q50 {remote_q50:.5f}, stddev {remote_stddev:.5f}.',
+            local_q50=local.q50, local_stddev=local.stddev,
+            remote_q50=remote.q50, remote_stddev=remote.stddev)
+
+    def __scheduled_jobs(self):
+        self.app.scheduler.add_job(self.update, 'cron', minute='5')
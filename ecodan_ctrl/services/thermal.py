@@ -0,0 +1,102 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import asyncio
+import datetime
+
+import numpy as np
+import pytz
+
+from db.models.measurement import Measurement
+from util.thermal import ThermalModel
+
+
+class ThermalService:
+    def __init__(self, app):
+        self.app = app
+
+        self.configure(self.app.config)
+
+        self.step = 900
+
+        self.model = None
+        self.fitted_at = None
+
+        self.__scheduled_jobs()
+
+    def configure(self, config):
+        self.history_period = datetime.timedelta(
+            days=config['HEATING_MODEL_HISTORY_DAYS'])
+
+    @staticmethod
+    def to_array(measurements):
+        return (
+            np.array([m.timestamp.timestamp() for m in measurements], dtype=float),
+            np.array([m.value for m in measurements], dtype=float),
+        )
+
+    async def fit(self):
+        now = datetime.datetime.now(tz=pytz.timezone('Europe/Brussels'))
+        start = now - self.history_period
+
+        self.app.log.debug('Fitting thermal model of the house.')
+
+        inside, outside, setpoint = await asyncio.gather(
+            Measurement.get_arrays('house_temp', start, now),
+            Measurement.get_arrays('outside_temp', start, now),
+            Measurement.get_arrays('heating_setpoint', start, now),
+        )
+
+        model = ThermalModel.fit(inside, outside, setpoint, step=self.step)
+
+        if model is None:
+            self.app.log.debug(
+                'Not enough usable history to fit thermal model, keeping previous model.')
+            return
+
+        self.app.log.debug(
+            'Fitted thermal model: a={a:.5f}, b={b:.5f}, c={c:.5f}, rmse={rmse:.3f}.',
+            a=model.a, b=model.b, c=model.c, rmse=model.rmse)
+
+        self.model = model
+        self.fitted_at = now
+
+    async def get_model(self):
+        if self.model is None:
+            await self.fit()
+        return self.model
+
+    def get_grid(self, start, end):
+        return np.arange(start.timestamp(), end.timestamp(), self.step)
+
+    def get_trajectory(self, grid, setpoints, initial):
+        """
+        Build the setpoint trajectory on the model grid from a list of
+        setpoints, each setpoint holding until the next one.
+        """
+        if len(setpoints) == 0:
+            return np.full(len(grid), initial, dtype=float)
+
+        setpoints = sorted(setpoints, key=lambda sp: sp.timestamp)
+        timestamps = np.array([sp.timestamp.timestamp() for sp in setpoints])
+        values = np.array([sp.setpoint for sp in setpoints], dtype=float)
+
+        idx = np.searchsorted(timestamps, grid, side='right') - 1
+        return np.where(idx >= 0, values[np.maximum(idx, 0)], initial)
+
+    def __scheduled_jobs(self):
+        self.app.scheduler.add_job(self.fit, 'cron', hour='3', minute='30')
@@ -0,0 +1,112 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Run local stand-ins for the HAB, Madame Soleil and Ecodan APIs.
+
+All three share one physics model of the house, so setpoints sent to the
+Ecodan stand-in show up in the state reported by HAB. With `--installations`
+every installation gets its own model, served under its index, e.g.
+`http://localhost:8101/3/heatpump/status`::
+
+    python -m standin --latency-ms 50 --error-rate 0.01
+
+Point the controller at them with::
+
+    HAB_API_BASE_URL=http://localhost:8101
+    MME_SOLEIL_BASE_URL=http://localhost:8102
+    ECODAN_API_BASE_URL=http://localhost:8103
+"""
+
+import argparse
+import asyncio
+import signal
+import sys
+
+from hypercorn.asyncio import serve
+from hypercorn.config import Config as HypercornConfig
+
+from standin.plant import Plant
+from standin.servers import Faults, create_ecodan_app, create_hab_app, create_mme_soleil_app
+
+
+async def run(apps, host):
+    # one trigger for all servers, hypercorn would otherwise only stop the last one
+    shutdown = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, shutdown.set)
+
+    servers = []
+    for app, port in apps:
+        config = HypercornConfig()
+        config.bind = [f'{host}:{port}']
+        config.accesslog = None
+        servers.append(serve(app, config, shutdown_trigger=shutdown.wait))
+
+    await asyncio.gather(*servers)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve stand-ins for the HAB, Madame Soleil and Ecodan APIs.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to bind, default 127.0.0.1')
+    parser.add_argument('--hab-port', type=int, default=8101, help='default 8101')
+    parser.add_argument('--mme-soleil-port', type=int, default=8102, help='default 8102')
+    parser.add_argument('--ecodan-port', type=int, default=8103, help='default 8103')
+    parser.add_argument('--latency-ms', type=float, default=0,
+                        help='latency added to every response, default 0')
+    parser.add_argument('--jitter-ms', type=float, default=0,
+                        help='maximum random latency on top, default 0')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests failing with a 500 error, default 0')
+    parser.add_argument('--timeout-rate', type=float, default=0,
+                        help='fraction of requests stalling for --timeout-s, default 0')
+    parser.add_argument('--timeout-s', type=float, default=60,
+                        help='how long stalled requests take, default 60')
+    parser.add_argument('--installations', type=int, default=1,
+                        help='number of independent installations, default 1')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the weather and the injected faults, default 0')
+    parser.add_argument('--outside-mean', type=float, default=8.0,
+                        help='mean outside temperature, default 8')
+    parser.add_argument('--dhw-setpoint', type=float, default=20,
+                        help='initial DHW setpoint, match DHW_TEMP_OFF to start idle, default 20')
+    parser.add_argument('--peak-production-w', type=float, default=6000,
+                        help='clear sky peak solar production in W, default 6000')
+    args = parser.parse_args()
+
+    plants = [
+        Plant(seed=args.seed + i, outside_mean=args.outside_mean,
+              peak_production_w=args.peak_production_w, dhw_setpoint=args.dhw_setpoint)
+        for i in range(args.installations)
+    ]
+    faults = Faults(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    error_rate=args.error_rate, timeout_rate=args.timeout_rate,
+                    timeout_s=args.timeout_s, seed=args.seed)
+
+    apps = [
+        (create_hab_app(plants, faults), args.hab_port),
+        (create_mme_soleil_app(plants, faults), args.mme_soleil_port),
+        (create_ecodan_app(plants, faults), args.ecodan_port),
+    ]
+
+    asyncio.run(run(apps, args.host))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import deque
+import datetime
+import math
+import random
+
+import numpy as np
+import pytz
+
+
+class Plant:
+    """
+    Simple physics model of the house, the DHW tank, the heat pump and the
+    solar installation, advanced in real time.
+
+    The house is a single thermal capacity losing heat to the outside, the
+    tank loses heat to its surroundings and to scheduled hot water draws. The
+    heat pump runs DHW with priority, and heats the house while it is below
+    the heating setpoint. Weather is a daily sine for the outside temperature
+    and a clear sky curve scaled by a cloud factor drawn per day.
+
+    Parameters
+    ----------
+    seed : int, optional
+        Seed for the weather and the noise on the household consumption.
+    """
+
+    timezone = pytz.timezone('Europe/Brussels')
+
+    def __init__(self, seed=0, outside_mean=8.0, outside_amplitude=5.0, peak_production_w=6000.0,
+                 heat_capacity_kwh=10.0, heat_loss_kw=0.2, heat_power_kw=6.0,
+                 tank_capacity_kwh=0.35, tank_loss_kw=0.002, dhw_power_kw=4.0,
+                 dhw_hysteresis=5.0, dhw_setpoint=20.0, base_load_w=300.0):
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        self.outside_mean = outside_mean
+        self.outside_amplitude = outside_amplitude
+        self.peak_production_w = peak_production_w
+
+        self.heat_capacity_kwh = heat_capacity_kwh
+        self.heat_loss_kw = heat_loss_kw
+        self.heat_power_kw = heat_power_kw
+
+        self.tank_capacity_kwh = tank_capacity_kwh
+        self.tank_loss_kw = tank_loss_kw
+        self.dhw_power_kw = dhw_power_kw
+        self.dhw_hysteresis = dhw_hysteresis
+
+        self.base_load_w = base_load_w
+
+        now = datetime.datetime.now(tz=self.timezone)
+        self.timestamp = now
+
+        self.house_temp = 20.0
+        self.tank_temp = 45.0
+        self.heating_setpoint = 20.0
+        self.dhw_setpoint = dhw_setpoint
+
+        self.operating_mode = 'Stop'
+        self.heat_source = 'Heatpump'
+        self.dhw_running = False
+
+        self.last_legionella = now - datetime.timedelta(days=5)
+        self.production_today = 0.0
+
+        self.house_history = deque()
+
+    def get_cloud_factor(self, day):
+        return random.Random(f'{self.seed}-{day.isoformat()}').uniform(0.2, 1.0)
+
+    def get_outside_temp(self, timestamp):
+        hours = timestamp.hour + timestamp.minute / 60
+        return self.outside_mean + self.outside_amplitude * math.sin(2 * math.pi * (hours - 9) / 24)
+
+    def get_clearsky_production(self, timestamp):
+        hours = timestamp.hour + timestamp.minute / 60
+        return self.peak_production_w * max(math.sin(math.pi * (hours - 7) / 12), 0)
+
+    def get_production(self, timestamp):
+        return self.get_clearsky_production(timestamp) * self.get_cloud_factor(timestamp.date())
+
+    def get_cop(self, outside_temp, flow_temp):
+        return min(max(0.45 * (flow_temp + 273.15) / max(flow_temp - outside_temp, 5), 1.5), 6)
+
+    def get_heatpump_power(self):
+        """
+        Electrical power of the heat pump in W.
+        """
+        outside = self.get_outside_temp(self.timestamp)
+        if self.dhw_running:
+            return self.dhw_power_kw * 1000 / self.get_cop(outside, self.tank_temp + 5)
+        if self.operating_mode == 'Heating' and self.heat_source == 'Heatpump':
+            return self.heat_power_kw * 1000 / self.get_cop(outside, 35)
+        return 0.0
+
+    def get_consumption(self, timestamp):
+        hours = timestamp.hour + timestamp.minute / 60
+        evening = 400 * math.exp(-((hours - 19) ** 2) / 2)
+        return self.base_load_w + evening + self.random.uniform(-50, 50)
+
+    def get_net_power(self):
+        return self.get_consumption(self.timestamp) + self.get_heatpump_power() \
+            - self.get_production(self.timestamp)
+
+    def get_dhw_draw_kw(self, timestamp):
+        # showers in the morning and the evening
+        hours = timestamp.hour + timestamp.minute / 60
+        return 6 * (math.exp(-((hours - 7) ** 2) * 8) + math.exp(-((hours - 21) ** 2) * 8))
+
+    def step(self, timestamp, dt):
+        hours = dt / 3600
+        outside = self.get_outside_temp(timestamp)
+
+        self.dhw_running = (
+            self.tank_temp < self.dhw_setpoint
+            and (self.dhw_running or self.tank_temp < self.dhw_setpoint - self.dhw_hysteresis)
+        )
+
+        if self.dhw_running:
+            self.operating_mode = 'Hot water'
+            self.heat_source = 'Heatpump'
+            if self.dhw_setpoint >= 60 and self.tank_temp < 55:
+                self.last_legionella = timestamp
+        elif self.house_temp < self.heating_setpoint - 0.2:
+            self.operating_mode = 'Heating'
+            self.heat_source = 'Heatpump'
+        elif self.house_temp < self.heating_setpoint + 0.5:
+            self.operating_mode = 'Heating'
+            self.heat_source = 'Heatpump pause'
+        else:
+            self.operating_mode = 'Stop'
+            self.heat_source = 'Heatpump'
+
+        heating_kw = self.heat_power_kw if (
+            self.operating_mode == 'Heating' and self.heat_source == 'Heatpump') else 0
+        self.house_temp += hours * (
+            heating_kw - self.heat_loss_kw * (self.house_temp - outside)) / self.heat_capacity_kwh
+
+        dhw_kw = self.dhw_power_kw if self.dhw_running else 0
+        self.tank_temp += hours * (
+            dhw_kw - self.get_dhw_draw_kw(timestamp)
+            - self.tank_loss_kw * (self.tank_temp - 20)) / self.tank_capacity_kwh
+        self.tank_temp = max(self.tank_temp, 12)
+
+        if timestamp.date() != self.timestamp.date():
+            self.production_today = 0.0
+        self.production_today += self.get_production(timestamp) / 1000 * hours
+
+    def advance(self, now=None):
+        """
+        Advance the model up to `now`, in steps of at most a minute.
+        """
+        now = now or datetime.datetime.now(tz=self.timezone)
+
+        while self.timestamp < now:
+            dt = min((now - self.timestamp).total_seconds(), 60)
+            timestamp = self.timestamp + datetime.timedelta(seconds=dt)
+            self.step(timestamp, dt)
+            self.timestamp = timestamp
+            self.house_history.append((timestamp.timestamp(), self.house_temp))
+
+        cutoff = (now - datetime.timedelta(days=2)).timestamp()
+        while len(self.house_history) > 0 and self.house_history[0][0] < cutoff:
+            self.house_history.popleft()
+
+    def get_house_stats(self, start, end):
+        values = [v for t, v in self.house_history if start.timestamp() <= t <= end.timestamp()]
+        if len(values) == 0:
+            values = [self.house_temp]
+        return np.array(values)
+
+    def get_forecast(self, start, end, step=900):
+        """
+        Production and temperature forecast, as the clear sky curve scaled
+        by the cloud factor of each day.
+        """
+        timestamps = np.arange(start.timestamp(), end.timestamp(), step)
+        slots = [datetime.datetime.fromtimestamp(t, tz=self.timezone) for t in timestamps]
+
+        production = np.array([self.get_production(s) for s in slots])
+        clearsky = np.array([self.get_clearsky_production(s) for s in slots])
+        temperature = np.array([self.get_outside_temp(s) for s in slots])
+
+        return slots, production, clearsky, temperature
+
+    def get_price(self, timestamp):
+        """
+        Dynamic price in EUR/kWh, cheaper around noon and at night.
+        """
+        hours = timestamp.hour + timestamp.minute / 60
+        return round(0.22 + 0.08 * math.sin(2 * math.pi * (hours - 12) / 24)
+                     - 0.06 * math.exp(-((hours - 13) ** 2) / 8), 5)
@@ -0,0 +1,266 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import datetime
+import random
+
+import numpy as np
+from quart import Blueprint, Quart, abort, g, request
+
+from util.forecast import ProductionForecast
+
+
+class Faults:
+    """
+    Latency, error and timeout injection for the stand-in servers.
+
+    Parameters
+    ----------
+    latency_ms : float, optional
+        Latency added to every response.
+    jitter_ms : float, optional
+        Maximum random latency added on top of `latency_ms`.
+    error_rate : float, optional
+        Fraction of requests answered with a 500 error.
+    timeout_rate : float, optional
+        Fraction of requests stalled for `timeout_s` before answering.
+    timeout_s : float, optional
+        How long stalled requests take, longer than the client timeouts.
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0, timeout_rate=0, timeout_s=60, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_s
+        self.random = random.Random(seed)
+
+    async def before_request(self):
+        delay = (self.latency_ms + self.random.uniform(0, self.jitter_ms)) / 1000
+        if self.random.random() < self.timeout_rate:
+            delay = self.timeout_s
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.random.random() < self.error_rate:
+            return {'error': 'injected failure'}, 500
+
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value)
+
+
+def time_data(timestamp, value, unit):
+    return {'timestamp': timestamp.isoformat(), 'value': float(value), 'unit': unit}
+
+
+def period_stats(start, end, unit, values, total=None):
+    q25, q50, q75 = np.quantile(values, (0.25, 0.5, 0.75))
+    stats = {
+        'start': start.isoformat(), 'end': end.isoformat(), 'unit': unit,
+        'q25': float(q25), 'q50': float(q50), 'q75': float(q75), 'stddev': float(np.std(values)),
+    }
+    if total is not None:
+        stats['sum'] = float(total)
+    return stats
+
+
+def create_app(name, plants, faults, blueprint):
+    """
+    Serve `blueprint` for the first installation at the root, and for every
+    installation under its index, e.g. `/3/heatpump/status`.
+    """
+    app = Quart(name)
+
+    @app.url_value_preprocessor
+    def pull_installation(endpoint, values):
+        installation = values.pop('installation', 0) if values else 0
+        if installation >= len(plants):
+            abort(404)
+        g.plant = plants[installation]
+
+    @app.before_request
+    async def before_request():
+        g.plant.advance()
+        return await faults.before_request()
+
+    app.register_blueprint(blueprint)
+    app.register_blueprint(blueprint, url_prefix='/<int:installation>', name=f'{name}_installation')
+
+    return app
+
+
+def create_hab_app(plants, faults):
+    bp = Blueprint('hab', __name__)
+
+    def simulate(data):
+        # constant load between the given points, priced per quarter
+        start, end = parse_time(data[0]['timestamp']), parse_time(data[-1]['timestamp'])
+        power_kw = data[0]['net_power'] / 1000
+        slots = [start + datetime.timedelta(minutes=15 * i)
+                 for i in range(int((end - start).total_seconds() // 900) + 1)]
+        return [(s, g.plant.get_price(s) * power_kw / 4) for s in slots]
+
+    @bp.get('/heatpump/status')
+    async def heatpump_status():
+        return {
+            'operating_mode': g.plant.operating_mode,
+            'heat_source': g.plant.heat_source,
+            'defrost_status': 'Normal',
+        }
+
+    @bp.get('/heatpump/setpoint')
+    async def heatpump_setpoint():
+        return {'dhw': g.plant.dhw_setpoint, 'heating': g.plant.heating_setpoint}
+
+    @bp.get('/legionella/last')
+    async def legionella_last():
+        return time_data(g.plant.last_legionella, 1, '')
+
+    @bp.get('/dhw/temp')
+    async def dhw_temp():
+        return time_data(g.plant.timestamp, round(g.plant.tank_temp, 1), '°C')
+
+    @bp.get('/outside/temp')
+    async def outside_temp():
+        return time_data(g.plant.timestamp, round(g.plant.get_outside_temp(g.plant.timestamp), 1), '°C')
+
+    @bp.get('/consumption/baseline')
+    async def consumption_baseline():
+        now = g.plant.timestamp
+        values = [g.plant.base_load_w + g.plant.random.uniform(-50, 50) for _ in range(96)]
+        return period_stats(now - datetime.timedelta(days=7), now, 'W', values)
+
+    @bp.get('/consumption/current')
+    async def consumption_current():
+        return time_data(g.plant.timestamp, g.plant.get_consumption(g.plant.timestamp), 'W')
+
+    @bp.get('/power/net/current')
+    async def net_power_current():
+        return time_data(g.plant.timestamp, g.plant.get_net_power(), 'W')
+
+    @bp.get('/production/daily')
+    async def production_daily():
+        return time_data(g.plant.timestamp, g.plant.production_today, 'kWh')
+
+    @bp.get('/house/temp')
+    async def house_temp():
+        end = parse_time(request.args['end']) if 'end' in request.args else g.plant.timestamp
+        start = parse_time(request.args['start']) if 'start' in request.args \
+            else end - datetime.timedelta(minutes=15)
+        return period_stats(start, end, '°C', g.plant.get_house_stats(start, end))
+
+    @bp.get('/price/series')
+    async def price_series():
+        start, end = parse_time(request.args['start']), parse_time(request.args['end'])
+        start = start.replace(minute=start.minute - start.minute % 15, second=0, microsecond=0)
+        slots = [start + datetime.timedelta(minutes=15 * i)
+                 for i in range(int((end - start).total_seconds() // 900) + 1)]
+        return [time_data(s, g.plant.get_price(s), 'EUR/kWh') for s in slots]
+
+    @bp.post('/price/simulate/total')
+    async def price_simulate_total():
+        data = (await request.get_json())['data']
+        costs = simulate(data)
+        values = [c for _, c in costs]
+        return period_stats(costs[0][0], costs[-1][0], 'EUR', values, total=sum(values))
+
+    @bp.post('/price/simulate/total/detail')
+    async def price_simulate_detail():
+        data = (await request.get_json())['data']
+        return [time_data(s, c, 'EUR') for s, c in simulate(data)]
+
+    return create_app('hab', plants, faults, bp)
+
+
+def create_mme_soleil_app(plants, faults):
+    bp = Blueprint('mme_soleil', __name__)
+
+    def forecast_range():
+        return parse_time(request.args['start']), parse_time(request.args['end'])
+
+    @bp.get('/production/forecast')
+    async def production_forecast():
+        slots, production, _, _ = g.plant.get_forecast(*forecast_range())
+        return [time_data(s, p, 'W') for s, p in zip(slots, production)]
+
+    @bp.get('/temperature/forecast')
+    async def temperature_forecast():
+        slots, _, _, temperature = g.plant.get_forecast(*forecast_range(), step=3600)
+        return [time_data(s, t, '°C') for s, t in zip(slots, temperature)]
+
+    @bp.get('/production/peak')
+    async def production_peak():
+        start, end = forecast_range()
+        duration = float(request.args['peak_duration_h'])
+        slots, production, _, temperature = g.plant.get_forecast(
+            start, end + datetime.timedelta(hours=duration))
+        forecast = ProductionForecast([s.timestamp() for s in slots], production, temperature)
+        timestamp = forecast.get_peak_production(
+            start, end, float(request.args['min_kwh']), duration, request.args['order'],
+            min_temp=float(request.args.get('min_temp', 6)))
+        return {'result': (timestamp or start).isoformat()}
+
+    @bp.get('/production/bounds')
+    async def production_bounds():
+        day = datetime.date.fromisoformat(request.args['date'])
+        start = g.plant.timezone.localize(datetime.datetime.combine(day, datetime.time(0, 0, 0)))
+        slots, production, _, _ = g.plant.get_forecast(start, start + datetime.timedelta(days=1))
+        producing = np.flatnonzero(production > float(request.args.get('min_kW', 0)) * 1000)
+        if len(producing) == 0:
+            return {'start': None, 'end': None}
+        return {'start': slots[producing[0]].isoformat(), 'end': slots[producing[-1]].isoformat()}
+
+    @bp.get('/temperature/stats')
+    async def temperature_stats():
+        start, end = forecast_range()
+        _, _, _, temperature = g.plant.get_forecast(start, max(end, start + datetime.timedelta(hours=1)))
+        return period_stats(start, end, '°C', temperature)
+
+    @bp.get('/production/weather')
+    async def production_weather():
+        _, production, clearsky, _ = g.plant.get_forecast(*forecast_range())
+        weather, clear = production.sum() / 4000, clearsky.sum() / 4000
+        return {'weather_data': weather, 'clearsky': clear, 'ratio': weather / clear if clear > 0 else 0}
+
+    @bp.get('/production/daily')
+    async def production_daily():
+        end = g.plant.timezone.localize(
+            datetime.datetime.strptime(request.args['end'], '%Y%m%dT%H:%M:%S'))
+        start = end.replace(hour=0, minute=0, second=0)
+        _, production, _, _ = g.plant.get_forecast(start, max(end, start + datetime.timedelta(minutes=15)))
+        return time_data(end, production.sum() / 4000, 'kWh')
+
+    return create_app('mme_soleil', plants, faults, bp)
+
+
+def create_ecodan_app(plants, faults):
+    bp = Blueprint('ecodan', __name__)
+
+    @bp.put('/tank/target_temp')
+    async def tank_target_temp():
+        g.plant.dhw_setpoint = float((await request.get_json())['value'])
+        return {'value': g.plant.dhw_setpoint}
+
+    @bp.put('/house/target_temp')
+    async def house_target_temp():
+        g.plant.heating_setpoint = float((await request.get_json())['value'])
+        return {'value': g.plant.heating_setpoint}
+
+    return create_app('ecodan', plants, faults, bp)
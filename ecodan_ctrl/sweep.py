@@ -0,0 +1,201 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Sweep settings over the recorded history.
+
+Every combination of the given values is simulated over the history window,
+spread over a pool of processes, and ranked::
+
+    python sweep.py --days 14 \
+        --param HEATING_FADE_STEPS=2,4,6 \
+        --param DHW_TEMP_DROP=5,8
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import itertools
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytz
+
+from config import Config
+from db.base import Database
+from db.models.measurement import Measurement
+from db.models.price import Price
+from services.simulation import SimulationInput, init_worker, run_simulation
+from services.thermal import ThermalService
+from util.settings import apply_overrides
+from util.tank import TankModel
+from util.thermal import ThermalModel
+
+
+async def load_inputs(config, start, end, step):
+    Database(SimpleNamespace(config=config))
+
+    outside, net_power, house_temp, setpoint, dhw_temp, dhw_setpoint, prices = await asyncio.gather(
+        Measurement.get_series('outside_temp', start, end),
+        Measurement.get_series('net_power', start, end),
+        Measurement.get_series('house_temp', start, end),
+        Measurement.get_series('heating_setpoint', start, end),
+        Measurement.get_series('dhw_temp', start, end),
+        Measurement.get_series('dhw_setpoint', start, end),
+        Price.get_series(start, end),
+    )
+
+    for name, series in (('outside_temp', outside), ('net_power', net_power),
+                         ('house_temp', house_temp), ('dhw_temp', dhw_temp)):
+        if len(series) == 0:
+            raise ValueError(f'No {name} history between {start} and {end}.')
+
+    thermal_model = ThermalModel.fit(
+        ThermalService.to_array(house_temp),
+        ThermalService.to_array(outside),
+        ThermalService.to_array(setpoint),
+        step=step
+    )
+    if thermal_model is None:
+        raise ValueError('Not enough history to fit the thermal model.')
+
+    setpoints = {m.timestamp: m.value for m in dhw_setpoint}
+    tank_model = TankModel(config['DHW_MODEL_AMBIENT_TEMP'])
+    tank_model.fit(
+        [m.timestamp for m in dhw_temp],
+        [m.value for m in dhw_temp],
+        [setpoints.get(m.timestamp, config['DHW_TEMP_OFF']) > config['DHW_TEMP_OFF']
+         for m in dhw_temp]
+    )
+    if tank_model.get_coefficients() is None:
+        raise ValueError('Not enough history to fit the DHW tank model.')
+
+    grid = np.arange(start.timestamp(), end.timestamp(), step)
+
+    outside_values, _ = ThermalModel.resample(
+        *ThermalService.to_array(outside), grid, max_gap=np.inf)
+    net_power_values, valid = ThermalModel.resample(
+        *ThermalService.to_array(net_power), grid, max_gap=3600)
+
+    price_values = np.full(len(grid), np.nan)
+    if len(prices) > 0:
+        price_timestamps, values = ThermalService.to_array(prices)
+        idx = np.searchsorted(price_timestamps, grid, side='right') - 1
+        current = (idx >= 0) & (grid - price_timestamps[np.maximum(idx, 0)] < 900)
+        price_values[current] = values[idx[current]]
+
+    inputs = SimulationInput(
+        timestamps=grid,
+        outside=outside_values,
+        net_power=np.where(valid, net_power_values, 0),
+        price=price_values,
+        house_temp=house_temp[0].value,
+        dhw_temp=dhw_temp[0].value,
+        thermal_model=thermal_model,
+        tank_model=tank_model,
+        step=step
+    )
+
+    return inputs, prices[0].unit if len(prices) > 0 else ''
+
+
+def parse_param(value):
+    name, sep, values = value.partition('=')
+    if not sep or not values:
+        raise argparse.ArgumentTypeError(f'expected NAME=value,value,..., got {value}')
+    return name, values.split(',')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rank settings by simulating them over the recorded history.')
+    parser.add_argument('--param', type=parse_param, action='append', required=True,
+                        metavar='NAME=V1,V2,...', help='setting and values to sweep')
+    parser.add_argument('--days', type=int, default=14,
+                        help='days of history to simulate, default 14')
+    parser.add_argument('--end', type=datetime.date.fromisoformat, default=None,
+                        help='last day of history to simulate, default yesterday')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of processes, default one per cpu')
+    parser.add_argument('--heat-capacity', type=float, default=10.0,
+                        help='heat capacity of the house in kWh/K, default 10')
+    parser.add_argument('--cop', type=float, default=3.5,
+                        help='coefficient of performance of the heat pump, default 3.5')
+    parser.add_argument('--sort', choices=['cost', 'self_consumption', 'comfort_hours'],
+                        default='cost', help='column to rank by, default cost')
+    parser.add_argument('--top', type=int, default=20,
+                        help='number of results to show, default 20')
+    args = parser.parse_args()
+
+    config = {k: getattr(Config, k) for k in dir(Config) if k.isupper()}
+
+    names = [name for name, _ in args.param]
+    grid = [dict(zip(names, values)) for values in itertools.product(
+        *[values for _, values in args.param])]
+
+    try:
+        for overrides in grid:
+            apply_overrides(config, overrides)
+    except ValueError as e:
+        parser.error(str(e))
+
+    end_day = args.end or datetime.date.today() - datetime.timedelta(days=1)
+    # one extra day, the planner looks ahead to tomorrow
+    end = pytz.timezone('Europe/Brussels').localize(
+        datetime.datetime.combine(end_day + datetime.timedelta(days=2), datetime.time(0, 0, 0)))
+    start = end - datetime.timedelta(days=args.days + 1)
+
+    try:
+        inputs, unit = asyncio.run(load_inputs(config, start, end, step=900))
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    options = {
+        'comfort_day': config['HEATING_TEMP_DAY'] - config['HEATING_MODEL_COMFORT_MARGIN'],
+        'comfort_night': config['HEATING_TEMP_NIGHT'] - config['HEATING_MODEL_COMFORT_MARGIN'],
+        'heat_capacity': args.heat_capacity,
+        'cop': args.cop,
+    }
+
+    print(f'Simulating {len(grid)} combinations from {start.date()} until {end_day} '
+          f'on {args.workers} workers.', file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(inputs, config, options)) as executor:
+        results = list(executor.map(run_simulation, grid))
+
+    results.sort(key=lambda r: r[1][args.sort], reverse=args.sort == 'self_consumption')
+
+    print(f'{"rank":>4}  {"cost":>10}  {"energy kWh":>10}  {"self-cons.":>10}  '
+          f'{"comfort h":>9}  {"dhw":>4}  settings')
+    for rank, (overrides, result) in enumerate(results[:args.top], start=1):
+        settings = ' '.join(f'{k}={v}' for k, v in overrides.items())
+        print(f'{rank:>4}  {result["cost"]:>10.2f}  {result["energy_kwh"]:>10.1f}  '
+              f'{result["self_consumption"]:>10.1%}  {result["comfort_hours"]:>9.1f}  '
+              f'{result["dhw_cycles"]:>4}  {settings}')
+
+    if unit:
+        print(f'Costs in {unit.split("/")[0]}.', file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
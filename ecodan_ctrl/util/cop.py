@@ -0,0 +1,129 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from util.thermal import ThermalModel
+
+
+class CopModel:
+    """
+    Coefficient of performance of the heat pump while heating the DHW tank.
+
+    The COP is modelled as linear in the outside temperature and the sink
+    temperature, the tank temperature standing in for the flow temperature::
+
+        cop = a + b * T_out + c * T_sink
+
+    It is fitted on the heat stored in the tank against the electrical power
+    drawn above the household base load, and cached on a grid of whole
+    degrees so lookups take constant time.
+    """
+
+    OUTSIDE_TEMPS = np.arange(-25, 41)
+    SINK_TEMPS = np.arange(10, 76)
+    COP_RANGE = (1.0, 8.0)
+
+    def __init__(self, a, b, c, rmse=None, samples=None):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.rmse = rmse
+        self.samples = samples
+
+        self.table = np.clip(
+            a + b * self.OUTSIDE_TEMPS[:, None] + c * self.SINK_TEMPS[None, :],
+            *self.COP_RANGE)
+
+    @staticmethod
+    def fit(dhw_temp, dhw_setpoint, outside, consumption, base_load_w, heat_capacity,
+            dhw_temp_off, step=300, min_samples=24):
+        """
+        Fit the model with linear least squares.
+
+        Parameters
+        ----------
+        dhw_temp, dhw_setpoint, outside, consumption : tuple of numpy.ndarray
+            Pairs of (epoch seconds, values) for the tank temperature, the DHW
+            setpoint, the outside temperature and the household consumption
+            in W.
+        base_load_w : float
+            Household consumption without the heat pump.
+        heat_capacity : float
+            Heat capacity of the tank in kWh/K.
+        dhw_temp_off : float
+            DHW setpoint while the tank is not being heated.
+        step : int
+            Step size in seconds the series are resampled to.
+        min_samples : int
+            Minimum number of heating steps needed for a fit.
+
+        Returns
+        -------
+        CopModel or None
+            The fitted model, or None if there is not enough data.
+        """
+        series = (dhw_temp, dhw_setpoint, outside, consumption)
+        if any(len(s[0]) < 2 for s in series):
+            return None
+
+        start = max(s[0][0] for s in series)
+        end = min(s[0][-1] for s in series)
+        grid = np.arange(start, end, step)
+
+        if len(grid) < min_samples + 1:
+            return None
+
+        t_dhw, valid_dhw = ThermalModel.resample(*dhw_temp, grid, step)
+        t_out, valid_out = ThermalModel.resample(*outside, grid, 4 * step)
+        power, valid_power = ThermalModel.resample(*consumption, grid, step)
+
+        # the setpoint holds until the next one
+        idx = np.searchsorted(dhw_setpoint[0], grid, side='right') - 1
+        heating = (idx >= 0) & (dhw_setpoint[1][np.maximum(idx, 0)] > dhw_temp_off)
+
+        valid = valid_dhw & valid_out & valid_power & heating
+        valid = valid[:-1] & valid[1:]
+
+        heat = heat_capacity * (t_dhw[1:] - t_dhw[:-1])
+        electric = np.maximum((power[1:] + power[:-1]) / 2 - base_load_w, 0) / 1000 * (step / 3600)
+        valid &= (heat > 0) & (electric > 0)
+
+        if valid.sum() < min_samples:
+            return None
+
+        t_sink = ((t_dhw[1:] + t_dhw[:-1]) / 2)[valid]
+        t_outside = ((t_out[1:] + t_out[:-1]) / 2)[valid]
+        electric = electric[valid]
+
+        features = electric[:, None] * np.column_stack(
+            (np.ones(valid.sum()), t_outside, t_sink))
+
+        (a, b, c), *_ = np.linalg.lstsq(features, heat[valid], rcond=None)
+
+        rmse = float(np.sqrt(np.mean((features @ (a, b, c) - heat[valid]) ** 2)))
+        return CopModel(float(a), float(b), float(c), rmse, int(valid.sum()))
+
+    def get_cop(self, outside_temp, sink_temp):
+        """
+        Look up the COP, element-wise for arrays.
+        """
+        i = np.clip(np.rint(outside_temp).astype(int) - self.OUTSIDE_TEMPS[0],
+                    0, len(self.OUTSIDE_TEMPS) - 1)
+        j = np.clip(np.rint(sink_temp).astype(int) - self.SINK_TEMPS[0],
+                    0, len(self.SINK_TEMPS) - 1)
+        return self.table[i, j]
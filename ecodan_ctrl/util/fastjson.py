@@ -0,0 +1,128 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+
+import numpy as np
+from quart.json.provider import DefaultJSONProvider
+
+BACKENDS = ('orjson', 'msgspec', 'json')
+
+
+class JsonBackend:
+    """
+    JSON encoder and decoder using the fastest available library.
+
+    The backend is orjson or msgspec when installed, the standard library
+    otherwise. `dumps` always returns bytes. msgspec encodes datetimes as
+    RFC 3339 itself, the other backends leave them to `default`. Numpy
+    scalars are encoded as their Python counterparts by every backend.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.name = self.app.config['JSON_BACKEND']
+
+        if self.name not in ('auto',) + BACKENDS:
+            raise ValueError(
+                f'Invalid JSON_BACKEND {self.name}, expected one of auto, {", ".join(BACKENDS)}.')
+
+        if self.name == 'auto':
+            self.name = next(b for b in BACKENDS if self.is_available(b))
+        elif not self.is_available(self.name):
+            self.app.log.warning(
+                'JSON backend {name} requested but not installed, using json.', name=self.name)
+            self.name = 'json'
+
+        if self.name == 'orjson':
+            import orjson
+            self.orjson = orjson
+        elif self.name == 'msgspec':
+            import msgspec
+            self.decoder = msgspec.json.Decoder()
+            self.encoders = {}
+            self.msgspec = msgspec
+
+    @staticmethod
+    def is_available(name):
+        if name == 'json':
+            return True
+
+        try:
+            __import__(name)
+        except ImportError:
+            return False
+        return True
+
+    def loads(self, data):
+        if self.name == 'orjson':
+            return self.orjson.loads(data)
+        elif self.name == 'msgspec':
+            return self.decoder.decode(data)
+        return json.loads(data)
+
+    @staticmethod
+    def with_numpy(default):
+        def encode(obj):
+            if isinstance(obj, np.generic):
+                return obj.item()
+            if default is None:
+                raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+            return default(obj)
+
+        return encode
+
+    def dumps(self, obj, default=None, sort_keys=False):
+        if self.name == 'orjson':
+            # leave datetimes and dataclasses to `default`, like the json module does
+            option = self.orjson.OPT_PASSTHROUGH_DATETIME | self.orjson.OPT_PASSTHROUGH_DATACLASS \
+                | self.orjson.OPT_SERIALIZE_NUMPY
+            if sort_keys:
+                option |= self.orjson.OPT_SORT_KEYS
+            return self.orjson.dumps(obj, default=self.with_numpy(default), option=option)
+        elif self.name == 'msgspec':
+            encoder = self.encoders.get((default, sort_keys))
+            if encoder is None:
+                encoder = self.encoders[(default, sort_keys)] = self.msgspec.json.Encoder(
+                    enc_hook=self.with_numpy(default), order='sorted' if sort_keys else None)
+            return encoder.encode(obj)
+        return json.dumps(
+            obj, default=self.with_numpy(default), sort_keys=sort_keys,
+            separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Quart JSON provider serializing responses with the configured backend.
+
+    Pretty printed output, as used in debug mode, is left to the standard
+    library.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.backend = JsonBackend(app)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get('indent') is not None:
+            return super().dumps(obj, **kwargs)
+        return self.backend.dumps(
+            obj, default=kwargs.get('default', self.default),
+            sort_keys=kwargs.get('sort_keys', self.sort_keys)).decode()
+
+    def loads(self, s, **kwargs):
+        return self.backend.loads(s)
@@ -0,0 +1,161 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import datetime
+
+import numpy as np
+import pytz
+
+
+class ProductionForecast:
+    """
+    Solar production and temperature forecast on a regular time grid.
+
+    Parameters
+    ----------
+    timestamps : numpy.ndarray
+        Epoch seconds of the start of each slot, ascending and evenly spaced.
+    production : numpy.ndarray
+        Average production in W during each slot.
+    temperature : numpy.ndarray, optional
+        Forecast outside temperature during each slot.
+    """
+
+    def __init__(self, timestamps, production, temperature=None):
+        self.timestamps = np.asarray(timestamps, dtype=float)
+        self.production = np.asarray(production, dtype=float)
+        self.temperature = None if temperature is None else np.asarray(
+            temperature, dtype=float)
+
+        self.resolution = float(np.median(np.diff(self.timestamps))) \
+            if len(self.timestamps) > 1 else 3600.0
+
+        # cumulative energy in kWh, energy[i:j] == cum_energy[j] - cum_energy[i]
+        energy = self.production / 1000 * (self.resolution / 3600)
+        self.cum_energy = np.concatenate(([0.0], np.cumsum(energy)))
+
+    @staticmethod
+    def from_json(production, temperature=None):
+        timestamps = np.array(
+            [datetime.datetime.fromisoformat(i['timestamp']).timestamp() for i in production])
+        values = np.array([i['value'] for i in production], dtype=float)
+
+        temp_values = None
+        if temperature:
+            temp_timestamps = np.array(
+                [datetime.datetime.fromisoformat(i['timestamp']).timestamp() for i in temperature])
+            temp_values = np.interp(
+                timestamps, temp_timestamps, [i['value'] for i in temperature])
+
+        return ProductionForecast(timestamps, values, temp_values)
+
+    def covers(self, start, end):
+        if len(self.timestamps) == 0:
+            return False
+
+        return self.timestamps[0] <= start.timestamp() \
+            and end.timestamp() <= self.timestamps[-1] + self.resolution
+
+    def to_datetime(self, epoch):
+        return datetime.datetime.fromtimestamp(epoch, tz=pytz.timezone('Europe/Brussels'))
+
+    def window_energy(self, peak_duration_h):
+        """
+        Energy in kWh produced in a window of the given duration starting at
+        each slot, for all slots where the window fits inside the forecast.
+        """
+        size = max(int(round(peak_duration_h * 3600 / self.resolution)), 1)
+        return self.cum_energy[size:] - self.cum_energy[:-size], size
+
+    def window_temperature(self, size):
+        if self.temperature is None:
+            return None
+
+        cum_temp = np.concatenate(([0.0], np.cumsum(self.temperature)))
+        return (cum_temp[size:] - cum_temp[:-size]) / size
+
+    def get_temperature_at(self, timestamps):
+        """
+        Forecast temperature of the slots containing the given epoch seconds,
+        or None without a temperature forecast.
+        """
+        if self.temperature is None:
+            return None
+
+        idx = (np.asarray(timestamps, dtype=float) - self.timestamps[0]) // self.resolution
+        return self.temperature[np.clip(idx.astype(int), 0, len(self.temperature) - 1)]
+
+    def get_windows(self, start, end, peak_duration_h):
+        """
+        All windows of `peak_duration_h` starting between `start` and `end`.
+
+        Returns
+        -------
+        tuple
+            Epoch seconds of the window starts, energy produced in kWh and
+            mean temperature of each window. The temperature is None without
+            a temperature forecast.
+        """
+        energy, size = self.window_energy(peak_duration_h)
+        window_starts = self.timestamps[:len(energy)]
+
+        in_range = (window_starts >= start.timestamp()) & (window_starts <= end.timestamp())
+
+        temperature = self.window_temperature(size)
+        if temperature is not None:
+            temperature = temperature[in_range]
+
+        return window_starts[in_range], energy[in_range], temperature
+
+    def get_peak_production(self, start, end, min_kwh, peak_duration_h, order, min_temp=None):
+        """
+        Find the start of a production window, like the remote
+        `/production/peak` endpoint.
+
+        With order `first` the earliest, with order `last` the latest window
+        starting between `start` and `end` that produces at least `min_kwh`
+        is returned. If no window produces enough, the window with the highest
+        production is used. Windows colder than `min_temp` are only used when
+        there is no warmer alternative.
+
+        Returns
+        -------
+        datetime.datetime or None
+            The start of the window, or None if no window starts in the range.
+        """
+        energy, size = self.window_energy(peak_duration_h)
+        window_starts = self.timestamps[:len(energy)]
+
+        in_range = (window_starts >= start.timestamp()) & (window_starts <= end.timestamp())
+        if not in_range.any():
+            return None
+
+        temperature = self.window_temperature(size)
+        if min_temp is not None and temperature is not None:
+            warm = in_range & (temperature >= min_temp)
+            if warm.any():
+                in_range = warm
+
+        sufficient = np.flatnonzero(in_range & (energy >= min_kwh))
+
+        if len(sufficient) > 0:
+            idx = sufficient[0] if order == 'first' else sufficient[-1]
+        else:
+            candidates = np.flatnonzero(in_range)
+            idx = candidates[np.argmax(energy[candidates])]
+
+        return self.to_datetime(window_starts[idx])
@@ -0,0 +1,140 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import collections
+import datetime
+import enum
+import logging
+import logging.handlers
+import numbers
+
+IMMUTABLE_TYPES = (
+    str, bytes, numbers.Number, datetime.date, datetime.time, datetime.timedelta, enum.Enum,
+    type(None)
+)
+
+
+def freeze(value):
+    """
+    Value safe to keep in a log record: immutable values as they are, others
+    as their text at the time of logging.
+    """
+    if isinstance(value, IMMUTABLE_TYPES):
+        return value
+    return str(value)
+
+
+class StructuredMessage:
+    """
+    Log message with named fields, formatted with `str.format` only when a
+    handler actually needs the text.
+
+    Mutable field values are rendered when the message is created, as the
+    record is formatted on the listener thread and kept in the ring buffer.
+    """
+
+    def __init__(self, message, fields):
+        self.message = message
+        self.fields = {k: freeze(v) for k, v in fields.items()}
+
+    def __str__(self):
+        if not self.fields:
+            return self.message
+        return self.message.format(**self.fields)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves message formatting to the listener thread.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keep the most recent log records in memory.
+    """
+
+    def __init__(self, size):
+        super().__init__()
+        self.records = collections.deque(maxlen=size)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def get_records(self, level=logging.NOTSET, since=None, contains=None, fields=None, limit=None):
+        """
+        Filter the buffered records, most recent last.
+
+        Parameters
+        ----------
+        level : int
+            Minimum level of the records.
+        since : datetime.datetime, optional
+            Only records created after this time.
+        contains : str, optional
+            Only records whose message contains this text (case insensitive).
+        fields : dict, optional
+            Only records whose fields have these values, compared as strings.
+        limit : int, optional
+            Maximum number of records to return.
+        """
+        since = since.timestamp() if since is not None else None
+        contains = contains.lower() if contains is not None else None
+
+        result = []
+        for record in reversed(list(self.records)):
+            if record.levelno < level:
+                continue
+
+            if since is not None and record.created < since:
+                continue
+
+            record_fields = getattr(record, 'fields', {})
+            if fields and any(
+                    str(getattr(record_fields.get(k), 'value', record_fields.get(k))) != v
+                    for k, v in fields.items()):
+                continue
+
+            if contains is not None and contains not in record.getMessage().lower():
+                continue
+
+            result.append(record)
+            if limit is not None and len(result) >= limit:
+                break
+
+        return list(reversed(result))
+
+    @staticmethod
+    def to_json(record):
+        def to_json_value(value):
+            if isinstance(value, (int, float, str, bool)) or value is None:
+                return value
+            return str(getattr(value, 'value', value))
+
+        return {
+            'timestamp': datetime.datetime.fromtimestamp(
+                record.created, tz=datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'fields': {k: to_json_value(v) for k, v in getattr(record, 'fields', {}).items()}
+        }
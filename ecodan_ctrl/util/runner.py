@@ -0,0 +1,77 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class RunnerLock:
+    """
+    Exclusive lock on a file, held by the one process that runs the
+    controller among the workers serving the same database.
+
+    The operating system releases the lock when the holding process exits,
+    however it exits, so another worker can take over without waiting for a
+    timeout. Without `fcntl` the lock is always granted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def acquire(self, blocking=False):
+        """
+        Take the lock, waiting for it if `blocking`.
+
+        Returns
+        -------
+        bool
+            Whether this process holds the lock.
+        """
+        if self.file is not None:
+            return True
+
+        file = open(self.path, 'a')
+
+        if fcntl is not None:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                return False
+
+        self.file = file
+        return True
+
+    def release(self):
+        if self.file is None:
+            return
+
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+
+        self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        self.acquire(blocking=True)
+        return self
+
+    def __exit__(self, *args):
+        self.release()
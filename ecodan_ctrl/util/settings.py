@@ -0,0 +1,61 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+def apply_overrides(config, overrides, prefixes=None):
+    """
+    Copy a configuration with some settings overridden.
+
+    Parameters
+    ----------
+    config : dict
+        Current configuration.
+    overrides : dict
+        Setting names mapped to their new value. Values are converted to the
+        type of the current setting, so strings are accepted for any setting.
+    prefixes : tuple of str, optional
+        Only allow overriding settings starting with one of these prefixes.
+
+    Returns
+    -------
+    dict
+        A new configuration, `config` itself is left untouched.
+
+    Raises
+    ------
+    ValueError
+        When a setting is unknown or not allowed, or its value can not be
+        converted.
+    """
+    config = dict(config)
+
+    for key, value in overrides.items():
+        if key not in config or (prefixes is not None and not key.startswith(prefixes)):
+            raise ValueError(f'Unknown setting: {key}')
+
+        current = config[key]
+        try:
+            if isinstance(current, bool):
+                config[key] = value if isinstance(value, bool) \
+                    else str(value).lower() == 'true'
+            elif current is None:
+                config[key] = value
+            else:
+                config[key] = type(current)(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid value for {key}: {value}')
+
+    return config
@@ -0,0 +1,252 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import datetime
+
+import numpy as np
+
+
+class TankModel:
+    """
+    Cooling and demand model of the DHW tank.
+
+    While the tank is not being heated its temperature drops as::
+
+        -dT/dt = k * (T - T_ambient) + draw[hour_of_week]
+
+    with `k` the standby heat loss and `draw` the average extra drop per hour
+    caused by hot water usage in each hour of the week. The weighted normal
+    equations are kept so every new reading updates the fit in constant time.
+    """
+
+    HOURS_OF_WEEK = 7 * 24
+
+    def __init__(self, ambient_temp, min_step=datetime.timedelta(minutes=15),
+                 max_step=datetime.timedelta(hours=2)):
+        self.ambient_temp = ambient_temp
+        self.min_step = min_step
+        self.max_step = max_step
+
+        self.reset()
+
+    def reset(self):
+        size = self.HOURS_OF_WEEK + 1
+        self.xtx = np.zeros((size, size))
+        self.xty = np.zeros(size)
+
+        self.anchor = None
+        self.coefficients = None
+
+    @staticmethod
+    def hour_of_week(timestamp):
+        return timestamp.weekday() * 24 + timestamp.hour
+
+    def add_intervals(self, duration_h, temp_start, temp_end, hour_of_week):
+        """
+        Add observed cooling intervals to the fit.
+
+        Parameters
+        ----------
+        duration_h : numpy.ndarray
+            Duration of each interval in hours.
+        temp_start, temp_end : numpy.ndarray
+            Tank temperature at the start and end of each interval.
+        hour_of_week : numpy.ndarray
+            Hour of the week the interval started in.
+        """
+        duration_h = np.asarray(duration_h, dtype=float)
+        temp_start = np.asarray(temp_start, dtype=float)
+        temp_end = np.asarray(temp_end, dtype=float)
+        hour_of_week = np.asarray(hour_of_week, dtype=int)
+
+        rate = (temp_start - temp_end) / duration_h
+        loss = (temp_start + temp_end) / 2 - self.ambient_temp
+        bins = hour_of_week + 1
+
+        self.xtx[0, 0] += np.sum(duration_h * loss * loss)
+        np.add.at(self.xtx[0], bins, duration_h * loss)
+        np.add.at(self.xtx[:, 0], bins, duration_h * loss)
+        np.add.at(self.xtx, (bins, bins), duration_h)
+
+        self.xty[0] += np.sum(duration_h * loss * rate)
+        np.add.at(self.xty, bins, duration_h * rate)
+
+        self.coefficients = None
+
+    def fit(self, timestamps, temperatures, heating=None):
+        """
+        Rebuild the model from a temperature history.
+
+        Parameters
+        ----------
+        timestamps : list of datetime.datetime
+            Local timestamps of the readings, ascending.
+        temperatures : numpy.ndarray
+            Tank temperature readings.
+        heating : numpy.ndarray, optional
+            Boolean mask of readings taken while the tank was being heated.
+        """
+        self.reset()
+
+        if len(timestamps) < 2:
+            return
+
+        epoch = np.array([t.timestamp() for t in timestamps], dtype=float)
+        temperatures = np.asarray(temperatures, dtype=float)
+        hour_of_week = np.array([self.hour_of_week(t) for t in timestamps])
+
+        duration_h = np.diff(epoch) / 3600
+        valid = (
+            (duration_h > 0)
+            & (duration_h <= self.max_step.total_seconds() / 3600)
+            & (temperatures[1:] <= temperatures[:-1])
+        )
+
+        if heating is not None:
+            heating = np.asarray(heating, dtype=bool)
+            valid &= ~heating[1:] & ~heating[:-1]
+
+        self.add_intervals(
+            duration_h[valid],
+            temperatures[:-1][valid],
+            temperatures[1:][valid],
+            hour_of_week[:-1][valid],
+        )
+
+        self.anchor = (timestamps[-1], temperatures[-1])
+
+    def observe(self, timestamp, temperature, heating=False):
+        """
+        Add a single reading. Readings closer than `min_step` to the previous
+        anchor are skipped, readings while heating restart the interval.
+        """
+        if heating or self.anchor is None:
+            self.anchor = None if heating else (timestamp, temperature)
+            return
+
+        anchor_timestamp, anchor_temperature = self.anchor
+        duration = timestamp - anchor_timestamp
+
+        if duration < self.min_step:
+            return
+
+        if duration <= self.max_step and temperature <= anchor_temperature:
+            self.add_intervals(
+                [duration.total_seconds() / 3600],
+                [anchor_temperature],
+                [temperature],
+                [self.hour_of_week(anchor_timestamp)],
+            )
+
+        self.anchor = (timestamp, temperature)
+
+    def get_coefficients(self):
+        if self.coefficients is None:
+            if self.xtx[0, 0] <= 0:
+                return None
+
+            solution, *_ = np.linalg.lstsq(self.xtx, self.xty, rcond=None)
+            self.coefficients = (
+                max(float(solution[0]), 0.0),
+                np.clip(solution[1:], 0, None),
+            )
+
+        return self.coefficients
+
+    def predict(self, timestamp, temperature, timestamps):
+        """
+        Predict the tank temperature at future moments, assuming it is not
+        heated in between.
+
+        Parameters
+        ----------
+        timestamp : datetime.datetime
+            Local time of the current reading.
+        temperature : float
+            Current tank temperature.
+        timestamps : numpy.ndarray
+            Epoch seconds to predict the temperature at.
+
+        Returns
+        -------
+        numpy.ndarray or None
+            The expected temperatures, or None if the model has no data yet.
+        """
+        coefficients = self.get_coefficients()
+        if coefficients is None:
+            return None
+
+        k, draw = coefficients
+
+        timestamps = np.asarray(timestamps, dtype=float)
+        if len(timestamps) == 0:
+            return timestamps
+
+        hours = max(int(np.ceil((timestamps.max() - timestamp.timestamp()) / 3600)), 0) + 1
+        hour_of_week = (self.hour_of_week(timestamp) + np.arange(hours)) % self.HOURS_OF_WEEK
+
+        trajectory = np.empty(hours + 1)
+        trajectory[0] = temperature
+        for hour, how in enumerate(hour_of_week):
+            trajectory[hour + 1] = max(
+                trajectory[hour] - (k * (trajectory[hour] - self.ambient_temp) + draw[how]),
+                self.ambient_temp)
+
+        return np.interp(
+            timestamps, timestamp.timestamp() + 3600 * np.arange(hours + 1), trajectory)
+
+    def predict_crossing(self, timestamp, temperature, threshold, horizon):
+        """
+        Predict when the tank temperature drops to or below the threshold.
+
+        Parameters
+        ----------
+        timestamp : datetime.datetime
+            Local time of the current reading.
+        temperature : float
+            Current tank temperature.
+        threshold : float
+            Temperature to predict the crossing of.
+        horizon : datetime.timedelta
+            How far ahead to look.
+
+        Returns
+        -------
+        datetime.datetime or None
+            The predicted crossing time, or None if it is not expected within
+            the horizon or the model has no data yet.
+        """
+        if temperature <= threshold:
+            return timestamp
+
+        coefficients = self.get_coefficients()
+        if coefficients is None:
+            return None
+
+        k, draw = coefficients
+
+        hours = int(horizon.total_seconds() // 3600)
+        hour_of_week = (self.hour_of_week(timestamp) + np.arange(hours)) % self.HOURS_OF_WEEK
+
+        for hour, how in enumerate(hour_of_week):
+            drop = k * (temperature - self.ambient_temp) + draw[how]
+            if temperature - drop <= threshold:
+                fraction = (temperature - threshold) / drop
+                return timestamp + datetime.timedelta(hours=hour + fraction)
+            temperature -= drop
+
+        return None
@@ -0,0 +1,162 @@
+# Ecodan controller
+# Copyright (C) 2023-2026  Roel Huybrechts
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+
+class ThermalModel:
+    """
+    First order resistance-capacitance model of the house.
+
+    Per time step the indoor temperature evolves as::
+
+        T[k+1] = T[k] + a * (T_out[k] - T[k]) + b * (T_set[k] - T[k]) + c
+
+    where `a` is the loss towards the outside (1 / RC), `b` the gain of the
+    heat pump towards its setpoint and `c` the constant internal gains.
+    """
+
+    def __init__(self, a, b, c, step, rmse=None):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.step = step
+        self.rmse = rmse
+
+    @staticmethod
+    def resample(timestamps, values, grid, max_gap):
+        """
+        Interpolate a series onto a regular grid.
+
+        Parameters
+        ----------
+        timestamps : numpy.ndarray
+            Epoch seconds of the samples, ascending.
+        values : numpy.ndarray
+            Sample values.
+        grid : numpy.ndarray
+            Epoch seconds to interpolate at.
+        max_gap : float
+            Grid points further than this many seconds from a sample are
+            marked invalid.
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            The interpolated values and a boolean mask of valid points.
+        """
+        resampled = np.interp(grid, timestamps, values)
+
+        idx = np.clip(np.searchsorted(timestamps, grid), 1, len(timestamps) - 1)
+        distance = np.minimum(
+            np.abs(grid - timestamps[idx - 1]), np.abs(timestamps[idx] - grid)
+        )
+        return resampled, distance <= max_gap
+
+    @staticmethod
+    def fit(inside, outside, setpoint, step=900, min_samples=48):
+        """
+        Fit the model with linear least squares.
+
+        Parameters
+        ----------
+        inside, outside, setpoint : tuple of numpy.ndarray
+            Pairs of (epoch seconds, values) for the indoor temperature, the
+            outside temperature and the heating setpoint history.
+        step : int
+            Step size of the model in seconds.
+        min_samples : int
+            Minimum number of valid steps needed for a fit.
+
+        Returns
+        -------
+        ThermalModel or None
+            The fitted model, or None if there is not enough data or the fit
+            is not physically plausible.
+        """
+        if any(len(series[0]) < 2 for series in (inside, outside, setpoint)):
+            return None
+
+        start = max(series[0][0] for series in (inside, outside, setpoint))
+        end = min(series[0][-1] for series in (inside, outside, setpoint))
+        grid = np.arange(start, end, step)
+
+        if len(grid) < min_samples + 1:
+            return None
+
+        t_in, valid_in = ThermalModel.resample(*inside, grid, 2 * step)
+        t_out, valid_out = ThermalModel.resample(*outside, grid, 4 * step)
+        t_set, valid_set = ThermalModel.resample(*setpoint, grid, 4 * step)
+
+        valid = valid_in & valid_out & valid_set
+        valid = valid[:-1] & valid[1:]
+
+        if valid.sum() < min_samples:
+            return None
+
+        delta = (t_in[1:] - t_in[:-1])[valid]
+        features = np.column_stack(
+            (
+                (t_out - t_in)[:-1][valid],
+                (t_set - t_in)[:-1][valid],
+                np.ones(valid.sum()),
+            )
+        )
+
+        (a, b, c), *_ = np.linalg.lstsq(features, delta, rcond=None)
+
+        if a <= 0 or b < 0 or a + b >= 1:
+            return None
+
+        rmse = float(np.sqrt(np.mean((features @ (a, b, c) - delta) ** 2)))
+        return ThermalModel(float(a), float(b), float(c), step, rmse)
+
+    def predict(self, inside_start, outside, setpoints):
+        """
+        Predict the indoor temperature under one or more setpoint trajectories.
+
+        Parameters
+        ----------
+        inside_start : float
+            Indoor temperature at the start of the trajectory.
+        outside : numpy.ndarray
+            Outside temperature per step, broadcastable to `setpoints`.
+        setpoints : numpy.ndarray
+            Setpoint per step, shape (steps,) or (candidates, steps).
+
+        Returns
+        -------
+        numpy.ndarray
+            Predicted indoor temperature after each step, same shape as
+            `setpoints`.
+        """
+        setpoints = np.asarray(setpoints, dtype=float)
+        outside = np.broadcast_to(np.asarray(outside, dtype=float), setpoints.shape)
+
+        result = np.empty_like(setpoints)
+        temp = np.full(setpoints.shape[:-1], inside_start, dtype=float)
+
+        for k in range(setpoints.shape[-1]):
+            temp = (
+                temp
+                + self.a * (outside[..., k] - temp)
+                + self.b * (setpoints[..., k] - temp)
+                + self.c
+            )
+            result[..., k] = temp
+
+        return result